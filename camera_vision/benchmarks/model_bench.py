@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+model_bench.py
+-------------
+Headless speed / accuracy comparison of the detector models (every entry of
+model_config.MODEL_PATHS by default) on each inference engine, over a
+recorded frame set.
+
+Per model x engine x thread count (each run in a fresh process, so peak RSS
+belongs to that configuration alone):
+- latency percentiles (ms) of
+    pre:   JPEG decode + letterbox (preprocess.py) + the engine's own input prep
+    infer: forward pass
+    post:  output decoding / NMS + mapping boxes back to frame pixels
+- FPS over the whole set (pre + infer + post, one frame at a time), at 1
+  thread and at N threads (default: physical cores)
+- peak RSS (MB)
+- mAP@0.5 and mAP@0.5:0.95 against labelled frames, at the deployed
+  confidence threshold (inference_engine.CONF_THRESHOLD)
+
+Frame set: a directory of JPEGs as received from the Pi (record one with
+--record). Labels are optional YOLO-format .txt files (class cx cy w h,
+normalised) named after each frame, in the same directory or in labels/;
+frames without a label file are timed but not scored.
+
+Results are printed as a table and written as JSON and/or CSV (one row per
+configuration) for regression tracking.
+
+Usage (from camera_vision/):
+    python benchmarks/model_bench.py --frames recordings/lab --record 300        # grab frames from the Pi
+    python benchmarks/model_bench.py --frames recordings/lab --engines all --json bench.json --csv bench.csv
+    python benchmarks/model_bench.py --frames recordings/lab --models models/NoIR/square/best_v5_sq_NoIR.pt --threads 1,2,4
+
+Dependencies:
+- cv2, numpy
+- inference_engine.py (onnxruntime / openvino / ultralytics as available)
+- websockets (--record only)
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+CAMERA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CAMERA_DIR)
+
+import numpy as np
+
+from frame_header import parse_header
+from inference_engine import ENGINES, create_engine, default_threads
+from model_config import MODEL_PATHS, SQUARE_IMGSZ, RECT_IMGSZ
+from preprocess import Preprocessor, inference_shape, jpeg_size
+
+FRAME_PATTERNS = ("*.jpg", "*.jpeg", "*.png")
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+CSV_FIELDS = ["model", "engine", "requested_engine", "threads", "int8", "input", "frames", "labelled",
+              "pre_p50_ms", "pre_p95_ms", "infer_p50_ms", "infer_p95_ms", "infer_p99_ms",
+              "post_p50_ms", "post_p95_ms", "total_p50_ms", "fps", "peak_rss_mb", "load_s",
+              "map50", "map50_95", "error"]
+
+
+# ----------------------------
+# Frame set
+# ----------------------------
+def list_frames(frames_dir):
+    files = []
+    for pattern in FRAME_PATTERNS:
+        files.extend(glob.glob(os.path.join(frames_dir, pattern)))
+    return sorted(files)
+
+
+def load_labels(frame_path, width, height):
+    """Ground truth [(class, x1, y1, x2, y2)] in frame pixels, or None if the frame has no label file."""
+    stem = os.path.splitext(os.path.basename(frame_path))[0]
+    folder = os.path.dirname(frame_path)
+    for candidate in (os.path.join(folder, "labels", stem + ".txt"), os.path.join(folder, stem + ".txt")):
+        if os.path.exists(candidate):
+            boxes = []
+            with open(candidate) as fh:
+                for line in fh:
+                    parts = line.split()
+                    if len(parts) < 5:
+                        continue
+                    cls, cx, cy, w, h = int(parts[0]), *map(float, parts[1:5])
+                    boxes.append((cls, (cx - w / 2) * width, (cy - h / 2) * height,
+                                  (cx + w / 2) * width, (cy + h / 2) * height))
+            return boxes
+    return None
+
+
+async def record_frames(uri, frames_dir, count, interval):
+    """Save `count` frames from the Pi's video stream, at most one every `interval` seconds."""
+    import websockets
+    os.makedirs(frames_dir, exist_ok=True)
+    start_index = len(list_frames(frames_dir))
+    saved, last = 0, 0.0
+    print(f"[BENCH] Recording {count} frames from {uri} into {frames_dir}...")
+    async with websockets.connect(uri, max_size=2**24) as ws:
+        async for message in ws:
+            if time.monotonic() - last < interval:
+                continue
+            _, jpeg = parse_header(message)
+            with open(os.path.join(frames_dir, f"frame_{start_index + saved:05d}.jpg"), "wb") as fh:
+                fh.write(jpeg)
+            saved += 1
+            last = time.monotonic()
+            if saved >= count:
+                break
+    print(f"[BENCH] Recorded {saved} frames")
+
+
+# ----------------------------
+# Accuracy (COCO-style mAP)
+# ----------------------------
+def box_iou(box, boxes):
+    """IoU of one box against an (N, 4) array."""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def average_precision(tp, n_gt):
+    """101-point interpolated AP from true-positive flags sorted by descending score."""
+    if n_gt == 0:
+        return None
+    if not len(tp):
+        return 0.0
+    ctp = np.cumsum(tp)
+    recall = ctp / n_gt
+    precision = ctp / np.arange(1, len(tp) + 1)
+    envelope = np.maximum.accumulate(precision[::-1])[::-1]
+    points = np.linspace(0, 1, 101)
+    idx = np.searchsorted(recall, points, side="left")
+    return float(np.mean([envelope[i] if i < len(envelope) else 0.0 for i in idx]))
+
+
+def mean_average_precision(predictions, ground_truth):
+    """(mAP@0.5, mAP@0.5:0.95) over labelled frames; predictions / ground truth are per-frame lists."""
+    labelled = [i for i, gt in enumerate(ground_truth) if gt is not None]
+    if not labelled:
+        return None, None
+    classes = sorted({g[0] for i in labelled for g in ground_truth[i]})
+    if not classes:
+        return None, None
+    aps = np.zeros((len(classes), len(IOU_THRESHOLDS)))
+    for ci, cls in enumerate(classes):
+        gt = {i: np.array([g[1:] for g in ground_truth[i] if g[0] == cls], np.float64).reshape(-1, 4) for i in labelled}
+        n_gt = sum(len(b) for b in gt.values())
+        preds = sorted(((d[4], i, d[:4]) for i in labelled for d in predictions[i] if d[5] == cls),
+                       key=lambda p: -p[0])
+        for ti, threshold in enumerate(IOU_THRESHOLDS):
+            matched = {i: np.zeros(len(b), bool) for i, b in gt.items()}
+            tp = np.zeros(len(preds))
+            for k, (_, i, box) in enumerate(preds):
+                if not len(gt[i]):
+                    continue
+                ious = box_iou(np.asarray(box), gt[i])
+                ious[matched[i]] = -1.0          # each ground-truth box matches once
+                best = int(ious.argmax())
+                if ious[best] >= threshold:
+                    matched[i][best] = True
+                    tp[k] = 1
+            aps[ci, ti] = average_precision(tp, n_gt)
+    return round(float(aps[:, 0].mean()), 4), round(float(aps.mean()), 4)
+
+
+# ----------------------------
+# One configuration (runs in its own process)
+# ----------------------------
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KiB on Linux
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 2**20, 1)
+
+
+def _ms(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 2) if len(values) else None
+
+
+def run_config(model_path, engine_name, threads, frame_paths, options):
+    """Time one model / engine / thread count over the frame set; returns a result row."""
+    shape = inference_shape(model_path, SQUARE_IMGSZ, RECT_IMGSZ)
+    row = {"model": model_path, "requested_engine": engine_name, "threads": threads, "int8": options["int8"],
+           "input": f"{shape[1]}x{shape[0]}"}
+    start = time.perf_counter()
+    engine = create_engine(resolve(model_path), shape, engine_name, threads=threads,
+                           int8=options["int8"], calib_dir=options["calib_dir"])
+    row["load_s"] = round(time.perf_counter() - start, 2)
+    row["engine"] = engine.name
+    prep = Preprocessor(shape, swap_rb=options["swap_rb"])
+
+    jpegs = []
+    for path in frame_paths:
+        with open(path, "rb") as fh:
+            jpegs.append(fh.read())
+    for _ in range(options["warmup"]):
+        engine.predict(prep(jpegs[0])[0])
+
+    pre, infer, post, total = [], [], [], []
+    predictions, ground_truth = [], []
+    for _ in range(options["repeat"]):
+        predictions = []
+        for jpeg in jpegs:
+            t0 = time.perf_counter()
+            image, transform = prep(jpeg)
+            if image is None:
+                predictions.append([])
+                continue
+            t1 = time.perf_counter()
+            results, (e_pre, e_infer, e_post) = engine.predict_timed(image)
+            t2 = time.perf_counter()
+            boxes = transform.to_frame([r[:4] for r in results])
+            predictions.append([(*box, r[4], r[5]) for box, r in zip(boxes, results)])
+            t3 = time.perf_counter()
+            pre.append(t1 - t0 + e_pre)
+            infer.append(e_infer if e_infer else t2 - t1 - e_pre - e_post)
+            post.append(e_post + t3 - t2)
+            total.append(t3 - t0)
+
+    for path, jpeg in zip(frame_paths, jpegs):
+        size = jpeg_size(jpeg)
+        if size is None:
+            image = prep(jpeg)[0]
+            size = (image.shape[1], image.shape[0]) if image is not None else (1, 1)
+        ground_truth.append(load_labels(path, *size))
+    map50, map50_95 = mean_average_precision(predictions, ground_truth)
+
+    row.update({
+        "frames": len(total),
+        "labelled": sum(gt is not None for gt in ground_truth),
+        "pre_p50_ms": _ms(pre, 50), "pre_p95_ms": _ms(pre, 95),
+        "infer_p50_ms": _ms(infer, 50), "infer_p95_ms": _ms(infer, 95), "infer_p99_ms": _ms(infer, 99),
+        "post_p50_ms": _ms(post, 50), "post_p95_ms": _ms(post, 95),
+        "total_p50_ms": _ms(total, 50),
+        "fps": round(len(total) / sum(total), 2) if total else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "map50": map50, "map50_95": map50_95,
+    })
+    return row
+
+
+def resolve(model_path):
+    return model_path if os.path.isabs(model_path) else os.path.join(CAMERA_DIR, model_path)
+
+
+# ----------------------------
+# Reporting
+# ----------------------------
+def print_table(rows):
+    header = f"{'model':<40} {'engine':<12} {'thr':>3} {'pre50':>7} {'inf50':>7} {'inf95':>7} {'post50':>7} " \
+             f"{'fps':>7} {'rss MB':>7} {'mAP50':>6} {'mAP':>6}"
+    print(header)
+    print("-" * len(header))
+
+    def fmt(value, width, digits=1):
+        return f"{value:>{width}.{digits}f}" if isinstance(value, (int, float)) else f"{'-':>{width}}"
+
+    for row in rows:
+        if row.get("error"):
+            print(f"{os.path.basename(row['model']):<40} {row['requested_engine']:<12} {row['threads']:>3} "
+                  f"ERROR: {row['error']}")
+            continue
+        print(f"{os.path.basename(row['model']):<40} {row['engine']:<12} {row['threads']:>3} "
+              f"{fmt(row['pre_p50_ms'], 7)} {fmt(row['infer_p50_ms'], 7)} {fmt(row['infer_p95_ms'], 7)} "
+              f"{fmt(row['post_p50_ms'], 7)} {fmt(row['fps'], 7)} {fmt(row['peak_rss_mb'], 7)} "
+              f"{fmt(row['map50'], 6, 3)} {fmt(row['map50_95'], 6, 3)}")
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark detector models / engines over a recorded frame set")
+    parser.add_argument("--frames", required=True, help="directory of recorded JPEG frames (+ optional YOLO labels)")
+    parser.add_argument("--models", nargs="+", default=MODEL_PATHS, help="model .pt paths (default: MODEL_PATHS)")
+    parser.add_argument("--engines", default="torch", help=f"comma-separated subset of {','.join(ENGINES)}, or 'all'")
+    parser.add_argument("--threads", default=None, help="comma-separated thread counts (default: 1,<physical cores>)")
+    parser.add_argument("--int8", action="store_true", help="use the INT8-quantised ONNX models")
+    parser.add_argument("--calib-dir", default=None, help="JPEGs for static INT8 calibration (default: dynamic)")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed inferences before measuring")
+    parser.add_argument("--repeat", type=int, default=1, help="timed passes over the frame set")
+    parser.add_argument("--limit", type=int, default=0, help="use only the first N frames")
+    parser.add_argument("--no-swap-rb", action="store_true",
+                        help="frames are already in the model's channel order (e.g. training images)")
+    parser.add_argument("--record", type=int, default=0, help="first record N frames from the Pi into --frames")
+    parser.add_argument("--record-interval", type=float, default=0.2, help="min seconds between recorded frames")
+    parser.add_argument("--uri", default=None, help="video stream to record (default: ws://$RPI_IP:9001/?tier=detect)")
+    parser.add_argument("--json", default=None, help="write result rows as JSON")
+    parser.add_argument("--csv", default=None, help="write result rows as CSV")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.record:
+        rpi_ip = os.environ.get("RPI_IP", "172.20.10.7").strip()
+        uri = args.uri or f"ws://{rpi_ip}:9001/?tier=detect&header=1"
+        asyncio.run(record_frames(uri, args.frames, args.record, args.record_interval))
+
+    frame_paths = list_frames(args.frames)
+    if args.limit:
+        frame_paths = frame_paths[:args.limit]
+    if not frame_paths:
+        sys.exit(f"[BENCH] No frames found in {args.frames}")
+    engines = list(ENGINES) if args.engines == "all" else [e.strip() for e in args.engines.split(",") if e.strip()]
+    threads = sorted({int(t) for t in args.threads.split(",")}) if args.threads else sorted({1, default_threads()})
+    options = {"int8": args.int8, "calib_dir": args.calib_dir, "warmup": args.warmup, "repeat": args.repeat,
+               "swap_rb": not args.no_swap_rb}
+    print(f"[BENCH] {len(frame_paths)} frames, models {len(args.models)}, engines {engines}, threads {threads}")
+
+    rows = []
+    context = multiprocessing.get_context("spawn")
+    for model_path in args.models:
+        if not os.path.exists(resolve(model_path)):
+            print(f"[BENCH] Skipping {model_path}: file not found")
+            rows.append({"model": model_path, "requested_engine": ",".join(engines), "threads": "-",
+                         "error": "file not found"})
+            continue
+        for engine_name in engines:
+            for count in threads:
+                print(f"[BENCH] {model_path} / {engine_name} / {count} thread(s)...")
+                # Fresh process per configuration: clean peak RSS, thread settings and runtime state
+                with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+                    try:
+                        row = pool.submit(run_config, model_path, engine_name, count, frame_paths, options).result()
+                    except Exception as e:
+                        row = {"model": model_path, "requested_engine": engine_name, "threads": count, "error": str(e)}
+                rows.append(row)
+
+    print()
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"frames": len(frame_paths), "frames_dir": args.frames, "created": time.time(),
+                       "results": rows}, fh, indent=2)
+        print(f"[BENCH] Wrote {args.json}")
+    if args.csv:
+        write_csv(args.csv, rows)
+        print(f"[BENCH] Wrote {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
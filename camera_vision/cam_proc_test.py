@@ -6,7 +6,9 @@ Receives JPEG-encoded video frames over a raw TCP socket
 and displays them locally using OpenCV.
 
 This matches a sender that transmits:
-    [4-byte length prefix] + [JPEG frame bytes]
+    [4-byte length prefix] + [frame header] + [JPEG frame bytes]
+The frame header is requested with "HEADER 1" and used to report frame
+age and sequence gaps (see frame_header.py).
 
 Dependencies:
 - socket
@@ -20,11 +22,13 @@ import numpy as np
 import struct
 import time
 from ultralytics import YOLO
+from frame_header import parse_header, FrameStats
 # ----------------------------
 # Config
 # ----------------------------
 RPI_IP = "192.168.177.148"  # Change to the sender’s IP
 VIDEO_PORT = 5001          # Port where camera_stream.py sends frames
+VIDEO_TIER = "detect"      # simulcast tier to request (name or WxH[@Q], see script/config.py VIDEO_TIERS)
 IN_URI = f"ws://{RPI_IP}:{VIDEO_PORT}"
 
 MODEL_PATH = "models/best_NoIR_v1.pt"
@@ -52,7 +56,9 @@ def receive_and_display():
             print(f"[INPUT] Connecting to {RPI_IP}:{VIDEO_PORT}...")
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.connect((RPI_IP, VIDEO_PORT))
-            print("[INPUT] Connected to stream.")
+            sock.sendall(f"TIER {VIDEO_TIER}\nHEADER 1\n".encode())
+            print(f"[INPUT] Connected to stream (tier {VIDEO_TIER}).")
+            stats = FrameStats("INPUT")
 
             while True:
                 # --- Read 4-byte frame length ---
@@ -69,7 +75,9 @@ def receive_and_display():
                     print("[WARN] Frame incomplete.")
                     break
 
-                # --- Decode JPEG to OpenCV frame ---
+                # --- Strip frame header (age / gaps), decode JPEG to OpenCV frame ---
+                fields, frame_data = parse_header(frame_data)
+                stats.update(fields)
                 frame = cv2.imdecode(np.frombuffer(frame_data, np.uint8), cv2.IMREAD_COLOR)
                 if frame is None:
                     continue
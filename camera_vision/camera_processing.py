@@ -3,11 +3,57 @@
 camera_processing.py
 -------------
 Subscribes to raw JPEG frames from VIDEO_PORT (9001),
-runs YOLO detection on each frame, and serves annotated
-frames to connected clients on OUT_PORT (9002).
+runs YOLO detection on each frame, and serves the results to
+connected clients on OUT_PORT (9002), in one of two modes:
+- annotated JPEG (default): boxes drawn into the frame, re-encoded
+- metadata (ws://host:9002/?mode=meta, or {"action": "OUTPUT", "mode": "meta"}):
+  one compact JSON message per frame instead of an image,
+    {"head": "detections", "model": ..., "seq": 123, "capture_seq": 120, "capture_ts": ..., "w": 640,
+     "h": 480, "boxes": [[x1, y1, x2, y2, score, class_id], ...]}       (coordinates normalised 0-1)
+  plus {"head": "classes", "model": ..., "names": {id: name}} on connect and
+  after a model switch. Boxes always come from the model they name, so their
+  class ids match that model's "classes" message. seq is the robot's frame header sequence, the same on
+  every simulcast tier, so a viewer can draw the boxes over the raw 9001
+  video it already shows (control_gui does). With only metadata clients the
+  frame is decoded at tracking size and never drawn or re-encoded.
+Frames are requested with the robot's frame header, so frame age
+and sequence gaps are reported (frame_header.FrameStats).
+
+Decoding, annotation and re-encoding run on a worker thread
+(inference_worker.py). The receive loop only hands over the newest
+frame, replacing one still waiting, so the annotated stream stays
+live when the model is slower than the camera. Viewers are sent the
+newest annotated frame concurrently. Throughput, inference time and
+lag are printed every few seconds.
+
+YOLO runs on keyframes only, on its own thread; boxes are carried
+across the frames in between by an optical-flow tracker, and static
+scenes skip detection (inference_scheduler.py). The annotated stream
+keeps the input frame rate.
+
+Keyframes are decoded at reduced size where the JPEG allows it and
+letterboxed straight into the model's input shape (4:3 for the
+rectangle/ models), and boxes are mapped back to frame pixels
+exactly (preprocess.py).
+
+The detector runs on eager PyTorch (default), ONNX Runtime or OpenVINO,
+chosen with INFER_ENGINE; the ONNX export of the .pt is made once and
+cached next to it (inference_engine.py). Export and ONNX Runtime come
+with requirements.txt (onnx, onnxslim, onnxruntime); OpenVINO is an
+optional extra. Falls back to PyTorch if the selected runtime is not
+installed.
+    INFER_ENGINE=openvino INFER_THREADS=4 INFER_INT8=1 python camera_processing.py
+
+Models are loaded lazily, warmed up and kept in a small LRU
+(model_manager.py). The active model can be switched at runtime with a
+JSON control message on the output WebSocket; the stream keeps flowing
+on the old model while the new one loads:
+    {"action": "MODEL", "model": 2}   (index, path or file name)  -> {"head": "model", ...}
+    {"action": "MODELS"}                                          -> {"head": "models", ...}
+    {"action": "OUTPUT", "mode": "meta" | "jpeg"}                 -> {"head": "output", ...}
 
 Dependencies:
-- ultralytics (YOLOv8)
+- onnxruntime / openvino (optional), ultralytics (YOLOv8: export, PyTorch fallback)
 - cv2
 - numpy
 - websockets
@@ -16,88 +62,304 @@ Dependencies:
 
 import asyncio
 import cv2
+import json
 import os
+import time
 import numpy as np
 import websockets
-from ultralytics import YOLO
+from urllib.parse import parse_qs, urlsplit
+from frame_header import parse_header, FrameStats
+from inference_worker import LatestFrameSlot, InferenceStats, InferenceWorker
+from inference_scheduler import AdaptiveScheduler, TRACK_WIDTH
+from preprocess import decode_min_width
+from model_manager import ModelManager
+from model_config import MODEL_PATHS, MODEL_PATH_IDX, SQUARE_IMGSZ, RECT_IMGSZ
 
 # ----------------------------
 # Config
 # ----------------------------
 RPI_IP = os.environ.get("RPI_IP", "172.20.10.7").strip()  # fallback default
-IN_URI = f"ws://{RPI_IP}:9001"  # raw frames from camera_stream.py
+VIDEO_TIER = os.environ.get("VIDEO_TIER", "detect").strip()  # simulcast tier (name or WxH[@Q]) requested from the Pi
+IN_URI = f"ws://{RPI_IP}:9001/?tier={VIDEO_TIER}&header=1"  # raw frames (with frame header) from camera_stream.py
 OUT_PORT = 9002                 # serve processed frames here
-MODEL_PATHS = ["models/NoIR/Archive/best_NoIR_v1_sq.pt",
-               "models/NoIR/square/best_v5_sq_NoIR.pt",
-               "models/NoIR/rectangle/best_v5_rt_NoIR.pt",
-               "models/NoIR/rectangle/best_v9_rt_NoIR.pt"]
-MODEL_PATH_IDX = 1
+INFER_ENGINE = os.environ.get("INFER_ENGINE", "torch").strip()        # torch | onnxruntime | openvino
+INFER_THREADS = int(os.environ.get("INFER_THREADS", "0")) or None  # default: physical cores
+INFER_INT8 = os.environ.get("INFER_INT8", "0").strip() == "1"      # INT8-quantised ONNX (cached separately)
+INFER_CALIB_DIR = os.environ.get("INFER_CALIB_DIR") or None        # JPEGs for static INT8 calibration
+MODEL_CACHE_SIZE = int(os.environ.get("MODEL_CACHE_SIZE", "2"))    # loaded models kept in memory (LRU)
 
-# Track connected output clients
+# Track connected output clients: annotated-JPEG viewers and detection-metadata clients
 output_clients = set()
+meta_clients = set()
+OUTPUT_MODES = ("jpeg", "meta")
+
+# Detector models: loaded on first use (the initial one in main()), swapped at runtime
+models = ModelManager(MODEL_PATHS, INFER_ENGINE, capacity=MODEL_CACHE_SIZE, threads=INFER_THREADS,
+                      int8=INFER_INT8, calib_dir=INFER_CALIB_DIR, square=SQUARE_IMGSZ, rectangle=RECT_IMGSZ)
+
+# Latest-frame-wins hand-offs to the annotation and detector threads, keyframe scheduling, metrics
+frame_slot = LatestFrameSlot()
+detect_slot = LatestFrameSlot()
+scheduler = AdaptiveScheduler()
+infer_stats = InferenceStats("YOLO", extra=scheduler.stats)
 
-# Load YOLO model once
-model = YOLO(MODEL_PATHS[MODEL_PATH_IDX])
+# Box colours per class id (BGR)
+BOX_COLORS = [(56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207), (10, 249, 72)]
 
 
 # ----------------------------
 # Output server (for browsers/viewers)
 # ----------------------------
+def requested_mode(websocket):
+    """Output mode from the request URL (?mode=meta), default annotated JPEG."""
+    request = getattr(websocket, "request", None)
+    path = getattr(request, "path", None) or getattr(websocket, "path", None) or ""
+    mode = parse_qs(urlsplit(path).query).get("mode", ["jpeg"])[0].lower()
+    return mode if mode in OUTPUT_MODES else "jpeg"
+
+
+def set_mode(websocket, mode):
+    output_clients.discard(websocket)
+    meta_clients.discard(websocket)
+    (meta_clients if mode == "meta" else output_clients).add(websocket)
+
+
+def classes_message():
+    model = models.active
+    return json.dumps({"head": "classes", "model": model.path if model else None,
+                       "names": model.names if model else {}})
+
+
+async def announce_classes():
+    """Tell metadata clients the active model's class names (after loading / switching)."""
+    message = classes_message()
+    await asyncio.gather(*(_send_output(c, message) for c in list(meta_clients)))
+
+
 async def handle_output(websocket):
-    print(f"[OUTPUT] Viewer connected: {websocket.remote_address}")
-    output_clients.add(websocket)
+    mode = requested_mode(websocket)
+    print(f"[OUTPUT] Viewer connected ({mode}): {websocket.remote_address}")
+    set_mode(websocket, mode)
     try:
-        await websocket.wait_closed()
+        if mode == "meta":
+            await websocket.send(classes_message())
+        # Viewers only receive frames; text messages are control commands (JSON)
+        async for message in websocket:
+            if isinstance(message, bytes):
+                continue
+            try:
+                data = json.loads(message)
+            except json.JSONDecodeError:
+                await websocket.send(json.dumps({"status": "error", "msg": "Bad JSON"}))
+                continue
+            await websocket.send(json.dumps(await handle_control(websocket, data)))
+    except websockets.exceptions.ConnectionClosed:
+        pass
     finally:
         output_clients.discard(websocket)
+        meta_clients.discard(websocket)
         print(f"[OUTPUT] Viewer disconnected: {websocket.remote_address}")
 
 
+async def handle_control(websocket, data):
+    """Control commands from an output client; returns the JSON reply."""
+    action = str(data.get("action", "")).upper() if isinstance(data, dict) else ""
+    if action == "OUTPUT":
+        mode = str(data.get("mode", "")).lower()
+        if mode not in OUTPUT_MODES:
+            return {"status": "error", "msg": f"Unknown output mode: {data.get('mode')} (expected {OUTPUT_MODES})"}
+        set_mode(websocket, mode)
+        if mode == "meta":
+            await websocket.send(classes_message())
+        return {"head": "output", "status": "ok", "mode": mode}
+    if action == "MODELS":
+        return {"head": "models", "status": "ok", **models.stats()}
+    if action == "MODEL":
+        try:
+            # Load + warm-up off the event loop; frames keep flowing on the current model meanwhile
+            model, cached = await asyncio.to_thread(models.activate, data.get("model"))
+        except Exception as e:
+            print(f"[MODEL] Switch failed: {e}")
+            return {"status": "error", "msg": f"Model switch failed: {e}"}
+        scheduler.request_keyframe()  # boxes on screen are from the previous model
+        await announce_classes()
+        return {"head": "model", "status": "ok", "cached": cached, **model.describe()}
+    return {"status": "error", "msg": f"Unknown action: {data.get('action') if isinstance(data, dict) else data}"}
+
+
+# ----------------------------
+# Detector thread (keyframes only)
+# ----------------------------
+def detect_keyframe(item):
+    """Detector thread: decode the keyframe at model scale, run the detector, hand the boxes to the scheduler."""
+    jpeg, keyframe = item
+    model = models.active  # read once: a switch mid-keyframe takes effect from the next one
+    if model is None:
+        scheduler.on_failed()
+        return None
+    try:
+        # Reduced-size decode + letterbox at the model's input shape (the engine does not resize again)
+        image, transform = model.preprocessor(jpeg)
+        if image is None:
+            scheduler.on_failed()
+            return None
+        start = time.perf_counter()
+        results = model.engine.predict(image)
+        infer_stats.on_inference(time.perf_counter() - start)
+        if model is not models.active:
+            # Switched while this keyframe was in flight: its class ids belong to the old model,
+            # so drop it; the forced keyframe after the switch runs on the new one
+            scheduler.on_failed()
+            return None
+        boxes = transform.to_frame([r[:4] for r in results])
+        detections = [(*box, r[4], r[5]) for box, r in zip(boxes, results)]
+    except Exception as e:
+        print(f"[ERROR] YOLO processing failed: {e}")
+        scheduler.on_failed()
+        return None
+    scheduler.on_detections(keyframe, detections, source=model)
+    return None
+
+
+def draw_detections(frame, detections, names):
+    """Draw boxes with class name (from the model that produced them) and confidence onto frame (in place)."""
+    for x1, y1, x2, y2, conf, cls in detections:
+        color = BOX_COLORS[cls % len(BOX_COLORS)]
+        p1, p2 = (int(x1), int(y1)), (int(x2), int(y2))
+        cv2.rectangle(frame, p1, p2, color, 2)
+        label = f"{names.get(cls, cls)} {conf:.2f}"
+        (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        cv2.rectangle(frame, (p1[0], p1[1] - th - 4), (p1[0] + tw, p1[1]), color, -1)
+        cv2.putText(frame, label, (p1[0], p1[1] - 3), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    return frame
+
+
+def detections_message(detections, fields, frame_w, frame_h, model):
+    """Compact JSON for metadata clients: boxes normalised to the frame, keyed by the robot's frame seq.
+
+    `model` is the path in the matching "classes" message, so clients can skip boxes sent across a switch.
+    """
+    return json.dumps({
+        "head": "detections",
+        "model": model.path if model else None,
+        "seq": fields["seq"] if fields else None,
+        "capture_seq": fields["capture_seq"] if fields else None,
+        "capture_ts": fields["capture_ts"] if fields else None,
+        "w": frame_w,
+        "h": frame_h,
+        "boxes": [[round(x1 / frame_w, 4), round(y1 / frame_h, 4), round(x2 / frame_w, 4), round(y2 / frame_h, 4),
+                   round(conf, 3), int(cls)] for x1, y1, x2, y2, conf, cls in detections],
+    }, separators=(",", ":"))
+
+
+# ----------------------------
+# Annotation worker (every frame: decode + track, then draw + encode and/or metadata, off the event loop)
+# ----------------------------
+def annotate_frame(item):
+    """Worker thread: decode, track boxes (requesting keyframes), build the outputs clients want.
+
+    Returns (annotated JPEG bytes or None, metadata JSON or None).
+    """
+    jpeg, fields, received_at = item
+    want_jpeg = bool(output_clients)
+    if want_jpeg:
+        # Convert bytes -> numpy -> display frame
+        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        frame_h, frame_w = frame.shape[:2] if frame is not None else (0, 0)
+    else:
+        # Metadata only: the tracker needs TRACK_WIDTH columns, so let the JPEG decoder downscale
+        frame, (frame_w, frame_h) = decode_min_width(jpeg, TRACK_WIDTH)
+    if frame is None:
+        return None
+
+    # Carry boxes forward; keyframes go to the detector thread as JPEG bytes (it decodes
+    # at model scale itself; a newer keyframe replaces a waiting one)
+    detections, keyframe = scheduler.step(frame, frame_w)
+    if keyframe is not None:
+        detect_slot.put((jpeg, keyframe))
+    model = models.active
+    if scheduler.source is not model:
+        detections = []  # still tracking a previous model's boxes: none until the new model's first keyframe
+
+    meta = detections_message(detections, fields, frame_w, frame_h, model) if meta_clients else None
+    frame_bytes = None
+    if want_jpeg:
+        annotated = draw_detections(frame, detections, model.names if model else {})
+        # Encode back to JPEG
+        ret_enc, buffer = cv2.imencode(".jpg", annotated)
+        if ret_enc:
+            frame_bytes = buffer.tobytes()
+    if frame_bytes is None and meta is None:
+        return None
+    return frame_bytes, meta
+
+
+def on_annotated(result, item, loop):
+    """Worker thread: record metrics and hand the outputs to the event loop."""
+    _, fields, received_at = item
+    age_s = time.time() - fields["capture_ts"] if fields else None
+    infer_stats.on_processed(time.monotonic() - received_at, age_s)
+    loop.call_soon_threadsafe(post_output, *result)
+
+
+# ----------------------------
+# Output broadcast (latest result wins)
 # ----------------------------
-# Processing loop
+_latest_output = None
+_output_ready = None  # asyncio.Event, created in main()
+
+
+def post_output(frame_bytes, meta):
+    global _latest_output
+    _latest_output = (frame_bytes, meta)
+    _output_ready.set()
+
+
+async def _send_output(client, data):
+    try:
+        await client.send(data)
+    except Exception:
+        output_clients.discard(client)
+        meta_clients.discard(client)
+
+
+async def broadcast_output():
+    """Send the newest annotated frame / metadata to every client; results produced meanwhile are skipped."""
+    global _latest_output
+    while True:
+        await _output_ready.wait()
+        _output_ready.clear()
+        latest, _latest_output = _latest_output, None
+        if latest is None:
+            continue
+        frame_bytes, meta = latest
+        sends = []
+        if frame_bytes is not None:
+            sends += [_send_output(c, frame_bytes) for c in list(output_clients)]
+        if meta is not None:
+            sends += [_send_output(c, meta) for c in list(meta_clients)]
+        if sends:
+            await asyncio.gather(*sends)
+
+
+# ----------------------------
+# Receive loop
 # ----------------------------
 async def process_stream():
-    """Subscribe to raw frames on IN_URI, run YOLO, broadcast annotated frames."""
+    """Subscribe to raw frames on IN_URI and hand the newest one to the inference worker."""
     print(f"[INPUT] Connecting to raw stream at {IN_URI}...")
     while True:
         try:
             async with websockets.connect(IN_URI, max_size=2**24) as ws:  # allow big frames
                 print("[INPUT] Connected to raw stream")
+                stats = FrameStats("INPUT")
                 async for message in ws:
-                    try:
-                        # Convert bytes -> numpy -> BGR frame
-                        img_array = np.frombuffer(message, np.uint8)
-                        frame = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-                        frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                        if frame is None:
-                            continue
-                        if output_clients:
-                            try:
-                                # Run YOLO inference
-                                results = model.predict(frame_bgr, verbose=False)
-                                annotated = results[0].plot(img=frame)
-
-                                # Encode back to JPEG
-                                ret_enc, buffer = cv2.imencode(".jpg", annotated)
-                                if not ret_enc:
-                                    continue
-                                frame_bytes = buffer.tobytes()
-
-                                # Broadcast to connected output clients
-                                dead = []
-                                for client in list(output_clients):
-                                    try:
-                                        await client.send(frame_bytes)
-                                    except:
-                                        dead.append(client)
-                                for d in dead:
-                                    output_clients.discard(d)
-                            except Exception as e:
-                                print(f"[ERROR] YOLO processing failed: {e}")
-                            else:
-                                pass
-                    except Exception as e:
-                        print(f"[ERROR] Processing frame failed: {e}")
+                    # Strip the frame header (age / gap accounting); decoding happens on the worker
+                    fields, jpeg = parse_header(message)
+                    stats.update(fields)
+                    if output_clients or meta_clients:
+                        # Replaces any frame the worker has not started on yet
+                        infer_stats.on_received(frame_slot.put((jpeg, fields, time.monotonic())))
         except Exception as e:
             print(f"[WARN] Lost connection to raw stream ({e}), retrying in 2s...")
             await asyncio.sleep(2)
@@ -107,12 +369,26 @@ async def process_stream():
 # Main entry
 # ----------------------------
 async def main():
+    global _output_ready
+    _output_ready = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    InferenceWorker(frame_slot, annotate_frame, lambda result, item: on_annotated(result, item, loop)).start()
+    InferenceWorker(detect_slot, detect_keyframe, None, name="detector").start()
+
     # Start output WebSocket server
     async with websockets.serve(handle_output, "0.0.0.0", OUT_PORT):
         print(f"[INFO] Serving processed stream on ws://0.0.0.0:{OUT_PORT}")
+        sender = asyncio.create_task(broadcast_output())
+        await asyncio.to_thread(models.activate, MODEL_PATH_IDX)  # initial model: load + warm-up
+        await announce_classes()  # metadata clients that connected while it loaded
 
         # Start processing loop (never returns)
-        await process_stream()
+        try:
+            await process_stream()
+        finally:
+            sender.cancel()
+            frame_slot.close()
+            detect_slot.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+frame_header.py
+-------------
+Receiver side of the robot's optional frame header (script/utils/frame_header.py).
+
+Frames requested with the header (video WebSocket "?header=1", raw socket
+"HEADER 1" line) start with a 32-byte big-endian block:
+    magic b"RV" | u8 version | u8 header length | u32 seq | u32 capture seq |
+    f64 capture time | f64 encode time | u8 enhancement mode | u8 flags | 2 pad
+Frames without it are bare JPEG (start with FF D8) and pass through untouched.
+
+Frame age is this machine's clock minus the robot's capture time, so both
+clocks should be NTP-synchronised.
+
+To call externally:
+    fields, jpeg = parse_header(message)
+    stats.update(fields)      # prints age / gap summary every few seconds
+
+Dependencies:
+- struct
+"""
+
+import struct
+import time
+
+MAGIC = b"RV"
+_V1 = struct.Struct(">2sBBIIddBB2x")
+
+
+def parse_header(data):
+    """Split a received frame into (header fields, JPEG payload); (None, data) for bare JPEG."""
+    if len(data) < _V1.size or bytes(data[:2]) != MAGIC:
+        return None, data
+    _, version, length, seq, capture_seq, capture_ts, encode_ts, mode, flags = _V1.unpack_from(data)
+    fields = {"version": version, "seq": seq, "capture_seq": capture_seq, "capture_ts": capture_ts,
+              "encode_ts": encode_ts, "mode": mode, "flags": flags}
+    return fields, memoryview(data)[length:]
+
+
+class FrameStats:
+    """Per-frame age and sequence gap accounting, reported every `interval` seconds."""
+
+    def __init__(self, label="INPUT", interval=5.0):
+        self.label = label
+        self.interval = interval
+        self.last_seq = None
+        self.last_capture_seq = None
+        self.frames = 0
+        self.gaps = 0           # frames lost between the robot's fan-out and us
+        self.skipped = 0        # camera frames the robot did not send (static scene, stale, slow encode)
+        self.age = 0.0          # capture -> received, last frame (s)
+        self._ages = []
+        self._last_report = time.monotonic()
+
+    def update(self, fields, received_at=None):
+        """Account one received frame; returns its age in seconds (None without a header)."""
+        if fields is None:
+            return None
+        received_at = time.time() if received_at is None else received_at
+        self.age = received_at - fields["capture_ts"]
+        self._ages.append(self.age)
+        self.frames += 1
+        # A sequence going backwards means the robot restarted: just resynchronise
+        if self.last_seq is not None and fields["seq"] > self.last_seq:
+            self.gaps += fields["seq"] - self.last_seq - 1
+            self.skipped += max(0, fields["capture_seq"] - self.last_capture_seq - 1)
+        self.last_seq = fields["seq"]
+        self.last_capture_seq = fields["capture_seq"]
+
+        if time.monotonic() - self._last_report >= self.interval:
+            self.report()
+        return self.age
+
+    def report(self):
+        ages = sorted(self._ages)
+        if ages:
+            p50 = ages[len(ages) // 2] * 1000
+            p95 = ages[min(len(ages) - 1, int(len(ages) * 0.95))] * 1000
+            print(f"[{self.label}] frames {self.frames}, age p50 {p50:.0f} ms / p95 {p95:.0f} ms, "
+                  f"gaps {self.gaps}, robot-skipped {self.skipped}")
+        self._ages.clear()
+        self._last_report = time.monotonic()
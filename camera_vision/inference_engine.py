@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+inference_engine.py
+-------------
+CPU inference engines for the YOLO .pt models: ONNX Runtime, OpenVINO, or
+eager PyTorch through ultralytics (always available as the fallback).
+
+- The .pt weights are exported once to ONNX at the model's input shape and
+  cached next to the .pt file:
+      best_v5_rt_NoIR.480x640.nms.onnx        (+ .json sidecar: class names, shape, NMS)
+      best_v5_rt_NoIR.480x640.nms.int8.onnx   (optional INT8 copy)
+  Later runs load the cached file directly (delete it to re-export).
+- NMS is fused into the exported graph where the installed ultralytics
+  supports it (export nms=True: output is [x1, y1, x2, y2, score, class] per
+  detection); otherwise the raw head is decoded here with cv2.dnn.NMSBoxesBatched.
+- INT8: static QDQ quantisation calibrated on the images in INFER_CALIB_DIR if
+  given (runs on ONNX Runtime and OpenVINO), else dynamic weight quantisation.
+- Threads: intra-op threads = INFER_THREADS (default: physical cores),
+  sequential execution, latency-oriented compile options.
+
+Every engine takes an HxWx3 uint8 image already at the model's input shape
+(see preprocess.py) and returns detections in input pixels:
+    [(x1, y1, x2, y2, score, class_id), ...]
+predict_timed() also returns the engine's (preprocess, inference,
+postprocess) times in seconds, for benchmarking.
+
+To call externally:
+    engine = create_engine("models/NoIR/rectangle/best_v5_rt_NoIR.pt", (480, 640), "onnxruntime")
+    detections = engine.predict(image)
+    engine.names[class_id]
+
+Dependencies:
+- cv2, numpy
+- onnxruntime (engine "onnxruntime"), openvino (engine "openvino")
+- ultralytics (engine "torch", and to export the ONNX files)
+"""
+
+import glob
+import json
+import os
+import shutil
+import time
+import cv2
+import numpy as np
+
+ENGINES = ("onnxruntime", "openvino", "torch")
+CONF_THRESHOLD = 0.25   # ultralytics predict defaults
+IOU_THRESHOLD = 0.7
+MAX_DETECTIONS = 300
+
+
+def default_threads():
+    try:
+        import psutil
+        return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    except ImportError:
+        return os.cpu_count() or 1
+
+
+# ----------------------------
+# Export cache
+# ----------------------------
+def cache_path(pt_path, shape, nms=True, int8=False):
+    stem = os.path.splitext(pt_path)[0]
+    return f"{stem}.{shape[0]}x{shape[1]}{'.nms' if nms else ''}{'.int8' if int8 else ''}.onnx"
+
+
+def _export_onnx(pt_path, shape):
+    """Export pt -> ONNX (fused NMS if supported); returns (cached path, sidecar info)."""
+    for nms in (True, False):
+        target = cache_path(pt_path, shape, nms)
+        if os.path.exists(target) and os.path.exists(target + ".json"):
+            with open(target + ".json") as fh:
+                return target, json.load(fh)
+
+    from ultralytics import YOLO
+    model = YOLO(pt_path)
+    names = {int(k): v for k, v in model.names.items()}
+    print(f"[ENGINE] Exporting {pt_path} to ONNX at {shape[0]}x{shape[1]} (one-off)...")
+    try:
+        exported, nms = model.export(format="onnx", imgsz=list(shape), nms=True, simplify=True, verbose=False), True
+    except (TypeError, ValueError, SyntaxError, RuntimeError) as e:
+        # Older ultralytics: no fused NMS, decode the raw head here instead
+        print(f"[ENGINE] Fused-NMS export unavailable ({e}); exporting raw head")
+        exported, nms = model.export(format="onnx", imgsz=list(shape), simplify=True, verbose=False), False
+    target = cache_path(pt_path, shape, nms)
+    shutil.move(exported, target)
+    info = {"names": names, "shape": list(shape), "nms": nms}
+    with open(target + ".json", "w") as fh:
+        json.dump(info, fh)
+    return target, info
+
+
+def _calibration_reader(input_name, shape, calib_dir, limit=200):
+    from onnxruntime.quantization import CalibrationDataReader
+    from preprocess import Preprocessor
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._files = iter(sorted(glob.glob(os.path.join(calib_dir, "*.jp*g")))[:limit])
+            self._prep = Preprocessor(shape)   # frames saved from the stream: same channel order as live
+
+        def get_next(self):
+            for path in self._files:
+                with open(path, "rb") as fh:
+                    image, _ = self._prep(fh.read())
+                if image is not None:
+                    return {input_name: to_blob(image)}
+            return None
+
+    return Reader()
+
+
+def _quantize(onnx_path, target, shape, calib_dir=None):
+    from onnxruntime.quantization import quantize_dynamic, quantize_static, QuantFormat, QuantType
+    import onnxruntime as ort
+    if calib_dir:
+        input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        print(f"[ENGINE] INT8 static quantisation calibrated on {calib_dir}...")
+        # Convolutions only: the head concatenates box coordinates (0-640) with scores (0-1), and one
+        # shared activation scale for that tensor rounds every score to zero
+        quantize_static(onnx_path, target, _calibration_reader(input_name, shape, calib_dir),
+                        quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        op_types_to_quantize=["Conv"])
+    else:
+        print("[ENGINE] INT8 dynamic quantisation (set INFER_CALIB_DIR for calibrated static INT8)...")
+        quantize_dynamic(onnx_path, target, weight_type=QuantType.QUInt8)
+
+
+def exported_model(pt_path, shape, int8=False, calib_dir=None):
+    """Path of the cached ONNX model for pt_path at shape (exporting / quantising once), plus its info."""
+    onnx_path, info = _export_onnx(pt_path, shape)
+    if not int8:
+        return onnx_path, info
+    target = cache_path(pt_path, shape, info["nms"], int8=True)
+    if not os.path.exists(target):
+        _quantize(onnx_path, target, shape, calib_dir)
+    return target, info
+
+
+# ----------------------------
+# Pre / post processing shared by the ONNX engines
+# ----------------------------
+def to_blob(image):
+    """HxWx3 BGR uint8 -> 1x3xHxW float32 RGB in [0, 1] (what the exported model expects)."""
+    return cv2.dnn.blobFromImage(image, scalefactor=1.0 / 255, swapRB=True)
+
+
+def decode_output(output, fused_nms, shape, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD):
+    """Model output -> [(x1, y1, x2, y2, score, class_id)] in input pixels, clipped to shape (h, w) like ultralytics."""
+    output = np.asarray(output)[0]
+    h, w = shape
+    if fused_nms:
+        # (max_det, 6): already NMS'd, zero-padded
+        keep = output[:, 4] >= conf
+        return [(min(max(float(x1), 0.0), w), min(max(float(y1), 0.0), h), min(max(float(x2), 0.0), w),
+                 min(max(float(y2), 0.0), h), float(s), int(c)) for x1, y1, x2, y2, s, c in output[keep]]
+
+    # Raw head (4 + classes, anchors): cx, cy, w, h, per-class scores
+    preds = output.T
+    scores = preds[:, 4:]
+    class_ids = scores.argmax(axis=1)
+    best = scores[np.arange(len(scores)), class_ids]
+    keep = best >= conf
+    preds, best, class_ids = preds[keep], best[keep], class_ids[keep]
+    if not len(preds):
+        return []
+    boxes = np.empty((len(preds), 4), np.float32)
+    boxes[:, 0] = preds[:, 0] - preds[:, 2] / 2
+    boxes[:, 1] = preds[:, 1] - preds[:, 3] / 2
+    boxes[:, 2] = preds[:, 2]
+    boxes[:, 3] = preds[:, 3]
+    idx = cv2.dnn.NMSBoxesBatched(boxes.tolist(), best.tolist(), class_ids.tolist(), conf, iou)
+    detections = []
+    for i in np.asarray(idx).reshape(-1)[:MAX_DETECTIONS]:
+        x, y, bw, bh = boxes[i]
+        detections.append((min(max(float(x), 0.0), w), min(max(float(y), 0.0), h), min(max(float(x + bw), 0.0), w),
+                           min(max(float(y + bh), 0.0), h), float(best[i]), int(class_ids[i])))
+    return detections
+
+
+# ----------------------------
+# Engines
+# ----------------------------
+class TorchEngine:
+    """Eager PyTorch through ultralytics (fallback)."""
+
+    name = "torch"
+
+    def __init__(self, pt_path, shape, threads=None):
+        from ultralytics import YOLO
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = YOLO(pt_path)
+        self.names = self.model.names
+        self.shape = tuple(shape)
+
+    def predict(self, image):
+        return self.predict_timed(image)[0]
+
+    def predict_timed(self, image):
+        result = self.model.predict(image, imgsz=list(self.shape), verbose=False)[0]
+        boxes = result.boxes
+        detections = [(x1, y1, x2, y2, s, int(c)) for (x1, y1, x2, y2), s, c in
+                      zip(boxes.xyxy.tolist(), boxes.conf.tolist(), boxes.cls.tolist())]
+        speed = getattr(result, "speed", None) or {}   # ultralytics' own split, ms
+        return detections, (speed.get("preprocess", 0.0) / 1000, speed.get("inference", 0.0) / 1000,
+                            speed.get("postprocess", 0.0) / 1000)
+
+
+class OnnxRuntimeEngine:
+    """ONNX Runtime CPU session with tuned threading."""
+
+    name = "onnxruntime"
+
+    def __init__(self, pt_path, shape, threads=None, int8=False, calib_dir=None):
+        import onnxruntime as ort
+        path, info = exported_model(pt_path, shape, int8, calib_dir)
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads or default_threads()
+        opts.inter_op_num_threads = 1
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.names = {int(k): v for k, v in info["names"].items()}
+        self.fused_nms = info["nms"]
+        self.shape = tuple(shape)
+        self.path = path
+
+    def predict(self, image):
+        return self.predict_timed(image)[0]
+
+    def predict_timed(self, image):
+        t0 = time.perf_counter()
+        blob = to_blob(image)
+        t1 = time.perf_counter()
+        output = self.session.run(None, {self.input_name: blob})[0]
+        t2 = time.perf_counter()
+        detections = decode_output(output, self.fused_nms, self.shape)
+        return detections, (t1 - t0, t2 - t1, time.perf_counter() - t2)
+
+
+class OpenVinoEngine:
+    """OpenVINO CPU compiled model (reads the cached ONNX directly)."""
+
+    name = "openvino"
+
+    def __init__(self, pt_path, shape, threads=None, int8=False, calib_dir=None):
+        import openvino as ov
+        path, info = exported_model(pt_path, shape, int8, calib_dir)
+        core = ov.Core()
+        config = {"PERFORMANCE_HINT": "LATENCY", "INFERENCE_NUM_THREADS": threads or default_threads()}
+        self.compiled = core.compile_model(core.read_model(path), "CPU", config)
+        self.request = self.compiled.create_infer_request()
+        self.names = {int(k): v for k, v in info["names"].items()}
+        self.fused_nms = info["nms"]
+        self.shape = tuple(shape)
+        self.path = path
+
+    def predict(self, image):
+        return self.predict_timed(image)[0]
+
+    def predict_timed(self, image):
+        t0 = time.perf_counter()
+        blob = to_blob(image)
+        t1 = time.perf_counter()
+        self.request.infer({0: blob})
+        t2 = time.perf_counter()
+        detections = decode_output(self.request.get_output_tensor(0).data, self.fused_nms, self.shape)
+        return detections, (t1 - t0, t2 - t1, time.perf_counter() - t2)
+
+
+def create_engine(pt_path, shape, engine="torch", threads=None, int8=False, calib_dir=None):
+    """Build the requested engine; falls back to PyTorch if it (or its export) is unavailable."""
+    start = time.perf_counter()
+    if engine not in ENGINES:
+        print(f"[ENGINE] Unknown engine '{engine}' (expected one of {ENGINES}); using torch")
+        engine = "torch"
+    if engine != "torch":
+        try:
+            cls = OnnxRuntimeEngine if engine == "onnxruntime" else OpenVinoEngine
+            instance = cls(pt_path, shape, threads, int8, calib_dir)
+            print(f"[ENGINE] {instance.name} {os.path.basename(instance.path)} "
+                  f"({threads or default_threads()} threads, loaded in {time.perf_counter() - start:.1f}s)")
+            return instance
+        except Exception as e:
+            print(f"[ENGINE] {engine} unavailable ({e}); falling back to torch")
+    instance = TorchEngine(pt_path, shape, threads)
+    print(f"[ENGINE] torch {os.path.basename(pt_path)} (loaded in {time.perf_counter() - start:.1f}s)")
+    return instance
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+inference_scheduler.py
+-------------
+Adaptive detection scheduling: run YOLO on keyframes only and carry boxes
+forward with a cheap optical-flow tracker on every frame in between.
+
+Per frame (annotation thread, every frame):
+- the frame is reduced to a small grayscale image (TRACK_WIDTH wide)
+- boxes from the last keyframe are moved with pyramidal Lucas-Kanade flow
+  on corner points inside each box (forward-backward checked); a box's
+  confidence is the share of its points that tracked well
+- a keyframe is requested from the detector thread when:
+    * there are no detections yet, tracker confidence fell below MIN_CONFIDENCE,
+      or request_keyframe() was called, e.g. after a model switch (forced)
+    * KEYFRAME_INTERVAL has passed and the scene changed since the last keyframe
+      (downsampled frame difference, MotionGate)
+    * STATIC_REFRESH has passed (slow changes below the motion threshold)
+  Static scenes therefore skip detection entirely and reuse the boxes.
+
+Detections arrive asynchronously for the keyframe they were run on; they are
+flowed from that keyframe to the current frame before being used, so the
+output keeps the full frame rate while the detector runs much less often.
+
+Detections are tuples (x1, y1, x2, y2, confidence, class_id) in frame pixels.
+on_detections() can tag them with their source (e.g. the model that produced
+them); `source` then names the origin of the boxes step() currently returns, so
+class ids are never read against a different model's names.
+
+To call externally:
+    scheduler = AdaptiveScheduler()
+    detections, keyframe = scheduler.step(frame)   # keyframe: None, or gray image to send with the frame to the detector
+    scheduler.step(small, frame_width=1280)          # frame decoded at reduced size; boxes stay in full-frame pixels
+    scheduler.on_detections(keyframe, detections, source=model)  # from the detector thread
+    scheduler.source                               # what produced the boxes of the last step()
+
+Dependencies:
+- cv2
+- numpy
+"""
+
+import threading
+import time
+import cv2
+import numpy as np
+
+TRACK_WIDTH = 320          # width of the grayscale image used for flow / motion checks
+KEYFRAME_INTERVAL = 0.5    # s; min time between motion-triggered keyframes
+STATIC_REFRESH = 5.0       # s; detect at least this often even when the scene looks static
+MIN_CONFIDENCE = 0.5       # mean share of tracked points below which detection is forced
+POINTS_PER_BOX = 24
+FB_ERROR = 1.0             # px (tracking scale); max forward-backward error of a good point
+
+LK_PARAMS = dict(winSize=(15, 15), maxLevel=3,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+
+class MotionGate:
+    """Has the scene changed since the reference image? (downsampled absolute difference)"""
+
+    def __init__(self, size=(80, 60), pixel_threshold=12, area_threshold=0.003):
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self._reference = None
+        self._diff = np.empty((size[1], size[0]), np.uint8)
+
+    def set_reference(self, gray):
+        self._reference = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+
+    def changed(self, gray):
+        if self._reference is None:
+            return True
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        cv2.absdiff(small, self._reference, dst=self._diff)
+        cv2.threshold(self._diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self._diff)
+        return cv2.countNonZero(self._diff) > self.area_threshold * self._diff.size
+
+
+class FlowTracker:
+    """Moves boxes between frames with Lucas-Kanade flow on points inside each box."""
+
+    def __init__(self):
+        self.prev = None
+        self.boxes = []       # [x1, y1, x2, y2, conf, cls] at tracking scale
+        self.points = []      # per box: Nx1x2 float32 points, or None
+
+    def reset(self, gray, boxes):
+        self.prev = gray
+        self.boxes = [list(b) for b in boxes]
+        self.points = [self._seed(gray, b) for b in self.boxes]
+
+    @staticmethod
+    def _seed(gray, box):
+        h, w = gray.shape
+        x1, y1 = max(int(box[0]), 0), max(int(box[1]), 0)
+        x2, y2 = min(int(box[2]) + 1, w), min(int(box[3]) + 1, h)
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            return None
+        pts = cv2.goodFeaturesToTrack(gray[y1:y2, x1:x2], POINTS_PER_BOX, 0.01, 3)
+        if pts is None:
+            return None
+        return (pts + np.float32([x1, y1])).astype(np.float32)
+
+    def _flow(self, prev, gray, pts):
+        nxt, st, _ = cv2.calcOpticalFlowPyrLK(prev, gray, pts, None, **LK_PARAMS)
+        back, st_b, _ = cv2.calcOpticalFlowPyrLK(gray, prev, nxt, None, **LK_PARAMS)
+        good = (st.ravel() == 1) & (st_b.ravel() == 1) & (np.abs(back - pts).reshape(-1, 2).max(axis=1) < FB_ERROR)
+        return nxt, good
+
+    def update(self, gray):
+        """Track all boxes into `gray`; returns mean box confidence (1.0 with no boxes)."""
+        if self.prev is None or not self.boxes:
+            self.prev = gray
+            return 1.0
+        scores = []
+        for i, (box, pts) in enumerate(zip(self.boxes, self.points)):
+            if pts is None or len(pts) < 3:
+                scores.append(0.0)
+                continue
+            nxt, good = self._flow(self.prev, gray, pts)
+            score = good.mean() if len(good) else 0.0
+            scores.append(score)
+            if good.sum() < 3:
+                self.points[i] = None
+                continue
+            old, new = pts[good].reshape(-1, 2), nxt[good].reshape(-1, 2)
+            dx, dy = np.median(new - old, axis=0)
+            # Scale from the change in point spread around the median
+            spread_old = np.median(np.linalg.norm(old - np.median(old, axis=0), axis=1))
+            spread_new = np.median(np.linalg.norm(new - np.median(new, axis=0), axis=1))
+            scale = float(np.clip(spread_new / spread_old, 0.8, 1.25)) if spread_old > 1 else 1.0
+            cx, cy = (box[0] + box[2]) / 2 + dx, (box[1] + box[3]) / 2 + dy
+            hw, hh = (box[2] - box[0]) / 2 * scale, (box[3] - box[1]) / 2 * scale
+            box[:4] = [cx - hw, cy - hh, cx + hw, cy + hh]
+            self.points[i] = new.reshape(-1, 1, 2)
+        self.prev = gray
+        return float(np.mean(scores))
+
+
+class AdaptiveScheduler:
+    """Keyframe detection + tracking in between; thread-safe hand-over of detector results."""
+
+    def __init__(self):
+        self.gate = MotionGate()
+        self.tracker = FlowTracker()
+        self.scale = 1.0                 # frame pixels per tracking pixel
+        self.confidence = 1.0
+        self.last_keyframe = None        # monotonic time of the last requested keyframe
+        self.in_flight = False
+        self.have_detections = False
+        self._force = False              # request_keyframe(): detect on the next possible frame
+        self._lock = threading.Lock()
+        self._pending = None             # (keyframe gray, boxes at tracking scale, source)
+        self.source = None               # on_detections() source of the boxes being tracked
+        # Counters
+        self.frames = 0
+        self.keyframes = 0
+        self.forced = 0
+        self.static_skips = 0
+
+    def _gray(self, frame, frame_width=None):
+        h, w = frame.shape[:2]
+        self.scale = (frame_width or w) / float(TRACK_WIDTH)
+        small = cv2.resize(frame, (TRACK_WIDTH, int(round(h * TRACK_WIDTH / w))), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def step(self, frame, frame_width=None):
+        """Track to this frame and decide on a keyframe. Returns (detections, keyframe gray or None).
+
+        frame_width: full-frame width when `frame` was decoded at reduced size (boxes stay in full-frame pixels).
+        """
+        self.frames += 1
+        gray = self._gray(frame, frame_width)
+
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            keyframe_gray, boxes, self.source = pending
+            self.tracker.reset(keyframe_gray, boxes)
+            self.have_detections = True
+        self.confidence = self.tracker.update(gray)
+
+        keyframe = None
+        if not self.in_flight:
+            now = time.monotonic()
+            since = now - self.last_keyframe if self.last_keyframe is not None else None
+            forced = not self.have_detections or self.confidence < MIN_CONFIDENCE or self._force
+            if forced or since >= STATIC_REFRESH:
+                detect = True
+            elif since >= KEYFRAME_INTERVAL:
+                detect = self.gate.changed(gray)
+                if not detect:
+                    self.static_skips += 1
+            else:
+                detect = False
+            if detect:
+                self._force = False
+                self.in_flight = True
+                self.last_keyframe = now
+                self.keyframes += 1
+                if forced and self.have_detections:
+                    self.forced += 1
+                self.gate.set_reference(gray)
+                keyframe = gray
+        return self.detections(), keyframe
+
+    def on_detections(self, keyframe, detections, source=None):
+        """Detector thread: results for `keyframe` (frame pixels) from `source`; used from the next step()."""
+        s = self.scale
+        boxes = [(x1 / s, y1 / s, x2 / s, y2 / s, conf, cls) for x1, y1, x2, y2, conf, cls in detections]
+        with self._lock:
+            self._pending = (keyframe, boxes, source)
+        self.in_flight = False
+
+    def request_keyframe(self):
+        """Run the detector on the next frame it can take (current boxes are stale, e.g. new model)."""
+        self._force = True
+
+    def on_failed(self):
+        """Detector thread: the keyframe could not be processed; allow a new request."""
+        self.in_flight = False
+
+    def detections(self):
+        s = self.scale
+        return [(float(b[0] * s), float(b[1] * s), float(b[2] * s), float(b[3] * s), b[4], b[5])
+                for b in self.tracker.boxes]
+
+    def stats(self):
+        return {
+            "detect_ratio": round(self.keyframes / self.frames, 3) if self.frames else 0.0,
+            "keyframes": self.keyframes,
+            "forced": self.forced,
+            "static_skips": self.static_skips,
+            "track_conf": round(self.confidence, 2),
+        }
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+inference_worker.py
+-------------
+Runs frame processing (decode + YOLO + annotate + encode) off the asyncio
+event loop with latest-frame-wins scheduling.
+
+- LatestFrameSlot: one-slot hand-off. A new frame replaces any frame still
+  waiting, so the worker always starts on the freshest image and a slow
+  model makes the output skip frames instead of falling behind live.
+- InferenceWorker: background thread taking frames from the slot and
+  calling process(item) -> result; results go to on_result(result, item)
+  (called on the worker thread; hand them to the loop with call_soon_threadsafe).
+- InferenceStats: throughput, detector runs / inference time and end-to-end
+  lag, printed every `interval` seconds and available as a dict via snapshot().
+
+A thread (rather than a process) is enough here: OpenCV and PyTorch release
+the GIL inside decode / inference, and frames do not need to be pickled.
+
+To call externally:
+    slot = LatestFrameSlot()
+    stats = InferenceStats("YOLO")
+    InferenceWorker(slot, process, on_result).start()
+    stats.on_received(slot.put(item))   # from the receive loop, never blocks
+
+Dependencies:
+- threading
+"""
+
+import threading
+import time
+
+
+class LatestFrameSlot:
+    """Thread-safe one-slot mailbox: put() replaces the waiting item, take() blocks for the next one."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.replaced = 0   # items overwritten before the worker took them
+
+    def put(self, item):
+        """Offer a new item; returns True if it replaced one the worker had not taken yet."""
+        with self._cond:
+            replaced = self._item is not None
+            if replaced:
+                self.replaced += 1
+            self._item = item
+            self._cond.notify()
+            return replaced
+
+    def take(self, timeout=None):
+        """Next item, or None on timeout / close."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._item is not None or self._closed, timeout):
+                return None
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        """True once close() was called; take() then returns None instead of waiting."""
+        return self._closed
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100.0))]
+
+
+class InferenceStats:
+    """Throughput / inference time / lag accounting with a periodic console report."""
+
+    def __init__(self, label="YOLO", interval=5.0, extra=None):
+        self.label = label
+        self.interval = interval
+        self.extra = extra      # optional callable -> dict merged into each snapshot
+        self.received = 0
+        self.processed = 0
+        self.inferences = 0
+        self.dropped = 0
+        self._infer = []        # seconds, current window
+        self._lag = []          # received -> result ready (s), current window
+        self._age = []          # robot capture -> result ready (s), needs the frame header
+        self._window_start = time.monotonic()
+        self._window_received = 0
+        self._window_processed = 0
+        self._window_inferences = 0
+        self.last = {}
+
+    def on_received(self, replaced=False):
+        self.received += 1
+        self._window_received += 1
+        if replaced:
+            self.dropped += 1
+
+    def on_inference(self, infer_s):
+        """One detector forward pass took infer_s seconds."""
+        self.inferences += 1
+        self._window_inferences += 1
+        self._infer.append(infer_s)
+
+    def on_processed(self, lag_s, age_s=None):
+        """One output frame was ready lag_s after it was received."""
+        self.processed += 1
+        self._window_processed += 1
+        self._lag.append(lag_s)
+        if age_s is not None:
+            self._age.append(age_s)
+        if time.monotonic() - self._window_start >= self.interval:
+            self.report()
+
+    def snapshot(self):
+        elapsed = max(time.monotonic() - self._window_start, 1e-6)
+        snap = {
+            "fps_in": round(self._window_received / elapsed, 1),
+            "fps_out": round(self._window_processed / elapsed, 1),
+            "detect_fps": round(self._window_inferences / elapsed, 1),
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "infer_p50_ms": round(_percentile(self._infer, 50) * 1000, 1),
+            "infer_p95_ms": round(_percentile(self._infer, 95) * 1000, 1),
+            "lag_p50_ms": round(_percentile(self._lag, 50) * 1000, 1),
+            "lag_p95_ms": round(_percentile(self._lag, 95) * 1000, 1),
+        }
+        if self._age:
+            snap["age_p50_ms"] = round(_percentile(self._age, 50) * 1000, 1)
+        if self.extra is not None:
+            snap.update(self.extra())
+        return snap
+
+    def report(self):
+        self.last = snap = self.snapshot()
+        age = f", glass age p50 {snap['age_p50_ms']:.0f} ms" if "age_p50_ms" in snap else ""
+        print(f"[{self.label}] in {snap['fps_in']} fps, out {snap['fps_out']} fps, detect {snap['detect_fps']} fps, "
+              f"dropped {snap['dropped']}, infer p50 {snap['infer_p50_ms']} / p95 {snap['infer_p95_ms']} ms, "
+              f"lag p50 {snap['lag_p50_ms']} / p95 {snap['lag_p95_ms']} ms{age}")
+        if self.extra is not None:
+            print(f"[{self.label}] {self.extra()}")
+        self._infer, self._lag, self._age = [], [], []
+        self._window_start = time.monotonic()
+        self._window_received = self._window_processed = self._window_inferences = 0
+
+
+class InferenceWorker(threading.Thread):
+    """Daemon thread: take the newest frame, process it, hand the result on."""
+
+    def __init__(self, slot, process, on_result, name="inference"):
+        super().__init__(daemon=True, name=name)
+        self.slot = slot
+        self.process = process
+        self.on_result = on_result
+
+    def run(self):
+        while True:
+            item = self.slot.take(timeout=1.0)
+            if item is None:
+                if self.slot.closed:
+                    return
+                continue
+            try:
+                result = self.process(item)
+            except Exception as e:
+                print(f"[ERROR] Processing frame failed: {e}")
+                continue
+            if result is not None:
+                self.on_result(result, item)
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+model_config.py
+-------------
+Detector model list and input shapes, shared by camera_processing.py and
+the model benchmark (benchmarks/model_bench.py). Paths are relative to
+the camera_vision directory.
+
+To call externally:
+    from model_config import MODEL_PATHS, MODEL_PATH_IDX, SQUARE_IMGSZ, RECT_IMGSZ
+
+Dependencies:
+- none
+"""
+
+MODEL_PATHS = ["models/NoIR/Archive/best_NoIR_v1_sq.pt",
+               "models/NoIR/square/best_v5_sq_NoIR.pt",
+               "models/NoIR/rectangle/best_v5_rt_NoIR.pt",
+               "models/NoIR/rectangle/best_v9_rt_NoIR.pt"]
+MODEL_PATH_IDX = 1
+SQUARE_IMGSZ = (640, 640)       # (h, w) model input for square-trained models
+RECT_IMGSZ = (480, 640)         # (h, w) model input for rectangle/ models (4:3, matches the camera)
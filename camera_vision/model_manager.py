@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+model_manager.py
+-------------
+Lazy, cached detector loading with warm-up and atomic hot-swap.
+
+- Models are loaded on first use (inference_engine.create_engine, so the
+  cached ONNX export is reused) and kept in an LRU of `capacity` loaded
+  models; the least recently used one is dropped when it overflows (never
+  the active one or the one being loaded, so while a swap is in progress one
+  extra model may be resident; it is evicted once the swap completes).
+- Each model is warmed up with dummy inferences (a padding-grey image of its
+  input shape) before it is put into service, so the first real keyframe
+  does not pay for lazy allocations / kernel selection.
+- activate() loads and warms the new model on the calling thread (run it
+  off the event loop, e.g. asyncio.to_thread) while the detector keeps using
+  the current one, then swaps `active` with one reference assignment. The
+  detector reads `active` once per keyframe, so a frame is processed
+  entirely by the old or entirely by the new model and none are dropped.
+
+Models are addressed by index into the path list, by path, or by file name.
+
+To call externally:
+    models = ModelManager(MODEL_PATHS, "onnxruntime", capacity=2)
+    models.activate(1)                    # blocking: load + warm-up + swap
+    model = models.active                 # LoadedModel: engine, preprocessor, names, shape
+    detections = model.engine.predict(model.preprocessor(jpeg)[0])
+
+Dependencies:
+- numpy
+- inference_engine.py, preprocess.py
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from inference_engine import create_engine
+from preprocess import PAD_VALUE, Preprocessor, inference_shape
+
+WARMUP_RUNS = 2
+
+
+class LoadedModel:
+    """A warmed-up engine plus its own input preprocessor (detector thread only)."""
+
+    def __init__(self, path, engine, shape, load_s, warmup_s):
+        self.path = path
+        self.engine = engine
+        self.shape = shape
+        self.preprocessor = Preprocessor(shape)
+        self.load_s = load_s
+        self.warmup_s = warmup_s
+
+    @property
+    def names(self):
+        return self.engine.names
+
+    def describe(self):
+        return {"model": self.path, "engine": self.engine.name, "input": f"{self.shape[1]}x{self.shape[0]}",
+                "load_s": round(self.load_s, 2), "warmup_s": round(self.warmup_s, 3)}
+
+
+class ModelManager:
+    """LRU of loaded detector models with one active model, swapped atomically."""
+
+    def __init__(self, paths, engine="torch", capacity=2, threads=None, int8=False, calib_dir=None,
+                 square=(640, 640), rectangle=(480, 640), warmup_runs=WARMUP_RUNS):
+        self.paths = list(paths)
+        self.engine = engine
+        self.capacity = max(1, capacity)
+        self.threads = threads
+        self.int8 = int8
+        self.calib_dir = calib_dir
+        self.square = square
+        self.rectangle = rectangle
+        self.warmup_runs = warmup_runs
+        self.active = None                  # LoadedModel in service (read by the detector thread)
+        self._models = OrderedDict()        # path -> LoadedModel, least recently used first
+        self._lock = threading.RLock()      # serialises loads / swaps
+
+    def resolve(self, key):
+        """Model path for an index, a path from the list, or a file name (ValueError if unknown)."""
+        if isinstance(key, int) or (isinstance(key, str) and key.strip().isdigit()):
+            index = int(key)
+            if 0 <= index < len(self.paths):
+                return self.paths[index]
+            raise ValueError(f"model index {index} out of range (0-{len(self.paths) - 1})")
+        if isinstance(key, str):
+            for path in self.paths:
+                if key == path or key == os.path.basename(path) or key == os.path.splitext(os.path.basename(path))[0]:
+                    return path
+        raise ValueError(f"unknown model: {key}")
+
+    def _load(self, path):
+        start = time.perf_counter()
+        shape = inference_shape(path, self.square, self.rectangle)
+        engine = create_engine(path, shape, self.engine, threads=self.threads, int8=self.int8,
+                               calib_dir=self.calib_dir)
+        load_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        dummy = np.full((shape[0], shape[1], 3), PAD_VALUE, np.uint8)
+        for _ in range(self.warmup_runs):
+            engine.predict(dummy)
+        warmup_s = time.perf_counter() - start
+        print(f"[MODEL] Loaded {path} in {load_s:.1f}s, warm-up {warmup_s * 1000:.0f} ms")
+        return LoadedModel(path, engine, shape, load_s, warmup_s)
+
+    def get(self, key):
+        """Loaded (and warmed-up) model for key, loading it on first use. Blocking."""
+        path = self.resolve(key)
+        with self._lock:
+            model = self._models.get(path)
+            if model is not None:
+                self._models.move_to_end(path)
+                return model
+            model = self._load(path)
+            self._models[path] = model
+            # Keep the model in service until activate() swaps it out (capacity may be exceeded by one)
+            self._evict(path, self.active.path if self.active else None)
+            return model
+
+    def _evict(self, *keep):
+        """Drop least recently used models beyond capacity, never one of keep."""
+        for old in list(self._models):
+            if len(self._models) <= self.capacity:
+                break
+            if old not in keep:
+                del self._models[old]       # freed once the detector drops its last reference
+                print(f"[MODEL] Evicted {old}")
+
+    def activate(self, key):
+        """Load / warm up key if needed, then put it into service. Returns (model, was_cached)."""
+        with self._lock:
+            cached = self.resolve(key) in self._models
+            model = self.get(key)
+            self.active = model             # single reference swap: atomic for the detector thread
+            self._evict(model.path)         # the previous model, if it was only kept for the swap
+        print(f"[MODEL] Active: {model.path} ({model.engine.name})")
+        return model, cached
+
+    def stats(self):
+        return {"active": self.active.path if self.active else None, "loaded": list(self._models),
+                "models": self.paths, "capacity": self.capacity}
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+preprocess.py
+-------------
+Detector input preparation straight from the received JPEG bytes.
+
+- The JPEG's size is read from its SOF header (no decode), and the frame is
+  decoded with IMREAD_REDUCED_COLOR_2/4/8 when the model input is at least
+  that much smaller, so the DCT does the downscaling instead of a full decode
+  followed by a resize.
+- The decoded image is letterboxed into a preallocated buffer of the model's
+  input shape (pad colour 114, as in ultralytics); only the part that changes
+  is written each frame, and an image that already fits exactly is used as is.
+- Models trained on rectangular 4:3 images (the rectangle/ models) use a
+  4:3 input, so a 4:3 camera frame fills it with no padding.
+- BoxTransform maps boxes from model input coordinates back to full-frame
+  pixels exactly (per-axis scales from the real decoded / resized sizes).
+
+Because the buffer already has the model's input shape, ultralytics' own
+LetterBox step is a no-op (pass imgsz=buffer shape to predict).
+
+decode_min_width() applies the same reduced decode to frames that are only
+needed small (e.g. for tracking when no annotated output is wanted).
+
+To call externally:
+    prep = Preprocessor((480, 640))
+    image, transform = prep(jpeg_bytes)
+    boxes = transform.to_frame(xyxy)      # list of [x1, y1, x2, y2] in full-frame pixels
+    small, (frame_w, frame_h) = decode_min_width(jpeg_bytes, 320)
+
+Dependencies:
+- cv2
+- numpy
+"""
+
+import cv2
+import numpy as np
+
+PAD_VALUE = 114
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+# SOFn markers carrying the frame size (not DHT C4, JPG C8, DAC CC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(data):
+    """(width, height) from a JPEG's SOF segment, or None if it cannot be found."""
+    data = memoryview(data)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        length = (data[i + 2] << 8) | data[i + 3]
+        if marker in _SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        i += 2 + length
+    return None
+
+
+def decode_min_width(jpeg, min_width):
+    """Decode at the largest JPEG reduction that keeps at least min_width columns.
+
+    Returns (image or None, (full width, full height)); the full size is the JPEG's own,
+    or (0, 0) if the data cannot be decoded.
+    """
+    if not jpeg:
+        return None, (0, 0)
+    size = jpeg_size(jpeg)
+    flag = cv2.IMREAD_COLOR
+    if size:
+        for factor, reduced in REDUCED_FLAGS:
+            if size[0] // factor >= min_width:
+                flag = reduced
+                break
+    image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), flag)
+    if image is None:
+        return None, size or (0, 0)
+    return image, size or (image.shape[1], image.shape[0])
+
+
+class BoxTransform:
+    """Model-input coordinates -> full-frame pixels."""
+
+    def __init__(self, sx, sy, dx, dy, frame_w, frame_h):
+        self.sx, self.sy = sx, sy      # full-frame pixels per model-input pixel
+        self.dx, self.dy = dx, dy      # letterbox padding (model-input pixels)
+        self.frame_w, self.frame_h = frame_w, frame_h
+
+    def to_frame(self, boxes):
+        out = []
+        for x1, y1, x2, y2 in boxes:
+            out.append([
+                min(max((x1 - self.dx) * self.sx, 0.0), self.frame_w),
+                min(max((y1 - self.dy) * self.sy, 0.0), self.frame_h),
+                min(max((x2 - self.dx) * self.sx, 0.0), self.frame_w),
+                min(max((y2 - self.dy) * self.sy, 0.0), self.frame_h),
+            ])
+        return out
+
+
+class Preprocessor:
+    """JPEG bytes -> letterboxed model input (reused buffer) + BoxTransform."""
+
+    def __init__(self, shape, swap_rb=True):
+        self.shape = tuple(shape)          # (height, width) of the model input
+        self.swap_rb = swap_rb             # camera frames arrive R/B swapped relative to the model's training data
+        self.buffer = np.full((self.shape[0], self.shape[1], 3), PAD_VALUE, np.uint8)
+        self._geometry = None              # (new_w, new_h, dx, dy) of the last frame
+        self.reduction = 1                 # DCT reduction factor used for the last frame
+
+    def _reduction(self, width, height):
+        """Largest JPEG reduction that still leaves at least the model's resolution."""
+        r = min(self.shape[0] / height, self.shape[1] / width)
+        for factor, flag in REDUCED_FLAGS:
+            if factor * r <= 1.0:
+                return factor, flag
+        return 1, cv2.IMREAD_COLOR
+
+    def __call__(self, jpeg):
+        """Decode and letterbox; returns (model input, BoxTransform) or (None, None) if the JPEG is invalid.
+
+        The model input is the shared buffer (valid until the next call), or the decoded
+        image itself when it already has the model's input shape.
+        """
+        size = jpeg_size(jpeg)
+        self.reduction, flag = self._reduction(*size) if size else (1, cv2.IMREAD_COLOR)
+        image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), flag)
+        if image is None:
+            return None, None
+        dh, dw = image.shape[:2]
+        frame_w, frame_h = size if size else (dw, dh)
+
+        h, w = self.shape
+        r = min(h / dh, w / dw)
+        new_w, new_h = int(round(dw * r)), int(round(dh * r))
+        dx, dy = (w - new_w) // 2, (h - new_h) // 2
+        transform = BoxTransform(frame_w / new_w, frame_h / new_h, dx, dy, frame_w, frame_h)
+        if (dw, dh) == (w, h):
+            # Decoded image already is the model input (e.g. 4:3 frame, 4:3 model): use it as is
+            if self.swap_rb:
+                cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=image)
+            return image, transform
+
+        geometry = (new_w, new_h, dx, dy)
+        if geometry != self._geometry:
+            self.buffer[:] = PAD_VALUE     # padding only needs repainting when the layout changes
+            self._geometry = geometry
+
+        target = self.buffer[dy:dy + new_h, dx:dx + new_w]
+        if (new_w, new_h) == (dw, dh):
+            target[:] = image  # reduced decode already hit the size: just place it
+        else:
+            cv2.resize(image, (new_w, new_h), dst=target, interpolation=cv2.INTER_AREA if r < 1 else cv2.INTER_LINEAR)
+        if self.swap_rb:
+            cv2.cvtColor(target, cv2.COLOR_RGB2BGR, dst=target)
+        return self.buffer, transform
+
+
+def inference_shape(model_path, square=(640, 640), rectangle=(480, 640)):
+    """(height, width) input for a model: 4:3 for models trained on rectangular images."""
+    return tuple(rectangle) if "rectangle" in model_path.replace("\\", "/").split("/") else tuple(square)
@@ -6,6 +6,7 @@ window.CONFIG = {
   VIDEO_PORT: 9002,         // WebSocket Port for vision model feed
   CONNECT_ON_PAGE_LOAD: false,
   DEFAULT_TO_PINK: false,    // default to cute layout
+  DETECTION_OVERLAY: true,   // draw YOLO boxes over the raw feed (detection metadata from VIDEO_PORT)
   FPS_UPDATE_INTERVAL: 2   // seconds between FPS updates
 };
 
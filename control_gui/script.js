@@ -46,6 +46,7 @@ openBtn.addEventListener("click", () => {
   document.getElementById("cfg-auto").checked = CONFIG.CONNECT_ON_PAGE_LOAD;
   document.getElementById("cfg-yassify").checked = CONFIG.DEFAULT_TO_PINK;
   document.getElementById("cfg-FPSinterval").value = CONFIG.FPS_UPDATE_INTERVAL;
+  document.getElementById("cfg-overlay").checked = CONFIG.DETECTION_OVERLAY;
 
   modal.style.display = "block";
 });
@@ -74,6 +75,7 @@ function saveConfig() {
   CONFIG.FPS_UPDATE_INTERVAL = parseFloat(document.getElementById("cfg-FPSinterval").value);
   CONFIG.CONNECT_ON_PAGE_LOAD = document.getElementById("cfg-auto").checked;
   CONFIG.DEFAULT_TO_PINK = document.getElementById("cfg-yassify").checked;
+  CONFIG.DETECTION_OVERLAY = document.getElementById("cfg-overlay").checked;
 
   localStorage.setItem("robotConfig", JSON.stringify(CONFIG));
   addLogEntry("Config saved to local storage", "info");
@@ -94,7 +96,8 @@ document.addEventListener("DOMContentLoaded", () => {
   connection_info.innerHTML += `
     CMD: ws://${CONFIG.RPI_IP}:${CONFIG.CMD_PORT} <span id="CMD-icon" class='material-icons disconnected'>circle</span><br>
     CAM: ws://${CONFIG.RPI_IP}:${CONFIG.RAW_VIDEO_PORT} <span id="CAM-icon" class='material-icons disconnected'>circle</span><br>                              
-    DET: ws://localhost:${CONFIG.VIDEO_PORT}<span>&nbsp;&nbsp;&nbsp;</span><span id="DET-icon" class='material-icons disconnected'>circle</span>`;
+    DET: ws://localhost:${CONFIG.VIDEO_PORT}<span>&nbsp;&nbsp;&nbsp;</span><span id="DET-icon" class='material-icons disconnected'>circle</span><br>
+    OVL: ws://localhost:${CONFIG.VIDEO_PORT}/?mode=meta <span id="OVL-icon" class='material-icons disconnected'>circle</span>`;
 
   // If config set to connect on page load, do so
   if (CONFIG.CONNECT_ON_PAGE_LOAD == true) {
@@ -116,13 +119,16 @@ document.addEventListener("DOMContentLoaded", () => {
 let cmdManager;             // Command WebSocket manager
 let rawVideoManager;        // Video WebSocket manager
 let processedVideoManager;  // Processed Video WebSocket manager
+let detectionManager;       // Detection metadata WebSocket manager (overlay on the raw feed)
 
 class WebSocketManager {
-  constructor({url, label, onMessage, iconId}) {
+  constructor({url, label, onMessage, iconId, optional = false, onClose = null}) {
     this.url = url;              // WebSocket URL
     this.iconId = iconId;       // ID of the icon element to update connection status
     this.label = label;         // Shown in logs, e.g., "CMD" or "DET"
     this.onMessage = onMessage; // Message handler function
+    this.optional = optional;   // Optional extras leave the Connect button alone and only warn on errors
+    this.onClose = onClose;     // Called after the socket errors or closes
     this.socket = null;         // Create WebSocket instance
   }
 
@@ -133,7 +139,7 @@ class WebSocketManager {
     addLogEntry(`Attempting ${this.label} connection on ${this.url}`, "info");
     this.socket.onopen = () => {
       addLogEntry(`${this.label} WebSocket connected`, "info");
-      document.getElementById("websocket-connect-button").disabled = true;
+      if (!this.optional) document.getElementById("websocket-connect-button").disabled = true;
       updateIcon(this.iconId, "connected");
       // Latency checks for COMMAND websocket
       if (this.label == "Command"){
@@ -142,15 +148,17 @@ class WebSocketManager {
     };
 
     this.socket.onerror = () => {
-      addLogEntry(`${this.label} WebSocket connection error`, "error");
-      document.getElementById("websocket-connect-button").disabled = false;
+      addLogEntry(`${this.label} WebSocket connection error`, this.optional ? "warn" : "error");
+      if (!this.optional) document.getElementById("websocket-connect-button").disabled = false;
       updateIcon(this.iconId, "disconnected");
+      if (this.onClose) this.onClose();
     };
 
     this.socket.onclose = () => {
       addLogEntry(`${this.label} WebSocket closed`, "warn");
-      document.getElementById("websocket-connect-button").disabled = false;
+      if (!this.optional) document.getElementById("websocket-connect-button").disabled = false;
       updateIcon(this.iconId, "disconnected");
+      if (this.onClose) this.onClose();
     };
 
     this.socket.onmessage = this.onMessage;
@@ -175,12 +183,14 @@ class WebSocketManager {
 
 }
 
+let lastLatencyMs = null;    // Last measured round trip, reported back so the Pi can adapt video quality
+
 function startLatencyChecks(socket) {
   // Checks latency every 5 seconds
   setInterval(() => {
     if (socket.readyState == WebSocket.OPEN){
       const timestamp = Date.now();
-      const payload = JSON.stringify({ action: "PING", timestamp});
+      const payload = JSON.stringify({ action: "PING", timestamp, rtt: lastLatencyMs});
       socket.send(payload);
     }
   }, 5000);
@@ -218,7 +228,7 @@ function webSocketReconnect() {
     onMessage: handleCommandMessage
   });
   rawVideoManager = new WebSocketManager({
-    url: `ws://${CONFIG.RPI_IP}:${CONFIG.RAW_VIDEO_PORT}`,
+    url: `ws://${CONFIG.RPI_IP}:${CONFIG.RAW_VIDEO_PORT}/?header=1`,  // frames carry seq / capture time
     iconId: "CAM-icon",
     label: "Camera",
     onMessage: handleVideoMessage
@@ -229,10 +239,19 @@ function webSocketReconnect() {
     label: "YOLO",
     onMessage: handleVideoMessage
   });
+  detectionManager = new WebSocketManager({
+    url: `ws://localhost:${CONFIG.VIDEO_PORT}/?mode=meta`,  // boxes only, matched to raw frames by seq
+    iconId: "OVL-icon",
+    label: "Detections",
+    onMessage: handleDetectionMessage,
+    optional: true,                 // overlay only: the video and command links do not depend on it
+    onClose: clearDetectionOverlay  // stale boxes would otherwise stay frozen over the live feed
+  });
 
   // Connect cmd and raw video websockets
   cmdManager.connect();
   rawVideoManager.connect();
+  if (CONFIG.DETECTION_OVERLAY) detectionManager.connect();
 }
 
 
@@ -241,11 +260,14 @@ function switchVideoFeed() {
     // If raw video is active, switch to processed, and vice versa
     if (rawVideoManager.socket.readyState == 1) {
       rawVideoManager.close();
+      detectionManager.close();   // processed feed has the boxes drawn in
+      clearDetectionOverlay();
       processedVideoManager.connect();
     }
     else if (processedVideoManager.socket.readyState == 1) {
       processedVideoManager.close();
       rawVideoManager.connect();
+      if (CONFIG.DETECTION_OVERLAY) detectionManager.connect();
     }
     else {
       addLogEntry("No video feed active to switch, defaulting to raw feed", "warn");
@@ -268,9 +290,39 @@ function switchVideoFeed() {
 let fpsFrameCount = 0;
 let fps = 0;
 let lastFpsUpdate = performance.now();
-function handleVideoMessage(event) {
+
+// Frame header (script/utils/frame_header.py, v1, 32 bytes big-endian):
+// "RV" | u8 version | u8 header length | u32 seq | u32 capture seq | f64 capture time | f64 encode time | u8 mode | u8 flags
+const FRAME_HEADER_SIZE = 32;
+let lastFrameSeq = null;
+let frameGaps = 0;        // frames lost between the Pi and the GUI
+let frameAges = [];       // capture -> received (ms) since the last readout update
+
+async function parseFrameHeader(blob) {
+  // Returns {seq, captureTs, mode, length} or null for a bare JPEG (e.g. the processed feed)
+  if (blob.size < FRAME_HEADER_SIZE) return null;
+  const view = new DataView(await blob.slice(0, FRAME_HEADER_SIZE).arrayBuffer());
+  if (view.getUint8(0) != 0x52 || view.getUint8(1) != 0x56) return null;  // "RV"
+  return {
+    length: view.getUint8(3),
+    seq: view.getUint32(4),
+    captureTs: view.getFloat64(12),
+    mode: view.getUint8(28),
+  };
+}
+
+async function handleVideoMessage(event) {
   if (event.data instanceof Blob) {
-    const url = URL.createObjectURL(event.data);
+    let image = event.data;
+    const header = await parseFrameHeader(image);
+    if (header) {
+      image = image.slice(header.length, image.size, "image/jpeg");
+      frameAges.push(Date.now() - header.captureTs * 1000);  // needs Pi / laptop clocks in sync (NTP)
+      if (lastFrameSeq !== null && header.seq > lastFrameSeq) frameGaps += header.seq - lastFrameSeq - 1;
+      lastFrameSeq = header.seq;
+      showDetectionsFor(header.seq);
+    }
+    const url = URL.createObjectURL(image);
     const videoEl = document.getElementById("video");
     videoEl.src = url;
 
@@ -285,7 +337,13 @@ function handleVideoMessage(event) {
       fps = fpsFrameCount / delta;
       fpsFrameCount = 0;
       lastFpsUpdate = now;
-      document.getElementById("fps-readout").textContent = `FPS: ${fps.toFixed(1)}`;}
+      let readout = `FPS: ${fps.toFixed(1)}`;
+      if (frameAges.length) {
+        frameAges.sort((a, b) => a - b);
+        readout += ` | Age: ${frameAges[Math.floor(frameAges.length / 2)].toFixed(0)} ms | Gaps: ${frameGaps}`;
+        frameAges = [];
+      }
+      document.getElementById("fps-readout").textContent = readout;}
 
   } else {
     console.warn("Unexpected video message type:", event.data);
@@ -295,12 +353,96 @@ function handleVideoMessage(event) {
 
 }
 
+// -------------------------------------------
+// Detection overlay (metadata from camera_processing.py, ?mode=meta)
+// -------------------------------------------
+// Messages: {head: "classes", names: {id: name}} and
+// {head: "detections", seq, boxes: [[x1, y1, x2, y2, score, class], ...]} with coordinates normalised 0-1.
+// Boxes are drawn for the raw frame with the same header seq; detections usually arrive a little after
+// their frame, so until they do the newest earlier set is shown (the tracker moves boxes smoothly).
+const DETECTION_BUFFER = 60;          // frames of detections kept for matching
+const DETECTION_COLORS = ["#ff3838", "#ff9d97", "#ff701f", "#ffb21d", "#cfd231", "#48f90a"];
+let detectionNames = {};
+let detectionModel = null;    // model the names belong to; boxes from any other model are skipped
+let detectionsBySeq = new Map();
+let drawnDetectionSeq = null;
+
+function handleDetectionMessage(event) {
+  if (typeof event.data !== "string") return;
+  let msg;
+  try {
+    msg = JSON.parse(event.data);
+  } catch (e) {
+    console.error("Failed to parse detection message:", e);
+    return;
+  }
+  if (msg.head == "classes") {
+    if (msg.model !== detectionModel) clearDetectionOverlay();  // old boxes carry the old class ids
+    detectionNames = msg.names || {};
+    detectionModel = msg.model;
+  }
+  else if (msg.head == "detections" && msg.seq !== null && msg.model === detectionModel) {
+    detectionsBySeq.set(msg.seq, msg.boxes);
+    for (const seq of detectionsBySeq.keys()) {   // Map keeps insertion order: oldest first
+      if (detectionsBySeq.size <= DETECTION_BUFFER) break;
+      detectionsBySeq.delete(seq);
+    }
+    if (msg.seq == lastFrameSeq) showDetectionsFor(msg.seq);  // its frame is already on screen
+  }
+  else if (msg.status == "error") {
+    addLogEntry(`Detections: ${msg.msg}`, "error");
+  }
+}
+
+function showDetectionsFor(seq) {
+  if (!detectionManager || !detectionManager.socket || detectionManager.socket.readyState != 1) return;
+  let match = detectionsBySeq.has(seq) ? seq : null;
+  if (match === null) {
+    // Not here yet: newest detections for an earlier frame
+    for (const s of detectionsBySeq.keys()) {
+      if (s < seq && (match === null || s > match)) match = s;
+    }
+  }
+  if (match === null || match === drawnDetectionSeq) return;
+  drawDetections(detectionsBySeq.get(match));
+  drawnDetectionSeq = match;
+}
+
+function drawDetections(boxes) {
+  const canvas = document.getElementById("detection-overlay");
+  const ctx = canvas.getContext("2d");
+  ctx.clearRect(0, 0, canvas.width, canvas.height);
+  ctx.lineWidth = 2;
+  ctx.font = "14px sans-serif";
+  for (const [x1, y1, x2, y2, score, cls] of boxes) {
+    const x = x1 * canvas.width, y = y1 * canvas.height;
+    const w = (x2 - x1) * canvas.width, h = (y2 - y1) * canvas.height;
+    const color = DETECTION_COLORS[cls % DETECTION_COLORS.length];
+    const label = `${detectionNames[cls] ?? cls} ${score.toFixed(2)}`;
+    ctx.strokeStyle = color;
+    ctx.strokeRect(x, y, w, h);
+    const textWidth = ctx.measureText(label).width;
+    ctx.fillStyle = color;
+    ctx.fillRect(x, y - 18, textWidth + 6, 18);
+    ctx.fillStyle = "#ffffff";
+    ctx.fillText(label, x + 3, y - 4);
+  }
+}
+
+function clearDetectionOverlay() {
+  const canvas = document.getElementById("detection-overlay");
+  canvas.getContext("2d").clearRect(0, 0, canvas.width, canvas.height);
+  detectionsBySeq.clear();
+  drawnDetectionSeq = null;
+}
+
 function handleCommandMessage(event) {
   try {
     const msg = JSON.parse(event.data);
     // Handle PONG message from server for latency checks
     if (msg.action == "PONG" && msg.timestamp){
       const latency = Date.now() - msg.timestamp;
+      lastLatencyMs = latency;
       document.getElementById("latency-display").textContent = `Latency: ${latency.toFixed(1)} ms`;
       addLogEntry(`WebSocket latency: ${latency.toFixed(1)} ms`, "info")
       return;
@@ -318,6 +460,12 @@ function handleCommandMessage(event) {
     else if (msg.head == 'velocity_update') {
       updateVelocity(msg.vel, msg.l, msg.r);
     }
+    else if (msg.head == 'ack' || msg.head == 'batch') {
+      // Command acknowledgements (request id + handling time); nothing to display
+    }
+    else if (msg.head == 'video_quality') {
+      addLogEntry(`Video ${msg.client}: ${msg.width}x${msg.height} q${msg.quality} (${msg.reason})`, "info");
+    }
     else {
       console.warn("Unknown command message type:", msg);
     }
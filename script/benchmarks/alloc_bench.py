@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+alloc_bench.py
+--------------
+Per-frame allocation benchmark for the flip -> enhance -> encode path.
+
+Compares:
+- legacy:   the original camera_stream path (cv2.flip, enhance_frame with a fresh
+            array per stage + unconditional cv2.resize, cv2.imencode, tobytes()).
+- pipeline: flip into a preallocated ring slot + utils.frame_pipeline.FramePipeline.
+
+For each path and enhancement mode it reports, per frame:
+- arrays allocated by OpenCV calls (calls that did not write into a dst= buffer) and their bytes
+- bytes copies made by tobytes()
+- peak transient traced memory (tracemalloc, numpy data buffers included)
+- time per frame
+
+Usage:
+    python script/benchmarks/alloc_bench.py [--frames 300] [--width 640] [--height 480]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+import utils.video_enhancer as enhance
+from utils.frame_pipeline import FramePipeline
+from utils.frame_ring import FrameRing
+
+JPEG_QUALITY = 50
+SETTINGS = {"brightness": 50, "contrast": 50, "gamma_val": 300}
+COUNTED = ["flip", "cvtColor", "LUT", "convertScaleAbs", "equalizeHist", "extractChannel",
+           "split", "merge", "resize", "imencode"]
+
+
+class AllocCounter:
+    """Wraps cv2 functions to count output arrays that were freshly allocated."""
+
+    def __init__(self):
+        self.arrays = 0
+        self.bytes = 0
+        self._originals = {}
+
+    def _wrap(self, name, fn):
+        def wrapper(*args, **kwargs):
+            result = fn(*args, **kwargs)
+            dst = kwargs.get("dst")
+            outputs = result if isinstance(result, (tuple, list)) else (result,)
+            for out in outputs:
+                if isinstance(out, np.ndarray) and out is not dst:
+                    self.arrays += 1
+                    self.bytes += out.nbytes
+            return result
+        return wrapper
+
+    def __enter__(self):
+        for name in COUNTED:
+            fn = getattr(cv2, name)
+            self._originals[name] = fn
+            setattr(cv2, name, self._wrap(name, fn))
+        return self
+
+    def __exit__(self, *exc):
+        for name, fn in self._originals.items():
+            setattr(cv2, name, fn)
+
+
+def legacy_process(raw, mode):
+    """Original per-frame path (allocates at every stage)."""
+    frame = cv2.flip(raw, -1)
+    if mode:
+        frame = enhance.enhance_frame(frame, mode=mode, **SETTINGS)
+        h, w = frame.shape[:2]
+        frame = cv2.resize(frame, (w, h))  # old enhance_frame always resized
+    ret_enc, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    return buffer.tobytes(), 1
+
+
+def make_pipeline_process(shape):
+    ring = FrameRing(shape)
+    pipeline = FramePipeline(JPEG_QUALITY)
+
+    def process(raw, mode):
+        cv2.flip(raw, -1, dst=ring.writable())
+        ring.commit()
+        _, _, frame = ring.acquire()
+        try:
+            if mode:
+                frame = pipeline.enhance(frame, mode=mode, **SETTINGS)
+            return pipeline.encode(frame), 0
+        finally:
+            ring.release()
+    return process
+
+
+def run(process, raws, mode):
+    counter = AllocCounter()
+    copies = 0
+    peaks = []
+    process(raws[0], mode)  # warm-up (pool / LUT / CLAHE allocation)
+    tracemalloc.start()
+    start = time.perf_counter()
+    with counter:
+        for raw in raws:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            _, n_copies = process(raw, mode)
+            copies += n_copies
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    n = len(raws)
+    return {
+        "arrays/frame": counter.arrays / n,
+        "KiB allocated/frame": counter.bytes / n / 1024,
+        "tobytes/frame": copies / n,
+        "peak KiB/frame": float(np.mean(peaks)) / 1024,
+        "ms/frame": elapsed / n * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Allocations per frame, legacy path vs FramePipeline.")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    shape = (args.height, args.width, 3)
+    # A handful of distinct noisy frames, cycled
+    raws = [cv2.GaussianBlur(rng.integers(0, 256, shape, dtype=np.uint8), (5, 5), 0) for _ in range(8)]
+    raws = [raws[i % len(raws)] for i in range(args.frames)]
+
+    pipeline_process = make_pipeline_process(shape)
+    header = f"{'mode':<10}{'path':<10}" + "".join(f"{k:>22}" for k in
+              ["arrays/frame", "KiB allocated/frame", "tobytes/frame", "peak KiB/frame", "ms/frame"])
+    print(header)
+    print("-" * len(header))
+    for mode, label in [(0, "off"), (1, "manual"), (2, "histeq"), (3, "clahe")]:
+        for name, process in [("legacy", legacy_process), ("pipeline", pipeline_process)]:
+            result = run(process, raws, mode)
+            print(f"{label:<10}{name:<10}" + "".join(f"{v:>22.2f}" for v in result.values()))
+
+
+if __name__ == "__main__":
+    main()
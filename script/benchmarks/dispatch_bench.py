@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+dispatch_bench.py
+-----------------
+Microbenchmark for the command dispatcher (servers.command_registry) using the
+real command table from servers.command_server on the simulated hardware.
+
+Each message goes through the same steps as on the command socket: json.loads,
+registry.dispatch (lookup, argument validation, handler, timed response) and
+json.dumps of the response. The WebSocket itself is not involved.
+
+Reports messages/s and commands/s for:
+- single drive commands (FORWARD / DRIVE_STOP)
+- a legacy positional command string ("SET_BRIGHTNESS 50")
+- a named-argument command ({"action": "SET_DUTY", "args": {...}})
+- PING
+- a batch of 10 commands in one message
+- an unknown command (error path)
+
+Usage:
+    python script/benchmarks/dispatch_bench.py [--messages 20000]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+# Simulated hardware must be selected before config is imported
+os.environ.setdefault("ROBOT_SIM", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+config.LOGGING = False  # measure dispatch only, not the command log
+
+from servers.command_server import registry
+
+
+class FakeWebSocket:
+    remote_address = ("127.0.0.1", 0)
+
+
+CASES = {
+    "drive": [json.dumps({"action": "FORWARD", "id": 1}), json.dumps({"action": "DRIVE_STOP", "id": 2})],
+    "legacy_args": [json.dumps({"action": "SET_BRIGHTNESS 50"})],
+    "named_args": [json.dumps({"action": "SET_DUTY", "args": {"min_duty": 40, "max_duty": 100}, "id": 3})],
+    "ping": [json.dumps({"action": "PING", "timestamp": 1234567890})],
+    "batch_10": [json.dumps({"batch": [{"action": "SET_CONTRAST", "args": [i]} for i in range(10)], "id": 4})],
+    "unknown": [json.dumps({"action": "FLY"})],
+}
+COMMANDS_PER_MESSAGE = {"batch_10": 10}
+
+
+async def run_case(messages, count):
+    ws = FakeWebSocket()
+    start = time.perf_counter()
+    for i in range(count):
+        response = await registry.dispatch(ws, json.loads(messages[i % len(messages)]))
+        if response is not None:
+            json.dumps(response)
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000, help="messages per case")
+    args = parser.parse_args()
+
+    print(f"{len(registry.names())} registered commands\n")
+    print(f"{'case':<12} {'msgs/s':>10} {'cmds/s':>10} {'us/msg':>8}")
+    for name, messages in CASES.items():
+        with contextlib.redirect_stdout(io.StringIO()):  # handlers' console prints
+            await run_case(messages, min(1000, args.messages))  # warm-up
+            elapsed = await run_case(messages, args.messages)
+        rate = args.messages / elapsed
+        per_msg = COMMANDS_PER_MESSAGE.get(name, 1)
+        print(f"{name:<12} {rate:>10.0f} {rate * per_msg:>10.0f} {elapsed / args.messages * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+encode_bench.py
+---------------
+JPEG encode microbenchmark for the backends in utils.jpeg_encoders.
+
+For every available backend and each frame size it reports encode time per frame
+(mean / p50 / p90) and the encoded size. Backends take the frame layout they would
+get from the camera: BGR for cv2 / simplejpeg / turbojpeg, I420 planes for yuv420.
+The legacy USB path (cv2.cvtColor BGR->RGB + cv2.imencode) is included for reference.
+
+Before timing, a range round-trip check encodes black and white frames through every
+backend (and BGR -> I420 -> cv2 for the YUV420 capture path) and decodes them again:
+they must come back as 0 and 255, or the run exits with an error (limited / full range
+mix-up, i.e. washed-out or crushed video). A subsampling check then encodes with each
+JPEG_SUBSAMPLING setting and reads the sampling factors back from the SOF marker.
+
+Usage:
+    python script/benchmarks/encode_bench.py [--frames 200] [--quality 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from utils.jpeg_encoders import BACKENDS, create_encoder, Cv2Encoder, bgr_to_i420
+
+SIZES = [(640, 480), (1280, 720)]
+RANGE_TOLERANCE = 2  # JPEG rounding
+# JPEG_SUBSAMPLING -> expected (H << 4 | V) sampling factors of the Y, Cb, Cr components
+SAMPLING_FACTORS = {"444": (0x11, 0x11, 0x11), "422": (0x21, 0x11, 0x11), "420": (0x22, 0x11, 0x11)}
+
+
+def make_frames(width, height, count=8):
+    """Smooth synthetic frames with some texture (closer to camera output than pure noise)."""
+    rng = np.random.default_rng(0)
+    frames = []
+    for _ in range(count):
+        small = rng.integers(0, 256, (height // 16, width // 16, 3), dtype=np.uint8)
+        frame = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+        noise = rng.integers(0, 12, frame.shape, dtype=np.uint8)
+        frames.append(cv2.add(frame, noise))
+    return frames
+
+
+def time_encode(encode, frames, n):
+    times, size = [], 0
+    for i in range(n):
+        frame = frames[i % len(frames)]
+        start = time.perf_counter()
+        data = encode(frame)
+        times.append(time.perf_counter() - start)
+        size += len(data)
+    ms = np.asarray(times) * 1000
+    return ms.mean(), np.percentile(ms, 50), np.percentile(ms, 90), size / n / 1024
+
+
+def check_range(quality):
+    """Black / white through each backend must decode to 0 / 255. Returns True if all pass."""
+    ok = True
+    for name in BACKENDS + ("cv2 (I420 in)",):
+        encoder = create_encoder(name.split()[0])
+        if encoder.name != name.split()[0]:
+            continue
+        decoded = []
+        for level in (0, 255):
+            bgr = np.full((64, 64, 3), level, np.uint8)
+            frame = bgr_to_i420(bgr) if encoder.capture_format == "YUV420" or "I420" in name else bgr
+            data = bytes(encoder.encode(frame, quality))
+            decoded.append(int(np.median(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR))))
+        passed = abs(decoded[0]) <= RANGE_TOLERANCE and abs(decoded[1] - 255) <= RANGE_TOLERANCE
+        ok &= passed
+        print(f"range check {name:<16} black -> {decoded[0]:>3}, white -> {decoded[1]:>3}  {'ok' if passed else 'FAIL'}")
+    return ok
+
+
+def sof_sampling(jpeg):
+    """Per-component sampling factors from the SOF0/1/2 marker, or None if there is none."""
+    i = 2
+    while i + 4 <= len(jpeg):
+        if jpeg[i] != 0xFF:
+            return None
+        marker = jpeg[i + 1]
+        length = (jpeg[i + 2] << 8) | jpeg[i + 3]
+        if marker in (0xC0, 0xC1, 0xC2):
+            count = jpeg[i + 9]
+            return tuple(jpeg[i + 11 + 3 * c] for c in range(count))
+        i += 2 + length
+    return None
+
+
+def check_subsampling(quality):
+    """Each backend must write the sampling factors JPEG_SUBSAMPLING asks for. Returns True if all pass."""
+    ok = True
+    frame = make_frames(64, 64, count=1)[0]
+    for name in BACKENDS:
+        for subsampling, expected in SAMPLING_FACTORS.items():
+            encoder = create_encoder(name, subsampling)
+            if encoder.name != name:
+                break
+            if encoder.capture_format == "YUV420" and subsampling != "420":
+                continue  # I420 planes are 4:2:0 by construction
+            data = bytes(encoder.encode(bgr_to_i420(frame) if encoder.capture_format == "YUV420" else frame, quality))
+            factors = sof_sampling(data)
+            passed = factors == expected
+            ok &= passed
+            found = ",".join(f"{f:#04x}" for f in factors) if factors else "no SOF"
+            print(f"subsampling {name:<16} {subsampling} -> {found}  {'ok' if passed else 'FAIL'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JPEG encode time per frame for each backend.")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--quality", type=int, default=50)
+    args = parser.parse_args()
+
+    if not check_range(args.quality):
+        sys.exit("JPEG range round-trip failed")
+    if not check_subsampling(args.quality):
+        sys.exit("JPEG subsampling check failed")
+    print()
+    print(f"{'size':<11}{'backend':<18}{'mean ms':>10}{'p50 ms':>10}{'p90 ms':>10}{'KiB':>10}")
+    print("-" * 69)
+    for width, height in SIZES:
+        bgr = make_frames(width, height)
+        i420 = [bgr_to_i420(f) for f in bgr]
+        size = f"{width}x{height}"
+
+        # Reference: old USB path, colour conversion + cv2.imencode
+        legacy = Cv2Encoder()
+        result = time_encode(lambda f: legacy.encode(cv2.cvtColor(f, cv2.COLOR_BGR2RGB), args.quality), bgr, args.frames)
+        print(f"{size:<11}{'cv2 + BGR2RGB':<18}" + "".join(f"{v:>10.2f}" for v in result))
+
+        for name in BACKENDS:
+            encoder = create_encoder(name)
+            if encoder.name != name:
+                print(f"{size:<11}{name:<18}{'unavailable':>10}")
+                continue
+            frames = i420 if encoder.capture_format == "YUV420" else bgr
+            encoder.encode(frames[0], args.quality)  # warm-up
+            result = time_encode(lambda f: encoder.encode(f, args.quality), frames, args.frames)
+            print(f"{size:<11}{name:<18}" + "".join(f"{v:>10.2f}" for v in result))
+
+
+if __name__ == "__main__":
+    main()
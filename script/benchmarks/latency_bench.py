@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+latency_bench.py
+----------------
+End-to-end latency benchmark for the robot process, run off a Pi with the
+simulated GPIO and camera backends.
+
+Measures:
+- Command -> GPIO latency: WebSocket send of FORWARD / DRIVE_STOP until the
+  direction pin write, and FORWARD until the first non-zero PWM duty write.
+- Capture -> client frame latency: fake camera capture until the JPEG is
+  received by each video WebSocket client (frames are matched through the
+  frame index the fake camera stamps into the image).
+
+Both run concurrently, so command latency is measured under video load.
+
+Usage:
+    python script/benchmarks/latency_bench.py [--commands 50] [--seconds 20] [--video-clients 2] [--json out.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+# Simulated hardware must be selected before config is imported
+os.environ.setdefault("ROBOT_SIM", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+import websockets
+
+import main as robot_main
+from config import CMD_PORT, VIDEO_PORT, GPIO_BACKEND, CAMERA_BACKEND, LEFT_IN1, LEFT_IN2, RIGHT_IN1, RIGHT_IN2, LEFT_PWM
+from utils.fake_gpio import GPIO
+from utils.fake_camera import read_marker, capture_time
+
+DIRECTION_PINS = [LEFT_IN1, LEFT_IN2, RIGHT_IN1, RIGHT_IN2]
+
+
+def summarize(samples):
+    """Percentile summary (milliseconds) of a list of latencies in seconds."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "count": int(ms.size),
+        "mean": round(float(ms.mean()), 3),
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p90": round(float(np.percentile(ms, 90)), 3),
+        "p99": round(float(np.percentile(ms, 99)), 3),
+        "max": round(float(ms.max()), 3),
+    }
+
+
+def start_robot():
+    """Run main.main() on its own thread / event loop, like the real process."""
+    thread = threading.Thread(target=lambda: asyncio.run(robot_main.main()), daemon=True)
+    thread.start()
+    return thread
+
+
+async def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Robot did not open port {port} within {timeout}s")
+
+
+async def bench_commands(n, hold):
+    """Alternate FORWARD / DRIVE_STOP from rest and time the resulting GPIO writes."""
+    loop = asyncio.get_running_loop()
+    dir_latency, duty_latency = [], []
+    async with websockets.connect(f"ws://127.0.0.1:{CMD_PORT}") as ws:
+        for _ in range(n):
+            for action in ("FORWARD", "DRIVE_STOP"):
+                t0 = time.monotonic()
+                await ws.send(json.dumps({"action": action}))
+                event = await loop.run_in_executor(None, GPIO.wait_for, DIRECTION_PINS, t0, ("output",))
+                if event is not None:
+                    dir_latency.append(event[0] - t0)
+                if action == "FORWARD":
+                    event = await loop.run_in_executor(
+                        None, lambda: GPIO.wait_for([LEFT_PWM], t0, ("duty",), match=lambda e: e[3] > 0))
+                    if event is not None:
+                        duty_latency.append(event[0] - t0)
+                    await asyncio.sleep(hold)
+                else:
+                    # Wait until the ramp has brought the motors back to rest
+                    await loop.run_in_executor(
+                        None, lambda: GPIO.wait_for([LEFT_PWM], t0, ("duty",), match=lambda e: e[3] == 0, timeout=3.0))
+    return {"command_to_direction_pin": summarize(dir_latency), "command_to_first_duty": summarize(duty_latency)}
+
+
+async def bench_video_client(seconds):
+    """Receive frames for `seconds` and time capture -> receive per frame."""
+    latencies, received, gaps, unmatched = [], 0, 0, 0
+    last_index = None
+    async with websockets.connect(f"ws://127.0.0.1:{VIDEO_PORT}", max_size=2**24) as ws:
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=max(0.01, end - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            t_recv = time.monotonic()
+            received += 1
+            frame = cv2.imdecode(np.frombuffer(message, np.uint8), cv2.IMREAD_GRAYSCALE)
+            index = read_marker(frame)
+            captured = capture_time(index) if index is not None else None
+            if captured is None:
+                unmatched += 1
+                continue
+            latencies.append(t_recv - captured)
+            if last_index is not None and index > last_index + 1:
+                gaps += index - last_index - 1
+            last_index = index
+    result = summarize(latencies)
+    result.update({"received": received, "fps": round(received / seconds, 2), "skipped_frames": gaps, "unmatched": unmatched})
+    return result
+
+
+async def run(args):
+    start_robot()
+    await wait_for_port(CMD_PORT)
+    await wait_for_port(VIDEO_PORT)
+    await asyncio.sleep(0.5)  # let the camera thread start
+
+    tasks = [bench_commands(args.commands, args.hold)]
+    tasks += [bench_video_client(args.seconds) for _ in range(args.video_clients)]
+    results = await asyncio.gather(*tasks)
+
+    report = {
+        "backends": {"gpio": GPIO_BACKEND, "camera": CAMERA_BACKEND},
+        "commands": results[0],
+        "video_clients": results[1:],
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Command -> GPIO and capture -> client latency benchmark (simulated hardware).")
+    parser.add_argument("--commands", type=int, default=50, help="FORWARD/DRIVE_STOP pairs to send")
+    parser.add_argument("--hold", type=float, default=0.1, help="seconds to hold FORWARD before stopping")
+    parser.add_argument("--seconds", type=float, default=20.0, help="video measurement duration per client")
+    parser.add_argument("--video-clients", type=int, default=2, help="number of concurrent video clients")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    if GPIO_BACKEND != "fake" or CAMERA_BACKEND != "fake":
+        sys.exit("latency_bench needs the simulated backends (ROBOT_SIM=1)")
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+metrics_bench.py
+----------------
+Overhead and accuracy check for the stage latency histograms (utils.stage_metrics).
+
+Reports:
+- cost of one timed stage (two perf_counter() calls plus LatencyHistogram.record)
+- enhance + encode time per frame through FramePipeline with and without the
+  per-stage timing camera_stream adds, and the overhead as a share of frame time
+- histogram percentiles against exact numpy percentiles on lognormal samples
+
+Usage:
+    python script/benchmarks/metrics_bench.py [--frames 300]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from config import CAM_WIDTH, CAM_HEIGHT, JPEG_QUALITY, JPEG_ENCODER, JPEG_SUBSAMPLING
+from utils.frame_pipeline import FramePipeline
+from utils.jpeg_encoders import create_encoder
+from utils.stage_metrics import LatencyHistogram
+
+# Timed stages per frame for one client: capture, convert, queue, enhance, encode, send, frame
+STAGES_PER_FRAME = 7
+
+
+def record_cost(n):
+    hist = LatencyHistogram("bench")
+    start = time.perf_counter()
+    for _ in range(n):
+        t0 = time.perf_counter()
+        hist.record(time.perf_counter() - t0)
+    return (time.perf_counter() - start) / n
+
+
+def frame_loop(pipeline, frames, n, hist=None):
+    start = time.perf_counter()
+    for i in range(n):
+        frame = frames[i % len(frames)]
+        t0 = time.perf_counter()
+        out = pipeline.enhance(frame, mode=1, brightness=50, contrast=50, gamma_val=100)
+        if hist is not None:
+            hist.record(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        pipeline.encode(out)
+        if hist is not None:
+            hist.record(time.perf_counter() - t0)
+            for _ in range(STAGES_PER_FRAME - 2):  # the stages timed outside enhance / encode
+                hist.record(time.perf_counter() - t0)
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage metrics overhead and accuracy.")
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+
+    per_record = record_cost(200000)
+    print(f"timed stage (2x perf_counter + record): {per_record * 1e9:.0f} ns")
+
+    encoder = create_encoder(JPEG_ENCODER, JPEG_SUBSAMPLING)
+    pipeline = FramePipeline(JPEG_QUALITY, encoder)
+    rng = np.random.default_rng(0)
+    shape = (CAM_HEIGHT * 3 // 2, CAM_WIDTH) if encoder.capture_format == "YUV420" else (CAM_HEIGHT, CAM_WIDTH, 3)
+    frames = [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(4)]
+
+    frame_loop(pipeline, frames, 20)  # warm-up
+    plain, timed = [], []
+    for _ in range(5):  # interleaved, best of 5, to keep machine noise out of the A/B
+        plain.append(frame_loop(pipeline, frames, args.frames))
+        timed.append(frame_loop(pipeline, frames, args.frames, LatencyHistogram("bench")))
+    plain, timed = min(plain), min(timed)
+    estimate = STAGES_PER_FRAME * per_record / plain * 100
+    print(f"frame ({CAM_WIDTH}x{CAM_HEIGHT}, {JPEG_ENCODER}): {plain * 1000:.2f} ms plain, "
+          f"{timed * 1000:.2f} ms timed")
+    print(f"overhead: {estimate:.3f}% of frame time ({STAGES_PER_FRAME} stages x {per_record * 1e9:.0f} ns), "
+          f"A/B difference {(timed - plain) / plain * 100:+.2f}% (noise-limited)")
+
+    samples = rng.lognormal(mean=np.log(5e-3), sigma=0.6, size=100000)
+    hist = LatencyHistogram("accuracy")
+    for v in samples:
+        hist.record(v)
+    print(f"\n{'pct':>6} {'exact ms':>10} {'hist ms':>10} {'error':>7}")
+    for q in (50, 90, 99, 99.9):
+        exact = np.percentile(samples, q)
+        approx = hist.percentile(q)
+        print(f"{q:>6} {exact * 1000:>10.3f} {approx * 1000:>10.3f} {(approx - exact) / exact * 100:>+6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,9 +9,12 @@ Configuration constants
 - Physical parameters (wheelbase, wheel radius)
 - Motor PWM configuration and tuning parameters
 
+- Hardware backend selection (real or simulated GPIO / camera)
+
 Usage:
     from config import CMD_PORT, VIDEO_PORT, WHEEL_BASE, WHEEL_RADIUS
 """
+import os
 
 # Networking
 CMD_PORT = 9000
@@ -19,9 +22,20 @@ VIDEO_PORT = 9001
 SOCKET_PORT = 5001
 RUN_SOCKET_SERVER = True
 
+# Hardware backends
+# Set ROBOT_SIM=1 (or GPIO_BACKEND / CAMERA_BACKEND) to run off a Pi with simulated hardware.
+SIMULATION = os.environ.get("ROBOT_SIM", "0").strip() == "1"
+GPIO_BACKEND = os.environ.get("GPIO_BACKEND", "fake" if SIMULATION else "rpi").strip()              # "rpi" | "fake"
+CAMERA_BACKEND = os.environ.get("CAMERA_BACKEND", "fake" if SIMULATION else "picamera2").strip()   # "picamera2" | "opencv" | "fake"
+
 # Data logging
 LOGGING = True
 LOG_DIR = "logs"  # directory to save log files
+LOG_FLUSH_INTERVAL = 0.5        # seconds between batched writes (utils.data_logger)
+LOG_QUEUE_MAX = 100000          # queued records per stream before new ones are dropped
+LOG_MAX_BYTES = 8 * 1024 * 1024 # rotate a log file once it reaches this size
+LOG_MAX_FILES = 20              # files kept per stream (oldest deleted)
+LOG_COMPRESS_LEVEL = 1          # zlib level for each written block
 
 
 # Physics / geometry (used to convert v,w -> wheel velocities)
@@ -47,10 +61,61 @@ CAM_WIDTH = 640
 CAM_HEIGHT = 480
 CAM_FPS = 30 #25
 JPEG_QUALITY = 50
+JPEG_ENCODER = os.environ.get("JPEG_ENCODER", "cv2").strip()  # "cv2" | "simplejpeg" | "turbojpeg" | "yuv420"
+JPEG_SUBSAMPLING = "420"  # chroma subsampling: "444" | "422" | "420"
+
+# Simulcast tiers: name -> (width, height, JPEG quality). Each client picks one when it connects
+# (ws://<pi>:9001/?tier=preview, or a "TIER preview" line on the raw socket); "WxH" / "WxH@Q" also accepted.
+# A tier is only encoded while at least one client is subscribed to it.
+VIDEO_TIERS = {
+    "full": (CAM_WIDTH, CAM_HEIGHT, JPEG_QUALITY),  # GUI preview (default)
+    "detect": (CAM_WIDTH, CAM_HEIGHT, 80),          # object detector: full size, fewer artefacts
+    "preview": (320, 240, 40),
+    "thumb": (160, 120, 30),
+}
+DEFAULT_VIDEO_TIER = "full"
+
+# Adaptive per-client video quality (congestion control)
+ADAPTIVE_VIDEO = True
+ADAPTIVE_QUALITY_STEPS = [1.0, 0.8, 0.6, 0.4]  # fractions of base JPEG quality, lowered first
+ADAPTIVE_SCALE_STEPS = [1.0, 0.75, 0.5]        # fractions of base resolution, lowered next
+ADAPT_INTERVAL = 1.0     # seconds between decisions
+ADAPT_UP_HOLD = 3.0      # seconds of headroom needed before stepping back up
+ADAPT_SEND_HIGH = 0.8    # congested if mean send time > this fraction of the frame period
+ADAPT_SEND_LOW = 0.3     # headroom if mean send time < this fraction of the frame period
+ADAPT_DROP_HIGH = 0.2    # congested if more than 20% of frames were skipped (backlog)
+ADAPT_DROP_LOW = 0.02
+ADAPT_RTT_HIGH = 0.25    # seconds; congested above this PING/PONG round trip
+ADAPT_RTT_LOW = 0.10
 DEFAULT_BRIGHTNESS = 50
 DEFAULT_CONTRAST = 50
 DEFAULT_GAMMA_VAL = 300
+STATIC_SKIP = True               # skip enhance / encode / send while the scene is not changing
+CHANGE_DETECT_SIZE = (80, 60)    # grayscale thumbnail (width, height) used for change detection
+CHANGE_PIXEL_THRESHOLD = 10      # gray levels a thumbnail pixel must change by to count
+CHANGE_AREA_THRESHOLD = 0.002    # fraction of thumbnail pixels that must change (~10 of 4800)
+STATIC_KEEPALIVE_INTERVAL = 1.0  # seconds; a frame is still sent at least this often when static
+FRAME_RING_SLOTS = 3     # preallocated capture buffers (writer, newest, reader)
+FRAME_MAX_AGE = 0.2      # seconds; older frames are counted stale and not sent
+CAPTURE_TIMEOUT = 2.0    # seconds without a captured frame before warning
+
+# Simulated camera (CAMERA_BACKEND = "fake")
+FAKE_CAM_WIDTH = CAM_WIDTH
+FAKE_CAM_HEIGHT = CAM_HEIGHT
+FAKE_CAM_FPS = CAM_FPS
 
 # Telemetry
 HEALTH_CHECK_INTERVAL = 5  # seconds between health checks
-SEND_VELOCITY_INTERVAL = 0.1 # seconds between velocity being sent to GUI
\ No newline at end of file
+HEALTH_LAG_PROBE_INTERVAL = 0.1  # seconds between event-loop lag probes
+HEALTH_VCGENCMD_INTERVAL = 30    # min seconds between vcgencmd forks (only if the sysfs node is missing)
+SEND_VELOCITY_INTERVAL = 0.1 # seconds between velocity being sent to GUI
+# Telemetry hub rate limits per topic: (min seconds between pushes, keepalive re-send after seconds or None)
+TELEMETRY_RATES = {
+    "velocity_update": (SEND_VELOCITY_INTERVAL, 1.0),
+    "status_update": (0.0, None),
+    "video_quality": (0.0, None),
+}
+
+# Per-stage latency metrics (STATS command; Prometheus text endpoint if a port is set)
+METRICS_HTTP_HOST = "127.0.0.1"   # local only
+METRICS_HTTP_PORT = int(os.environ.get("METRICS_PORT", "0")) or None  # e.g. 9100; None = no HTTP endpoint
\ No newline at end of file
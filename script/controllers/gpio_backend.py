@@ -0,0 +1,18 @@
+"""
+gpio_backend.py
+---------------
+Selects the GPIO implementation used by the controllers.
+
+- GPIO_BACKEND = "rpi":  RPi.GPIO (real hardware)
+- GPIO_BACKEND = "fake": utils.fake_gpio (records pin / duty writes, no hardware needed)
+
+Usage:
+    from controllers.gpio_backend import GPIO
+"""
+
+from config import GPIO_BACKEND
+
+if GPIO_BACKEND == "fake":
+    from utils.fake_gpio import GPIO
+else:
+    import RPi.GPIO as GPIO
@@ -4,7 +4,7 @@ ir_control.py
 Provides function to set IR GPIO logic input to low (OFF) or high (ON)
 
 """
-import RPi.GPIO as GPIO
+from controllers.gpio_backend import GPIO
 from config import *
 
 # GPIO setup
@@ -6,7 +6,7 @@ This module handles:
 - GPIO setup for motor driver control.
 - Conversion of direction commands to PWM duty cycles.
 - Smooth ramping of motor speeds using a tanh ramp.
-- Logging of PWM activity to CSV.
+- Logging of PWM activity (batched binary log, see utils.data_logger).
 - Safe cleanup of GPIO and PWM on exit.
 
 Main Functions:
@@ -17,32 +17,38 @@ Main Functions:
     Stop PWM outputs and clean up GPIO pins safely.
 
 Background Thread:
-- pwm_update_loop(min_duty, max_duty)
-    Continuously ramps the PWM duty cycle towards the target value to prevent abrupt changes.
+- pwm_update_loop()
+    Ramps the PWM duty cycle towards the target value to prevent abrupt changes.
+    Parks on a condition variable once the ramp has settled, and is woken
+    immediately by set_motor_command when the target changes.
 
 Dependencies:
-- RPi.GPIO: Access to GPIO pins.
+- controllers.gpio_backend: Access to GPIO pins (RPi.GPIO or the simulated backend).
 - config.py: Motor constants, PWM frequency, ramp time.
 - globals.py: Global variables including min/max duty and logging flag.
 - velocity_smoother.py: Provides tanh_ramp function for smooth duty cycle transitions.
+- utils.data_logger: Non-blocking PWM log (the loop only appends to an in-memory queue).
+- utils.jitter_histogram: Loop timing error statistics (loop_jitter).
+- utils.stage_metrics: Tick-to-tick period of the PWM loop ("pwm_period" stage).
+- utils.telemetry: Velocity / direction updates are published to the telemetry hub.
 """
 
 
-import RPi.GPIO as GPIO
+from controllers.gpio_backend import GPIO
 import threading, time
 from config import *
 from .velocity_smoother import tanh_ramp
-import csv
+from utils.data_logger import open_stream
+from utils.jitter_histogram import JitterHistogram
+from utils.stage_metrics import metrics
+from utils.telemetry import telemetry
 import math
 import globals
 
 if LOGGING:
-    # ------- CSV Logging setup -------
-    path = "pwm_log.csv"
-    # Open CSV and write header
-    log_fh = open(path, "w", newline="")
-    csv_writer = csv.writer(log_fh)
-    csv_writer.writerow(["timestamp", "corrected_right_duty", "target_duty", "prev_target_duty", "ramp_start_duty", "globals.min_duty"])
+    # ------- PWM log (written in batches by a background thread) -------
+    pwm_log = open_stream("pwm", [("timestamp", "f8"), ("corrected_right_duty", "f8"), ("target_duty", "f8"),
+                                  ("prev_target_duty", "f8"), ("ramp_start_duty", "f8"), ("min_duty", "f8")])
 
 # GPIO setup
 GPIO.setmode(GPIO.BCM)
@@ -62,6 +68,13 @@ target_duty = 0.0
 prev_target_duty = 0.0
 running = True
 
+# Guards target_duty / running; notified when either changes so the PWM loop wakes at once
+state_cond = threading.Condition()
+
+# Wake-up error / missed deadline statistics of the PWM loop (LOOP_STATS command)
+loop_jitter = JitterHistogram(1.0 / UPDATE_HZ)
+PWM_PERIOD_STAGE = metrics.stage("pwm_period")
+
 def duty_to_velocity(duty):
     """Convert PWM duty cycle to linear velocity (m/s) using wheel radius."""
     # For PWM frequency of 1kHz
@@ -72,6 +85,12 @@ def duty_to_velocity(duty):
     return 0.00859 * (duty ** 0.555)
 
 
+def publish_velocity():
+    """Publish current velocity and directions (the hub only pushes changes, rate limited)."""
+    telemetry.publish("velocity_update", {"head": "velocity_update", "vel": round(globals.current_velocity, 4),
+                                          "l": globals.left_direction, "r": globals.right_direction})
+
+
 def set_motor_command(direction_l, direction_r):
     """
     feed the direction commands for left and right motors. 1 = forward, -1 = backward, 0 = stop
@@ -81,13 +100,15 @@ def set_motor_command(direction_l, direction_r):
 
     globals.left_direction = direction_l
     globals.right_direction = direction_r
+    publish_velocity()
 
     # If both directions are 0, set target duty to 0 (stop)
-    if direction_l == 0 and direction_r == 0:
-        target_duty = 0
     # If either direction is non-zero, set target duty to max_duty
-    else:
-        target_duty = globals.max_duty 
+    new_target = 0 if direction_l == 0 and direction_r == 0 else globals.max_duty
+    if new_target != target_duty:
+        with state_cond:
+            target_duty = new_target
+            state_cond.notify()  # wake the PWM loop now instead of at its next tick
 
 
     # Direction logic (assuming IN1 HIGH, IN2 LOW => forward)
@@ -117,19 +138,41 @@ def set_motor_command(direction_l, direction_r):
 Background thread to smoothly update PWM duty cycle towards target.
 - The motors operate in a loop, with PWM values calculated with a tanh ramp function.
   Upon a change in target duty, the ramp resets.
+- Ticks are scheduled on absolute time.monotonic() deadlines and ramp progress is the
+  real time since the ramp started, so a slow loop body or oversleep cannot stretch
+  the ramp beyond RAMP_TIME. Wake-up errors and missed deadlines go into loop_jitter.
+- Once the ramp has finished the loop sleeps until the target changes (no idle ticks),
+  and ChangeDutyCycle is only called when the clamped duty actually changes.
 """
 def pwm_update_loop():
     global current_duty, target_duty, prev_target_duty
     step_time = 1.0 / UPDATE_HZ
-    elapsed = 0.0
+    ramp_start_time = time.monotonic() - RAMP_TIME  # start settled (at rest)
     ramp_start_duty = current_duty
+    applied_left = applied_right = None  # duty last written to each PWM channel
+    deadline = None                      # absolute time of the next scheduled tick
+    last_tick = None                     # time of the previous tick of the current ramp
 
     while running:
+        now = time.monotonic()
+        if last_tick is not None:
+            PWM_PERIOD_STAGE.record(now - last_tick)
         # Check if the target duty has changed. If so, reset ramp parameters.
         if target_duty != prev_target_duty:
-            elapsed = 0.0
+            ramp_start_time = now
             ramp_start_duty = current_duty
             prev_target_duty = target_duty
+            deadline = None  # new schedule starting now
+        elif deadline is not None:
+            # Scheduled tick: record how late we woke; skip (and count) whole periods we missed
+            late = now - deadline
+            if late >= step_time:
+                missed = int(late // step_time)
+                loop_jitter.miss(missed)
+                deadline += missed * step_time
+                late -= missed * step_time
+            loop_jitter.record(late)
+        elapsed = min(now - ramp_start_time, RAMP_TIME)
 
         # Compute smoothed duty based on elapsed time in ramp
         current_duty = tanh_ramp(
@@ -147,25 +190,34 @@ def pwm_update_loop():
         corrected_left_duty = max(0, min(100, corrected_left_duty))
         corrected_right_duty = max(0, min(100, corrected_right_duty))
 
-        pwm_left.ChangeDutyCycle(corrected_left_duty)
-        pwm_right.ChangeDutyCycle(corrected_right_duty)
+        if corrected_left_duty != applied_left:
+            pwm_left.ChangeDutyCycle(corrected_left_duty)
+            applied_left = corrected_left_duty
+        if corrected_right_duty != applied_right:
+            pwm_right.ChangeDutyCycle(corrected_right_duty)
+            applied_right = corrected_right_duty
 
         # --- Compute and store velocity (mean of both wheels) ---
         v_left = duty_to_velocity(corrected_left_duty)
         v_right = duty_to_velocity(corrected_right_duty)
         globals.current_velocity = (v_left + v_right) / 2.0
+        publish_velocity()  # includes the final 0 when a stop ramp settles
 
-        # Log for debugging
+        # Log for debugging (queued only; never blocks on disk)
         if LOGGING:
-            timestamp = time.time()
-            csv_writer.writerow([timestamp, corrected_right_duty, target_duty, prev_target_duty, ramp_start_duty, globals.min_duty])
-            log_fh.flush()
-        # Increment elapsed time
-        elapsed += step_time
-        if elapsed > RAMP_TIME:
-            elapsed = RAMP_TIME  # clamp at end of ramp
-
-        time.sleep(step_time)
+            pwm_log.write(time.time(), corrected_right_duty, target_duty, prev_target_duty, ramp_start_duty, globals.min_duty)
+
+        with state_cond:
+            if elapsed >= RAMP_TIME:
+                # Ramp finished (this iteration applied the final duty): park until the target changes
+                deadline = last_tick = None
+                state_cond.wait_for(lambda: target_duty != prev_target_duty or not running)
+            else:
+                last_tick = now
+                deadline = (deadline if deadline is not None else now) + step_time
+                timeout = deadline - time.monotonic()
+                if timeout > 0 and target_duty == prev_target_duty and running:
+                    state_cond.wait(timeout)  # returns early on a new command
 threading.Thread(target=pwm_update_loop, daemon=True).start()
 
 
@@ -174,7 +226,9 @@ threading.Thread(target=pwm_update_loop, daemon=True).start()
 def cleanup():
     """Stop PWM and clean up GPIO. Safe to call multiple times."""
     global running, pwm_left, pwm_right
-    running = False
+    with state_cond:
+        running = False
+        state_cond.notify()
     time.sleep(1.0 / UPDATE_HZ)  # let thread exit
     try:
         pwm_left.stop()
@@ -182,7 +236,6 @@ def cleanup():
         pwm_left = None
         pwm_right = None
         GPIO.cleanup()
-        log_fh.close()
         print("GPIO cleanup done.")
     except Exception as e:
         print("Error during GPIO cleanup:", e)
\ No newline at end of file
@@ -1,11 +1,26 @@
 """
 servo_control.py
 --------------------
-Provides function to set IR GPIO logic input to low (OFF) or high (ON)
+Camera tilt servo control.
 
+Moves are non-blocking: servo_up / servo_down / servo_rehome only update a
+target duty and wake a background actuator thread, so the command path (and
+the asyncio event loop it runs on) returns immediately. A burst of nudges is
+coalesced into a single move to the final target. Every requested move is
+pulsed, even when its target equals the last applied duty (e.g. CAM_REHOME at
+startup, or a rehome while already centred), since the PWM is disabled between
+moves. The actuator holds the PWM pulse for SETTLE_TIME after the last move,
+then disables it (duty 0) to stop servo jitter, without blocking anyone.
+
+Main Functions:
+- servo_up() / servo_down(): Nudge the target by STEP.
+- servo_rehome(): Target the centre position.
+- set_servo_position(duty): Target an absolute duty (clamped).
+- cleanup(): Stop the actuator thread and PWM.
 """
-import RPi.GPIO as GPIO
+from controllers.gpio_backend import GPIO
 from config import *
+import threading
 import time
 
 # =========================================================
@@ -25,38 +40,78 @@ DUTY_MIN = 2.5     # physical lower limit (~0°)
 DUTY_MAX = 12.5    # physical upper limit (~180°)
 DUTY_REHOME = 7.5  # center (~90°)
 STEP = 0.5         # size of each small movement (adjust as needed)
+SETTLE_TIME = 0.4  # seconds the pulse is held after the last move before PWM is disabled
 
-# Keep track of current servo duty
+# Keep track of current servo duty (last applied) and the requested target
 current_duty = DUTY_REHOME
+target_duty = DUTY_REHOME
+move_seq = 0       # bumped by every requested move; the actuator pulses until it has applied the latest
+running = True
+
+# Guards target_duty / move_seq / running; notified on every new target
+servo_cond = threading.Condition()
 
 # =========================================================
 # Helper functions
 # =========================================================
 def set_servo_position(duty):
-    """Low-level helper to move the servo to a specific duty cycle."""
-    global current_duty
+    """Low-level helper: set a new (clamped) target for the actuator thread. Returns immediately."""
+    global target_duty, move_seq
     # Clamp within physical range
     duty = max(DUTY_MIN, min(DUTY_MAX, duty))
-    servo_pwm.ChangeDutyCycle(duty)
-    time.sleep(0.4)
-    servo_pwm.ChangeDutyCycle(0)
-    current_duty = duty
+    with servo_cond:
+        target_duty = duty
+        move_seq += 1
+        servo_cond.notify()
+    return duty
+
+
+def servo_actuator_loop():
+    """Background thread: drive the servo to the latest target, then disable PWM once settled."""
+    global current_duty
+    applied_seq = 0
+    while running:
+        with servo_cond:
+            servo_cond.wait_for(lambda: move_seq != applied_seq or not running)
+            if not running:
+                break
+            duty, applied_seq = target_duty, move_seq
+        servo_pwm.ChangeDutyCycle(duty)  # always pulse: the PWM was disabled after the last move
+        current_duty = duty
+
+        # Hold the pulse until SETTLE_TIME has passed without a new target; nudges that
+        # arrive meanwhile are coalesced into one move to the final target
+        settle_deadline = time.monotonic() + SETTLE_TIME
+        with servo_cond:
+            while running:
+                remaining = settle_deadline - time.monotonic()
+                if move_seq != applied_seq:
+                    duty, applied_seq = target_duty, move_seq
+                    if duty != current_duty:  # pulse is still on: only a new duty needs writing
+                        servo_pwm.ChangeDutyCycle(duty)
+                        current_duty = duty
+                    settle_deadline = time.monotonic() + SETTLE_TIME
+                elif remaining <= 0:
+                    break
+                else:
+                    servo_cond.wait(remaining)
+        servo_pwm.ChangeDutyCycle(0)  # stop the pulse to avoid jitter / heat
+
+
+actuator_thread = threading.Thread(target=servo_actuator_loop, daemon=True)
+actuator_thread.start()
 
 # =========================================================
 # Public functions
 # =========================================================
 def servo_up():
-    """Move the servo slightly upward."""
-    global current_duty
-    new_duty = current_duty + STEP
-    set_servo_position(new_duty)
+    """Move the servo slightly upward (relative to the pending target, so bursts add up)."""
+    new_duty = set_servo_position(target_duty + STEP)
     print(f"Servo nudged UP (duty={new_duty:.2f}%)")
 
 def servo_down():
-    """Move the servo slightly downward."""
-    global current_duty
-    new_duty = current_duty - STEP
-    set_servo_position(new_duty)
+    """Move the servo slightly downward (relative to the pending target, so bursts add up)."""
+    new_duty = set_servo_position(target_duty - STEP)
     print(f"Servo nudged DOWN (duty={new_duty:.2f}%)")
 
 def servo_rehome():
@@ -65,6 +120,12 @@ def servo_rehome():
     print("Servo rehomed (centered)")
 
 def cleanup():
-    """Stop PWM safely."""
+    """Stop the actuator thread and PWM safely."""
+    global running
+    with servo_cond:
+        running = False
+        servo_cond.notify()
+    # Let a pulse in progress finish (it ends with ChangeDutyCycle(0)) before the PWM is stopped
+    actuator_thread.join(timeout=SETTLE_TIME + 0.1)
     servo_pwm.stop()
     print("Servo cleanup complete")
\ No newline at end of file
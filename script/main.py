@@ -7,6 +7,7 @@ Entry point for the robot WebSocket control and video streaming system.
 --------
 - Start websocket servers
 - Run camera stream
+- Optionally serve stage latency metrics over HTTP (METRICS_HTTP_PORT)
 - Cleanup on shutdown
 
 Usage:
@@ -16,7 +17,7 @@ Usage:
 import asyncio
 import websockets
 
-from config import CMD_PORT, VIDEO_PORT, RUN_SOCKET_SERVER, SOCKET_PORT
+from config import CMD_PORT, VIDEO_PORT, RUN_SOCKET_SERVER, SOCKET_PORT, METRICS_HTTP_HOST, METRICS_HTTP_PORT
 from servers.command_server import handle_client
 from servers.video_server import handle_video
 from servers.camera_stream import camera_stream
@@ -24,8 +25,15 @@ from controllers.motor_control import cleanup as motor_cleanup
 from controllers.ir_control import cleanup as ir_cleanup
 from controllers.servo_control import cleanup as servo_cleanup
 from servers.socket_server import start_socket_server
+from utils.data_logger import shutdown as log_shutdown
+from utils.health_monitor import health_sampler
+from utils.telemetry import telemetry
+from utils.stage_metrics import serve_metrics
 
 async def main():
+    # Telemetry producers on other threads push through this loop
+    telemetry.start(asyncio.get_running_loop())
+
     # Start both servers
     await websockets.serve(handle_client, "0.0.0.0", CMD_PORT)
     await websockets.serve(handle_video, "0.0.0.0", VIDEO_PORT)
@@ -35,12 +43,18 @@ async def main():
 
     stream_tasks = []
 
+    # Shared health sampler (pushes status to all command clients)
+    stream_tasks.append(asyncio.create_task(health_sampler()))
+
     # Start camera stream as a background task
     stream_tasks.append(asyncio.create_task(camera_stream()))
 
     # Optionally start socket server
     if RUN_SOCKET_SERVER : stream_tasks.append(asyncio.create_task(start_socket_server(port=SOCKET_PORT)))
 
+    # Optionally expose stage latency histograms to Prometheus (local only)
+    if METRICS_HTTP_PORT: stream_tasks.append(asyncio.create_task(serve_metrics(METRICS_HTTP_HOST, METRICS_HTTP_PORT)))
+
     # Wait for all tasks to run (typically forever unless one crashes)
     await asyncio.gather(*stream_tasks)
 
@@ -54,4 +68,5 @@ if __name__ == "__main__":
     finally: # Runs on exit
         servo_cleanup()
         ir_cleanup()
-        motor_cleanup()
\ No newline at end of file
+        motor_cleanup()
+        log_shutdown()  # write out any queued log records
\ No newline at end of file
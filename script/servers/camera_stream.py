@@ -1,144 +1,338 @@
 """
 camera_stream.py
 -----------------
-Captures video frames from a USB camera and broadcasts them to connected clients.
+Captures video frames from the Pi camera (or a USB camera) and broadcasts them to connected clients.
 
 Responsibilities:
-- Initialize camera using OpenCV.
-- Capture frames, encode as JPEG, and send to all connected clients.
-- Run continuously at a fixed frame rate.
+- Initialize camera using Picamera2, falling back to OpenCV (or a synthetic camera when CAMERA_BACKEND = "fake").
+- Capture frames on a dedicated thread into a preallocated FrameRing.
+- Take the newest frame on the asyncio loop, enhance it once, and encode it once per
+  subscribed simulcast tier / quality variant (config.VIDEO_TIERS).
+- Hand the encoded frames to the fan-out, which delivers each client its own tier independently,
+  with capture sequence / timestamps and enhancement mode for the optional frame header.
+- Skip enhancement / encoding while the scene is static (utils.change_detector), still
+  sending a keepalive frame every STATIC_KEEPALIVE_INTERVAL seconds.
+- Time each stage (capture, convert, queue, enhance, encode, capture -> publish) into utils.stage_metrics.
 
-Main Function:
-- camera_stream(): Infinite loop capturing and broadcasting frames.
+Main Functions:
+- camera_stream(): Infinite loop broadcasting the newest captured frame.
+- open_camera(): Open the capture source selected by CAMERA_BACKEND.
+- capture_loop(source, ring, notify): Blocking capture loop (runs on its own thread).
+- capture_stats(): Captured / dropped / stale frame counters, plus static-scene skip counters.
 
 Dependencies:
-- cv2 (OpenCV) for camera access and JPEG encoding
-- servers.video_server for list of connected clients
+- picamera2 for Pi camera access (imported only when used)
+- cv2 (OpenCV) for USB camera access and JPEG encoding
+- utils.frame_ring for the shared capture buffers
+- utils.frame_pipeline for pooled enhance / encode buffers
+- utils.change_detector for static-scene frame skipping
+- utils.jpeg_encoders for the JPEG backend (which also picks the capture format)
+- servers.frame_fanout for per-client delivery to video / socket clients
+- utils.stage_metrics for per-stage latency histograms
 
 Usage:
     await camera_stream()
 """
 
-"""TESTING """
-
 import asyncio
+import threading
+import time
 import cv2
 import numpy as np
 import json
-from picamera2 import Picamera2
 
-from servers.video_server import video_clients
-from servers.socket_server import socket_clients
+from servers.frame_fanout import frame_fanout
 from config import *
-import utils.video_enhancer as enhance
+from utils.frame_ring import FrameRing
+from utils.frame_pipeline import FramePipeline
+from utils.change_detector import ChangeDetector
+from utils.jpeg_encoders import create_encoder, bgr_to_i420
+from utils.stage_metrics import metrics
 import globals
 
+# Shared frame ring (created once the camera is open)
+frame_ring = None
 
-async def camera_stream():
-    """Continuously capture and broadcast frames using Picamera2."""   
-    # Initialize picam2 and cap variables
-    picam2 = None
-    cap = None
+# JPEG encoder (its preferred frame layout decides the capture format) and
+# enhance / encode buffers, reused every frame
+encoder = create_encoder(JPEG_ENCODER, JPEG_SUBSAMPLING)
+pipeline = FramePipeline(JPEG_QUALITY, encoder)
 
-    # Attempt to Initialize picamera
-    try:
-        picam2 = Picamera2()
-        # Configure camera for video
-        config = picam2.create_video_configuration(
-            main={"size": (CAM_WIDTH, CAM_HEIGHT), "format": "RGB888"},
+# Static-scene detector (None when STATIC_SKIP is off) and the enhancement
+# settings the last sent frame was produced with
+change_detector = ChangeDetector() if STATIC_SKIP else None
+_last_settings = None
+
+# Stage latency histograms
+CAPTURE_STAGE = metrics.stage("capture")
+CONVERT_STAGE = metrics.stage("convert")
+QUEUE_STAGE = metrics.stage("queue")
+ENHANCE_STAGE = metrics.stage("enhance")
+ENCODE_STAGE = metrics.stage("encode")
+FRAME_STAGE = metrics.stage("frame")
+
+
+def capture_stats():
+    """Return capture counters, or an empty dict if the camera is not running."""
+    if frame_ring is None:
+        return {}
+    stats = frame_ring.stats()
+    if change_detector is not None:
+        stats["static"] = change_detector.stats()
+    return stats
+
+
+def must_send():
+    """Frames that bypass static-scene skipping: robot moving, settings changed, new viewer."""
+    global _last_settings
+    settings = (globals.night_vision, globals.cam_mode, globals.brightness, globals.contrast, globals.gamma_val)
+    changed, _last_settings = settings != _last_settings, settings
+    moving = globals.left_direction != 0 or globals.right_direction != 0 or globals.current_velocity != 0.0
+    return changed or moving or frame_fanout.has_new_clients()
+
+
+def frame_shape(width, height, capture_format):
+    """Array shape of one frame: (H, W, 3) for RGB888, (H * 3 / 2, W) for YUV420 (I420)."""
+    if capture_format == "YUV420":
+        return (height * 3 // 2, width)
+    return (height, width, 3)
+
+
+def flip_frame(src, dst, capture_format):
+    """Rotate a frame by 180 degrees into dst (plane by plane for I420)."""
+    if capture_format != "YUV420":
+        cv2.flip(src, -1, dst=dst)
+        return
+    h = src.shape[0] * 2 // 3
+    w = src.shape[1]
+    cv2.flip(src[:h], -1, dst=dst[:h])
+    for start in (h, h + h // 4):
+        plane_src = src[start:start + h // 4].reshape(h // 2, w // 2)
+        plane_dst = dst[start:start + h // 4].reshape(h // 2, w // 2)
+        cv2.flip(plane_src, -1, dst=plane_dst)
+
+
+class PiCameraSource:
+    """Picamera2 capture; frames are flipped (camera is mounted upside down) straight into the ring."""
+
+    def __init__(self, capture_format):
+        from picamera2 import Picamera2, MappedArray
+        self._mapped_array = MappedArray
+        self.capture_format = capture_format
+        self.picam2 = Picamera2()
+        # Configure camera for video, in the layout the encoder wants
+        extra = {}
+        if capture_format == "YUV420":
+            # JPEG (JFIF) expects full-range YCbCr; video configurations default to limited range
+            from libcamera import ColorSpace
+            extra["colour_space"] = ColorSpace.Sycc()
+        config = self.picam2.create_video_configuration(
+            main={"size": (CAM_WIDTH, CAM_HEIGHT), "format": capture_format},
             controls={
                 "FrameDurationLimits": (int(1e6 / CAM_FPS), int(1e6 / CAM_FPS))
-            }
+            },
+            **extra
         )
-        picam2.configure(config)
-        picam2.start()
-        print("[Camera] Camera started successfully.")
-    except Exception as e:
-        print(f"[Camera] Failed to initialize PiCam: {e}")
-        picam2 = None
-    
+        self.picam2.configure(config)
+        self.picam2.start()
+        print(f"[Camera] Camera started successfully ({capture_format}).")
+
+    def capture(self, ring):
+        start = time.perf_counter()
+        request = self.picam2.capture_request()
+        try:
+            with self._mapped_array(request, "main") as m:
+                captured = time.perf_counter()
+                CAPTURE_STAGE.record(captured - start)
+                if m.array.shape != ring.shape:
+                    ring.resize(m.array.shape)
+                flip_frame(m.array, ring.writable(), self.capture_format)
+                CONVERT_STAGE.record(time.perf_counter() - captured)
+        finally:
+            request.release()
+        return True
+
+
+class UsbCameraSource:
+    """
+    OpenCV VideoCapture fallback. BGR frames are read straight into the ring;
+    for YUV420 they are read into a reused buffer and converted into the ring.
+    """
+
+    def __init__(self, capture_format):
+        self.cap = cv2.VideoCapture(CAM_INDEX)
+        if not self.cap.isOpened():
+            raise RuntimeError("No USB camera found")
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAM_WIDTH)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAM_HEIGHT)
+        self.cap.set(cv2.CAP_PROP_FPS, CAM_FPS)
+        self.capture_format = capture_format
+        self._scratch = None  # BGR read buffer for YUV420 conversion, reused every frame
+        print(f"[Camera] USB camera started successfully ({capture_format}).")
+
+    def capture(self, ring):
+        start = time.perf_counter()
+        if self.capture_format == "YUV420":
+            ret, self._scratch = self.cap.read(self._scratch)
+            if not ret or self._scratch is None:
+                return False
+            captured = time.perf_counter()
+            CAPTURE_STAGE.record(captured - start)
+            h, w = self._scratch.shape[:2]
+            if ring.shape != frame_shape(w, h, "YUV420"):
+                ring.resize(frame_shape(w, h, "YUV420"))
+            bgr_to_i420(self._scratch, dst=ring.writable())  # full range, as the encoders expect
+            CONVERT_STAGE.record(time.perf_counter() - captured)
+            return True
+
+        buf = ring.writable()
+        ret, frame = self.cap.read(buf)
+        if not ret or frame is None:
+            return False
+        CAPTURE_STAGE.record(time.perf_counter() - start)
+        if frame is not buf:
+            # Camera delivered a different size than requested
+            ring.resize(frame.shape)
+            np.copyto(ring.writable(), frame)
+        return True
+
+
+def open_camera(capture_format):
+    """
+    Open the camera selected by CAMERA_BACKEND ("picamera2", "opencv" or "fake"),
+    delivering frames in capture_format ("RGB888" or "YUV420").
+    "picamera2" falls back to a USB camera if the Pi camera cannot be started.
+    Returns a capture source, or None if no camera is available.
+    """
+    if CAMERA_BACKEND == "fake":
+        from utils.fake_camera import FakeCamera
+        return FakeCamera(FAKE_CAM_WIDTH, FAKE_CAM_HEIGHT, FAKE_CAM_FPS, capture_format)
+
+    if CAMERA_BACKEND == "picamera2":
+        # Attempt to Initialize picamera
+        try:
+            return PiCameraSource(capture_format)
+        except Exception as e:
+            print(f"[Camera] Failed to initialize PiCam: {e}")
+
     # Fallback to OpenCV if picamera fails
-    if picam2 is None:
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
-            print("[Camera] No USB camera found. Exiting camera stream.")
-            return
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAM_WIDTH)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAM_HEIGHT)
-        cap.set(cv2.CAP_PROP_FPS, CAM_FPS)
-        print("[Camera] USB camera started successfully.")
-
-    sleep_dt = 1.0 / CAM_FPS if CAM_FPS > 0 else 0.05
+    try:
+        return UsbCameraSource(capture_format)
+    except Exception as e:
+        print(f"[Camera] {e}.")
+        return None
 
+
+def capture_loop(source, ring, notify):
+    """
+    Blocking capture loop, run on its own thread so camera waits never stall the event loop.
+    The source writes each frame straight into a ring slot, then notify() is called.
+    Sources without their own stage timing (the fake camera) are timed as a whole under "capture".
+    """
+    timed = not isinstance(source, (PiCameraSource, UsbCameraSource))
     while True:
-        await asyncio.sleep(sleep_dt)
-
-        # Capture frame
-        if picam2:
-            frame = picam2.capture_array()
-            frame = cv2.flip(frame, -1)
-        elif cap:
-            ret, frame = cap.read()
-            if not ret:
+        try:
+            start = time.perf_counter()
+            if not source.capture(ring):
+                time.sleep(0.1)
                 continue
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        except Exception as e:
+            print(f"[Camera] Capture failed: {e}")
+            time.sleep(0.1)
+            continue
+        if timed:
+            CAPTURE_STAGE.record(time.perf_counter() - start)
+
+        ring.commit(time.monotonic())
+        notify()
 
-        if frame is None or frame.size == 0:
-            await asyncio.sleep(0.1)
+
+async def camera_stream():
+    """Continuously capture and broadcast frames from the configured camera."""
+    source = open_camera(encoder.capture_format)
+    if source is None:
+        print("[Camera] No camera available. Exiting camera stream.")
+        return
+
+    # Start capture thread writing into the shared frame ring
+    global frame_ring
+    frame_ring = FrameRing(frame_shape(CAM_WIDTH, CAM_HEIGHT, encoder.capture_format), slots=FRAME_RING_SLOTS)
+    loop = asyncio.get_running_loop()
+    frame_ready = asyncio.Event()
+    threading.Thread(
+        target=capture_loop,
+        args=(source, frame_ring, lambda: loop.call_soon_threadsafe(frame_ready.set)),
+        daemon=True,
+    ).start()
+
+    while True:
+        # Wait for the capture thread to publish a new frame
+        try:
+            await asyncio.wait_for(frame_ready.wait(), timeout=CAPTURE_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"[Camera] No frame captured in {CAPTURE_TIMEOUT}s")
             continue
+        frame_ready.clear()
 
-        # Apply night vision enhancement if enabled
-        if globals.night_vision:
-            if globals.reset_cam_config:
-                globals.brightness = DEFAULT_BRIGHTNESS
-                globals.contrast = DEFAULT_CONTRAST
-                globals.gamma_val = DEFAULT_GAMMA_VAL
-                globals.reset_cam_config = False
-                globals.cam_mode = 1
-
-            frame = enhance.enhance_frame(
-                frame,
-                mode=globals.cam_mode,
-                brightness=globals.brightness,
-                contrast=globals.contrast,
-                gamma_val=globals.gamma_val
-            )
-        
-        
-
-        # Encode to JPEG
-        ret_enc, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
-        if not ret_enc:
+        # Always take the newest frame; older unread frames were dropped by the ring
+        item = frame_ring.acquire(max_age=FRAME_MAX_AGE)
+        if item is None:
             continue
-        frame_bytes = buffer.tobytes()
-
-        # Send to WebSocket video clients
-                # Send to WebSocket video clients (with disconnect handling)
-        if video_clients:
-            disconnected = []
-            for ws in list(video_clients):
-                try:
-                    await ws.send(frame_bytes)
-                except Exception as e:
-                    # Catch normal disconnects and remove dead clients
-                    if isinstance(e, Exception):
-                        print(f"[Video Stream] Client disconnected: {e}")
-                    disconnected.append(ws)
-
-            # Clean up disconnected clients
-            for ws in disconnected:
-                try:
-                    video_clients.remove(ws)
-                except KeyError:
-                    pass
-
-
-        # Send to raw socket clients (if enabled)
-        if socket_clients and RUN_SOCKET_SERVER:
-            for client in list(socket_clients):
-                try:
-                    client.write(len(frame_bytes).to_bytes(4, byteorder='big') + frame_bytes)
-                    await client.drain()
-                except Exception as e:
-                    print(f"[Raw Socket] Failed to send to client: {e}")
-                    socket_clients.remove(client)
\ No newline at end of file
+        capture_seq, captured_at, frame = item
+        QUEUE_STAGE.record(time.monotonic() - captured_at)
+        try:
+            if len(frame_fanout):
+                # Static scene: skip enhance / encode entirely (keepalive frames still go out)
+                if change_detector is None or change_detector.should_send(frame, force=must_send()):
+                    broadcast_frame(frame, capture_seq, captured_at)
+                    FRAME_STAGE.record(time.monotonic() - captured_at)
+        finally:
+            frame_ring.release()
+
+
+def broadcast_frame(frame, capture_seq=0, captured_at=None):
+    """Enhance and encode one frame per client variant, then publish it to every connected client.
+
+    captured_at is the frame's time.monotonic() capture time; header timestamps are sent as Unix time.
+    """
+    # Offset converting monotonic capture / encode times to Unix time for the frame header
+    wall_offset = time.time() - time.monotonic()
+    if captured_at is None:
+        captured_at = time.monotonic()
+    mode = 0
+    # Apply night vision enhancement if enabled
+    if globals.night_vision:
+        if globals.reset_cam_config:
+            globals.brightness = DEFAULT_BRIGHTNESS
+            globals.contrast = DEFAULT_CONTRAST
+            globals.gamma_val = DEFAULT_GAMMA_VAL
+            globals.reset_cam_config = False
+            globals.cam_mode = 1
+
+        start = time.perf_counter()
+        frame = pipeline.enhance(
+            frame,
+            mode=globals.cam_mode,
+            brightness=globals.brightness,
+            contrast=globals.contrast,
+            gamma_val=globals.gamma_val
+        )
+        ENHANCE_STAGE.record(time.perf_counter() - start)
+        mode = globals.cam_mode
+
+    # Encode once per variant that has subscribers (simulcast tier, possibly stepped down
+    # on a congested link). Memoryview over the encoder output, no extra bytes copy.
+    encoded = {}
+    encode_ts = {}
+    for variant in frame_fanout.variants():
+        width, height, quality = variant
+        start = time.perf_counter()
+        frame_bytes = pipeline.encode(frame, quality, (width, height))
+        ENCODE_STAGE.record(time.perf_counter() - start)
+        if frame_bytes is not None:
+            encoded[variant] = frame_bytes
+            encode_ts[variant] = time.monotonic() + wall_offset
+
+    # Hand off to per-client mailboxes (slow clients skip frames instead of blocking)
+    frame_fanout.publish(encoded, {"capture_seq": capture_seq, "capture_ts": captured_at + wall_offset,
+                                   "mode": mode, "encode_ts": encode_ts})
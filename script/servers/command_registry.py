@@ -0,0 +1,207 @@
+"""
+command_registry.py
+-------------------
+Table-driven dispatcher for command WebSocket messages.
+
+Each command is registered once with its handler and an argument schema.
+Incoming actions are looked up by name in a dict (O(1)), their arguments are
+validated and converted before the handler runs, and every command gets a
+response carrying the client's request id and the time spent handling it.
+
+Message formats accepted (one JSON value per WebSocket frame):
+    {"action": "FORWARD", "id": 7}
+    {"action": "SET_DUTY 40 100"}                          # legacy positional string
+    {"action": "SET_DUTY", "args": {"min_duty": 40, "max_duty": 100}, "id": 8}
+    {"action": "SET_DUTY", "args": [40, 100]}
+    {"batch": [{"action": "CAM_UP"}, {"action": "IR_ON"}], "id": 9}   # several commands, one frame
+    [{"action": "CAM_UP"}, {"action": "IR_ON"}]                          # same, as a bare list
+
+Responses:
+    {"head": "ack", "id": 7, "command": "FORWARD", "handled_ms": 0.04}
+    {"head": "video_stats", ..., "id": 10, "handled_ms": 0.3}            # commands with a reply
+    {"status": "error", "msg": "...", "id": 8, "command": "SET_DUTY", "handled_ms": 0.01}
+    {"head": "batch", "id": 9, "results": [<one response per command>], "handled_ms": 0.1}
+
+Main Classes:
+- Arg(name, type, default, lo, hi, choices): One argument of a command's schema.
+- CommandRegistry
+    command(name, *args, ack=True)  -> decorator registering an async or plain handler(ctx, data, **kwargs)
+    dispatch(ctx, data)             -> response dict for one decoded message (or None)
+    names()                         -> registered command names
+
+Usage:
+    registry = CommandRegistry()
+
+    @registry.command("SET_DUTY", Arg("min_duty", int, lo=0, hi=100), Arg("max_duty", int, lo=0, hi=100))
+    def set_duty(ctx, data, min_duty, max_duty):
+        ...
+
+    response = await registry.dispatch(ctx, json.loads(message))
+"""
+
+import inspect
+import time
+
+_MISSING = object()
+
+
+class CommandError(Exception):
+    """Invalid command / arguments; reported back to the client as an error response."""
+
+
+class Arg:
+    """Schema for one command argument: type conversion plus optional range / choice checks."""
+
+    def __init__(self, name, type=str, default=_MISSING, lo=None, hi=None, choices=None):
+        self.name = name
+        self.type = type
+        self.default = default
+        self.lo = lo
+        self.hi = hi
+        self.choices = choices
+
+    def convert(self, value):
+        try:
+            if self.type is bool and isinstance(value, str):
+                value = value.strip().lower() in ("1", "true", "on", "yes")
+            elif self.type is str:
+                value = str(value).upper()
+            else:
+                value = self.type(value)
+        except (TypeError, ValueError):
+            raise CommandError(f"{self.name} must be {self.type.__name__}, got {value!r}")
+        if self.lo is not None and value < self.lo:
+            raise CommandError(f"{self.name} must be >= {self.lo}")
+        if self.hi is not None and value > self.hi:
+            raise CommandError(f"{self.name} must be <= {self.hi}")
+        if self.choices is not None and value not in self.choices:
+            raise CommandError(f"{self.name} must be one of {list(self.choices)}")
+        return value
+
+
+class Command:
+    """A registered command: handler, schema and whether a plain ack is sent."""
+
+    def __init__(self, name, handler, args, ack):
+        self.name = name
+        self.handler = handler
+        self.args = args
+        self.ack = ack
+        self.is_async = inspect.iscoroutinefunction(handler)
+
+    def bind(self, values):
+        """Validate positional (list) or named (dict) values against the schema."""
+        if isinstance(values, dict):
+            unknown = set(values) - {a.name for a in self.args}
+            if unknown:
+                raise CommandError(f"unknown argument(s) {sorted(unknown)}")
+            raw = [values.get(a.name, _MISSING) for a in self.args]
+        else:
+            if len(values) > len(self.args):
+                raise CommandError(f"expected at most {len(self.args)} argument(s), got {len(values)}")
+            raw = list(values) + [_MISSING] * (len(self.args) - len(values))
+
+        kwargs = {}
+        for arg, value in zip(self.args, raw):
+            if value is _MISSING:
+                if arg.default is _MISSING:
+                    raise CommandError(f"missing argument '{arg.name}'")
+                kwargs[arg.name] = arg.default
+            else:
+                kwargs[arg.name] = arg.convert(value)
+        return kwargs
+
+
+class CommandRegistry:
+    """Name -> Command table with schema validation, batching and timed responses."""
+
+    def __init__(self, max_batch=32):
+        self._commands = {}
+        self.max_batch = max_batch
+
+    def command(self, name, *args, ack=True):
+        """Decorator: register handler(ctx, data, **kwargs) under `name` with the given Arg schema.
+
+        The handler returns None (client gets an ack, unless ack=False) or a reply dict.
+        """
+        def decorator(handler):
+            self.register(name, handler, *args, ack=ack)
+            return handler
+        return decorator
+
+    def register(self, name, handler, *args, ack=True):
+        self._commands[name.upper()] = Command(name.upper(), handler, list(args), ack)
+
+    def names(self):
+        return sorted(self._commands)
+
+    def parse(self, data):
+        """Decoded message -> (Command, kwargs). Raises CommandError."""
+        if not isinstance(data, dict):
+            raise CommandError("command must be a JSON object")
+        action = data.get("action")
+        if not isinstance(action, str) or not action.strip():
+            raise CommandError("missing action")
+        # Legacy form: arguments follow the name in the action string ("SET_DUTY 40 100")
+        name, *tokens = action.split()
+        command = self._commands.get(name.upper())
+        if command is None:
+            raise CommandError(f"Invalid command {name.upper()}")
+        values = data.get("args", tokens)
+        if not isinstance(values, (list, dict)):
+            values = [values]
+        return command, command.bind(values)
+
+    async def _run_one(self, ctx, data):
+        start = time.perf_counter()
+        request_id = data.get("id") if isinstance(data, dict) else None
+        name = None
+        try:
+            command, kwargs = self.parse(data)
+            name = command.name
+            if command.is_async:
+                result = await command.handler(ctx, data, **kwargs)
+            else:
+                result = command.handler(ctx, data, **kwargs)
+        except CommandError as e:
+            if name is None and isinstance(data, dict) and isinstance(data.get("action"), str):
+                name = data["action"].split()[0].upper() if data["action"].split() else None
+            response = {"status": "error", "msg": str(e), "command": name}
+        except Exception as e:  # a failing handler must not drop the client's connection
+            print(f"[Command] {name} failed: {e}")
+            response = {"status": "error", "msg": f"{name} failed: {e}", "command": name}
+        else:
+            if result is None:
+                if not command.ack and request_id is None:
+                    return None
+                response = {"head": "ack", "command": name}
+            else:
+                response = dict(result)
+        if request_id is not None:
+            response["id"] = request_id
+        response["handled_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return response
+
+    async def dispatch(self, ctx, data):
+        """Handle one decoded message (single command or batch); returns the response dict or None."""
+        if isinstance(data, dict) and "batch" in data:
+            batch, request_id = data["batch"], data.get("id")
+        elif isinstance(data, list):
+            batch, request_id = data, None
+        else:
+            return await self._run_one(ctx, data)
+
+        start = time.perf_counter()
+        if not isinstance(batch, list) or len(batch) > self.max_batch:
+            response = {"status": "error", "msg": f"batch must be a list of at most {self.max_batch} commands"}
+        else:
+            results = []
+            for item in batch:  # in order, so e.g. a stop followed by a limit change stays ordered
+                result = await self._run_one(ctx, item)
+                if result is not None:
+                    results.append(result)
+            response = {"head": "batch", "results": results}
+        if request_id is not None:
+            response["id"] = request_id
+        response["handled_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return response
@@ -8,28 +8,48 @@ This module:
 - Maps high-level actions (FORWARD, REVERSE, LEFT, RIGHT, DRIVE_STOP) to left/right motor directions.
 - Updates motor commands via the motor_control module.
 - Supports dynamic adjustment of minimum and maximum PWM duty cycles via "SET_DUTY" commands.
+- Reports capture and per-video-client statistics via "VIDEO_STATS".
+- Pushes telemetry through the shared hub (utils.telemetry); "SUBSCRIBE" picks topics / binary encoding.
+- Reports PWM loop timing jitter / missed deadlines via "LOOP_STATS" ("LOOP_STATS RESET" clears them).
+- Reports per-stage latency percentiles (video, command, PWM) via "STATS" ("STATS RESET" clears them);
+  times every command (receive -> handled) and drive commands up to their GPIO write.
 - Maintains the last received command for telemetry or logging purposes.
+- Dispatches through a command table (servers.command_registry): O(1) lookup, validated
+  arguments, batched commands, and a response with request id and handling time for each.
 
 Main Functions:
 - handle_client(websocket, path)
     Asynchronous function to handle a single WebSocket client connection.
     Processes incoming JSON commands and updates motor directions or PWM limits.
 
+Module Objects:
+- registry: CommandRegistry holding every command; new commands are added with
+  @registry.command("NAME", Arg(...), ...).
+
 Dependencies:
 - websockets: For asynchronous WebSocket communication.
 - json: For decoding/encoding JSON messages.
 - controllers.motor_control: To send motor direction commands.
 - globals: For runtime configuration (e.g., min/max duty cycles).
+- utils.data_logger: Non-blocking command log.
+- utils.stage_metrics: Per-stage latency histograms.
 """
 
 import json
-import time, csv
+import time
 import websockets
 from config import *
-from controllers.motor_control import set_motor_command
+from controllers.motor_control import set_motor_command, loop_jitter
 from controllers.ir_control import ir_on, ir_off
 from controllers.servo_control import servo_up, servo_down, servo_rehome
-from utils.processes import send_status_periodically, send_velocity_periodically, handle_ping, log_velocity_periodically
+from servers.frame_fanout import frame_fanout
+from servers.camera_stream import capture_stats
+from servers.command_registry import CommandRegistry, Arg
+from utils.data_logger import open_stream
+from utils import health_monitor
+from utils.processes import handle_ping, log_velocity_periodically
+from utils.telemetry import telemetry
+from utils.stage_metrics import metrics
 import globals
 import asyncio
 
@@ -43,105 +63,186 @@ COMMAND_MAP = {
 }
 
 
+COMMAND_STAGE = metrics.stage("command")
+COMMAND_GPIO_STAGE = metrics.stage("command_to_gpio")
+_received_at = 0.0  # perf_counter() when the message being dispatched arrived
+
 if LOGGING:
-    # ------- CSV Logging setup -------
-    cmd_path = "cmd_log.csv"
-    # Open CSV and write header
-    log_fh = open(cmd_path, "w", newline="")
-    csv_writer = csv.writer(log_fh)
-    csv_writer.writerow(["timestamp", "cmd"])
+    # ------- Command log (written in batches by a background thread) -------
+    cmd_log = open_stream("cmd", [("timestamp", "f8"), ("cmd", "str")])
+
+# =========================================================
+# Command table: name -> handler(websocket, data, **args) + argument schema
+# =========================================================
+registry = CommandRegistry()
+
+
+def _drive(direction_l, direction_r):
+    def handler(websocket, data):
+        set_motor_command(direction_l, direction_r)
+        COMMAND_GPIO_STAGE.record(time.perf_counter() - _received_at)
+    return handler
+
+
+for _name, _target in COMMAND_MAP.items():
+    registry.register(_name, _drive(_target["direction_l"], _target["direction_r"]))
+
+
+@registry.command("PING", ack=False)
+def ping(websocket, data):
+    """Latency check; replies PONG with the client's timestamp."""
+    return handle_ping(websocket, data)
+
+
+@registry.command("SET_DUTY", Arg("min_duty", int, lo=0, hi=100), Arg("max_duty", int, lo=0, hi=100))
+def set_duty(websocket, data, min_duty, max_duty):
+    """Set new duty cycle limits (motors are stopped first)."""
+    set_motor_command(0, 0)
+    new_duty = [min_duty, max_duty]
+    globals.min_duty = min(new_duty)
+    globals.max_duty = max(new_duty)
+    print(f"Updated duty cycle limits: MIN_START_DUTY={globals.min_duty}, MAX_DUTY={globals.max_duty}")
+
+
+@registry.command("SET_BRIGHTNESS", Arg("value", int, lo=0, hi=100))
+def set_brightness(websocket, data, value):
+    globals.brightness = value
+
+
+@registry.command("SET_CONTRAST", Arg("value", int, lo=0, hi=100))
+def set_contrast(websocket, data, value):
+    globals.contrast = value
+
+
+@registry.command("SET_GAMMA", Arg("value", int, lo=0, hi=1000))
+def set_gamma(websocket, data, value):
+    globals.gamma_val = value
+
+
+@registry.command("NIGHT_MODE_ON")
+def night_mode_on(websocket, data):
+    globals.night_vision = True
+    globals.reset_cam_config = True
+
+
+@registry.command("NIGHT_MODE_OFF")
+def night_mode_off(websocket, data):
+    globals.night_vision = False
+    globals.reset_cam_config = True
+
+
+@registry.command("CAM_MODE_1")
+def cam_mode_1(websocket, data):
+    globals.cam_mode = 1
+
+
+@registry.command("CAM_MODE_2")
+def cam_mode_2(websocket, data):
+    globals.cam_mode = 2
+
+
+registry.register("IR_ON", lambda websocket, data: ir_on())
+registry.register("IR_OFF", lambda websocket, data: ir_off())
+registry.register("CAM_UP", lambda websocket, data: servo_up())
+registry.register("CAM_DOWN", lambda websocket, data: servo_down())
+registry.register("CAM_REHOME", lambda websocket, data: servo_rehome())
+
+
+@registry.command("VIDEO_STATS")
+def video_stats(websocket, data):
+    """Capture counters plus per-client drop / lag statistics."""
+    return {"head": "video_stats", "capture": capture_stats(), "clients": frame_fanout.stats()}
+
+
+@registry.command("LOOP_STATS", Arg("mode", str, default="", choices=("", "RESET")))
+def loop_stats(websocket, data, mode):
+    """PWM loop wake-up error percentiles and missed deadlines ("LOOP_STATS RESET" clears them)."""
+    stats = loop_jitter.stats()
+    if mode == "RESET":
+        loop_jitter.reset()
+    return {"head": "loop_stats", "pwm": stats}
+
+
+@registry.command("STATS", Arg("mode", str, default="", choices=("", "RESET")))
+def stats(websocket, data, mode):
+    """Per-stage latency percentiles in ms ("STATS RESET" clears them)."""
+    result = {"head": "stats", "stages": metrics.stats()}
+    if mode == "RESET":
+        metrics.reset()
+    return result
+
+
+@registry.command("HEALTH")
+def health(websocket, data):
+    """Latest cached health snapshot (no new sample is taken)."""
+    return {"status_update": health_monitor.latest()}
+
+
+@registry.command("SUBSCRIBE", Arg("topics", str, default="ALL"), Arg("binary", bool, default=False))
+def subscribe(websocket, data, topics, binary):
+    """Choose telemetry topics (comma separated, or ALL) and JSON / binary encoding."""
+    names = None if topics == "ALL" else {t.strip().lower() for t in topics.split(",") if t.strip()}
+    unknown = (names or set()) - set(telemetry.topics)
+    if unknown:
+        return {"status": "error", "msg": f"Unknown telemetry topic(s) {sorted(unknown)}"}
+    telemetry.subscribe(websocket, names, binary)
+    return {"head": "subscribed", "binary": binary, "topics": telemetry.describe()}
+
+
+@registry.command("COMMANDS")
+def list_commands(websocket, data):
+    """Names of all registered commands."""
+    return {"head": "commands", "commands": registry.names()}
+
+
+def _log_commands(data):
+    """Queue every action in a (possibly batched) message to the command log."""
+    items = data.get("batch") if isinstance(data, dict) and "batch" in data else data
+    for item in items if isinstance(items, list) else [items]:
+        if isinstance(item, dict):
+            cmd_log.write(time.time(), str(item.get("action", "")).upper())
+
 
 # Websocket
 current_client = None 
 
-async def handle_client(websocket, path):
+async def handle_client(websocket, path=None):
     """Handle a single command WebSocket client (keeps original signature)."""
     print("Command client connected")
 
-    global current_client # so variables can be modified
+    global current_client, _received_at # so variables can be modified
 
     current_client = websocket
     # Start background task
-    status_task = asyncio.create_task(send_status_periodically(websocket))
-    velocity_task = asyncio.create_task(send_velocity_periodically(websocket))
+    # Telemetry (velocity, health, video quality) is pushed by the shared hub
+    telemetry.subscribe(websocket)
     #velocity_task = asyncio.create_task(log_velocity_periodically())
 
     
     try:
         async for message in websocket:
+            received_at = _received_at = time.perf_counter()
             try:
                 data = json.loads(message)
-                action = data.get("action", "").upper()
-                if LOGGING:
-                    timestamp = time.time()
-                    csv_writer.writerow([timestamp, action])
-                    log_fh.flush()
-                # If client sends ping (for latency measurements)
-                if action == "PING":
-                    await handle_ping(websocket,data)
-                    continue
-                
-                # If action is a command:
-                if action in COMMAND_MAP:
-                    target = COMMAND_MAP[action]
-                    # Extract directions and set motor command
-                    direction_l, direction_r = target["direction_l"], target["direction_r"]
-                    set_motor_command(direction_l, direction_r)
-
-                # If action is to set new duty cycle limits:
-                elif "SET_DUTY" in action:
-                    # stop motors before changing duty
-                    set_motor_command(0, 0)  
-                    # Update minimum starting duty cycle
-                    action = str.split(action)
-                    new_duty = [int(action[1]), int(action[2])]
-                    globals.min_duty = min(new_duty)
-                    globals.max_duty= max(new_duty)
-                    print(f"Updated duty cycle limits: MIN_START_DUTY={globals.min_duty}, MAX_DUTY={globals.max_duty}")
-                elif "SET_BRIGHTNESS" in action:
-                    action = str.split(action)
-                    globals.brightness = int(action[1])
-                elif "SET_GAMMA" in action:
-                    action = str.split(action)
-                    globals.gamma_val = int(action[1])
-                elif "SET_CONTRAST" in action:
-                    action = str.split(action)
-                    globals.contrast = int(action[1])
-                elif "NIGHT_MODE_ON" in action:
-                    globals.night_vision = True
-                    globals.reset_cam_config = True
-                elif "NIGHT_MODE_OFF" in action:
-                    globals.night_vision = False
-                    globals.reset_cam_config = True
-                elif action=="CAM_MODE_1":
-                        globals.cam_mode = 1
-                elif action=="CAM_MODE_2":
-                        globals.cam_mode = 2
-                elif action == "IR_ON":
-                    ir_on()
-                elif action == "IR_OFF":
-                    ir_off()
-                elif action == "CAM_UP":
-                    servo_up()
-                elif action == "CAM_DOWN":
-                    servo_down()
-                elif action == "CAM_REHOME":
-                    servo_rehome()
-                else:
-                    print("Unknown command:", action)
-                    await websocket.send(json.dumps(
-                        {"status": "error", "msg": "Invalid command"}
-                    ))
-
             except json.JSONDecodeError:
                 print("Invalid JSON received")
                 await websocket.send(json.dumps(
                     {"status": "error", "msg": "Bad JSON"}
                 ))
+                continue
+
+            if LOGGING:
+                _log_commands(data)
+            # Look up, validate and run the command(s); every command is answered
+            response = await registry.dispatch(websocket, data)
+            if response is not None:
+                if response.get("status") == "error":
+                    print("Command error:", response.get("msg"))
+                await websocket.send(json.dumps(response))
+            COMMAND_STAGE.record(time.perf_counter() - received_at)
 
     except websockets.exceptions.ConnectionClosed:
         print("Command client disconnected")
         set_motor_command(0, 0)  # stop motors on disconnect
     finally:
-        status_task.cancel()  # stop background task when client disconnects
-        velocity_task.cancel()
\ No newline at end of file
+        telemetry.unsubscribe(websocket)  # stop pushes when client disconnects
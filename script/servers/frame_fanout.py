@@ -0,0 +1,258 @@
+"""
+frame_fanout.py
+---------------
+Encode-once, per-client fan-out of video frames.
+
+Responsibilities:
+- Give every video client (WebSocket or raw socket) a one-slot "latest frame" mailbox.
+- Run one sender task per client so a slow link only delays that client.
+- Let a client that falls behind skip straight to the newest frame instead of queueing a backlog.
+- Keep per-client drop / lag statistics for the command channel; every send is also
+  timed into the shared "send" stage histogram (utils.stage_metrics).
+- Resolve the simulcast tier a client subscribes to (config.VIDEO_TIERS, or a
+  custom "WxH[@Q]" size) and use it as that client's base stream.
+- Feed each client's send time, backlog and RTT to its QualityController, which
+  picks the (width, height, quality) variant of its tier that the client receives.
+- Prefix frames with the versioned frame header (utils.frame_header: sequence number,
+  capture / encode time, enhancement mode) for clients that opted in; built once per variant.
+
+Main Classes:
+- ClientMailbox: one-slot mailbox plus sender task for a single client.
+- FrameFanout: registry of mailboxes; variants() lists what must be encoded,
+  publish() posts each client the encoding of its variant.
+
+Main Functions:
+- resolve_tier(spec): Tier name / "WxH[@Q]" -> (name, (width, height, quality)); ValueError if invalid.
+
+Module Objects:
+- frame_fanout: shared FrameFanout used by camera_stream, video_server and socket_server.
+
+Usage:
+    mailbox = frame_fanout.add(websocket, "ws 10.0.0.2", websocket.send, host="10.0.0.2", tier="preview", header=True)
+    encoded = {v: encode(frame, *v) for v in frame_fanout.variants()}
+    frame_fanout.publish(encoded, meta)    # never blocks
+    frame_fanout.remove(websocket)
+"""
+
+import asyncio
+import time
+from config import CAM_WIDTH, CAM_HEIGHT, ADAPTIVE_VIDEO, VIDEO_TIERS, DEFAULT_VIDEO_TIER
+from utils.quality_controller import QualityController, link_rtt
+from utils.frame_header import pack_header
+from utils.stage_metrics import metrics
+
+# Smoothing factor for the moving averages in the stats
+EWMA_ALPHA = 0.1
+
+SEND_STAGE = metrics.stage("send")
+
+
+def resolve_tier(spec=None):
+    """Map a tier name or custom "WxH" / "WxH@Q" spec to (name, (width, height, quality)).
+
+    Custom sizes are clamped to the capture resolution and rounded down to multiples
+    of 8 (valid for both BGR and I420 resizing). Raises ValueError for unknown specs.
+    """
+    spec = (spec or DEFAULT_VIDEO_TIER).strip().lower()
+    if spec in VIDEO_TIERS:
+        return spec, tuple(VIDEO_TIERS[spec])
+    size, _, quality = spec.partition("@")
+    try:
+        width, height = (int(v) for v in size.split("x"))
+        quality = int(quality) if quality else VIDEO_TIERS[DEFAULT_VIDEO_TIER][2]
+    except ValueError:
+        raise ValueError(f"unknown video tier '{spec}' (expected one of {sorted(VIDEO_TIERS)} or WxH[@Q])")
+    width = max(16, min(width, CAM_WIDTH) // 8 * 8)
+    height = max(16, min(height, CAM_HEIGHT) // 8 * 8)
+    quality = max(5, min(quality, 100))
+    return spec, (width, height, quality)
+
+
+class ClientMailbox:
+    """One-slot latest-frame mailbox with its own sender task."""
+
+    def __init__(self, name, send, host=None, rtt=None, tier=None, header=False):
+        self.name = name
+        self.host = host
+        self.header = header         # prefix frames with the versioned frame header
+        self._send = send            # async callable taking the frame bytes
+        self._rtt = rtt              # optional callable -> transport RTT in seconds (or None)
+        self.set_tier(tier)
+        self._pending = None         # (frame_bytes, published_at) or None
+        self._ready = asyncio.Event()
+        self._task = None
+        self.closed = False
+
+        # Statistics
+        self.connected_at = time.monotonic()
+        self.sent = 0
+        self.dropped = 0             # frames replaced before the sender picked them up
+        self.bytes_sent = 0
+        self.last_send_s = 0.0       # duration of the last send
+        self.avg_send_s = 0.0        # EWMA of send duration
+        self.last_lag_s = 0.0        # publish -> send complete, last frame
+        self.avg_lag_s = 0.0         # EWMA of publish -> send complete
+        self.max_lag_s = 0.0
+        self._dropped_reported = 0   # drops already fed to the controller
+
+    def set_tier(self, tier=None):
+        """Subscribe to a simulcast tier (restarts the quality ladder from the tier's base)."""
+        self.tier, base = resolve_tier(tier)
+        self.controller = QualityController(*base, adaptive=ADAPTIVE_VIDEO, name=self.name)
+
+    @property
+    def variant(self):
+        return self.controller.variant
+
+    @property
+    def awaiting_first_frame(self):
+        """True until this client has been sent (or offered) its first frame."""
+        return self.sent == 0 and self._pending is None and not self.closed
+
+    def rtt(self):
+        """Round-trip time to this client: PING/PONG measurement, else the transport's own."""
+        rtt = link_rtt(self.host)
+        if rtt is None and self._rtt is not None:
+            rtt = self._rtt()
+        return rtt
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
+
+    def post(self, frame_bytes, published_at):
+        """Replace whatever is waiting with the newest frame (never blocks)."""
+        if self.closed:
+            return
+        if self._pending is not None:
+            self.dropped += 1
+        self._pending = (frame_bytes, published_at)
+        self._ready.set()
+
+    async def _run(self):
+        """Sender task: always send the newest pending frame."""
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                if self._pending is None:
+                    continue
+                frame_bytes, published_at = self._pending
+                self._pending = None
+
+                start = time.monotonic()
+                await self._send(frame_bytes)
+                done = time.monotonic()
+
+                self.sent += 1
+                self.bytes_sent += len(frame_bytes)
+                self.last_send_s = done - start
+                SEND_STAGE.record(self.last_send_s)
+                self.last_lag_s = done - published_at
+                self.max_lag_s = max(self.max_lag_s, self.last_lag_s)
+                if self.sent == 1:
+                    self.avg_send_s, self.avg_lag_s = self.last_send_s, self.last_lag_s
+                else:
+                    self.avg_send_s += EWMA_ALPHA * (self.last_send_s - self.avg_send_s)
+                    self.avg_lag_s += EWMA_ALPHA * (self.last_lag_s - self.avg_lag_s)
+
+                # Let the congestion controller adjust this client's variant
+                self.controller.on_send(self.last_send_s, self.dropped - self._dropped_reported, self.rtt())
+                self._dropped_reported = self.dropped
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[Fanout] Send to {self.name} failed: {e}")
+        finally:
+            self.closed = True
+
+    def stats(self):
+        total = self.sent + self.dropped
+        return {
+            "name": self.name,
+            "tier": self.tier,
+            "header": self.header,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "drop_rate": round(self.dropped / total, 3) if total else 0.0,
+            "bytes_sent": self.bytes_sent,
+            "last_send_ms": round(self.last_send_s * 1000, 2),
+            "avg_send_ms": round(self.avg_send_s * 1000, 2),
+            "lag_ms": round(self.last_lag_s * 1000, 2),
+            "avg_lag_ms": round(self.avg_lag_s * 1000, 2),
+            "max_lag_ms": round(self.max_lag_s * 1000, 2),
+            "connected_s": round(time.monotonic() - self.connected_at, 1),
+            "closed": self.closed,
+            "adaptive": self.controller.stats(),
+        }
+
+
+class FrameFanout:
+    """Registry of client mailboxes; publishes each encoded frame to all of them."""
+
+    def __init__(self):
+        self._clients = {}  # key (websocket / writer) -> ClientMailbox
+        self.seq = 0        # frames published (header sequence number)
+
+    def __len__(self):
+        return len(self._clients)
+
+    def add(self, key, name, send, host=None, rtt=None, tier=None, header=False):
+        """Register a client on a tier and start its sender task. Must be called from the event loop.
+
+        header=True sends the client frames with the versioned frame header.
+        Raises ValueError if the tier is unknown.
+        """
+        mailbox = ClientMailbox(name, send, host, rtt, tier, header)
+        self._clients[key] = mailbox
+        mailbox.start()
+        return mailbox
+
+    def remove(self, key):
+        """Stop and forget a client's mailbox (safe to call twice)."""
+        mailbox = self._clients.pop(key, None)
+        if mailbox is not None:
+            mailbox.stop()
+
+    def get(self, key):
+        return self._clients.get(key)
+
+    def has_new_clients(self):
+        """True if some client has not been sent (or offered) its first frame yet."""
+        return any(m.awaiting_first_frame for m in self._clients.values())
+
+    def variants(self):
+        """Set of (width, height, quality) variants wanted by the connected clients (only these are encoded)."""
+        return {mailbox.variant for mailbox in self._clients.values() if not mailbox.closed}
+
+    def publish(self, encoded, meta=None):
+        """Post each client the encoded frame for its variant ({variant: bytes}); returns immediately.
+
+        meta (capture_seq, capture_ts, mode, encode_ts: {variant: time}) fills the frame
+        header for clients that asked for one; the framed copy is made once per variant.
+        """
+        now = time.monotonic()
+        self.seq += 1
+        framed = {}
+        for mailbox in self._clients.values():
+            variant = mailbox.variant
+            frame_bytes = encoded.get(variant)
+            if frame_bytes is None:
+                continue
+            if mailbox.header and meta is not None:
+                if variant not in framed:
+                    framed[variant] = pack_header(self.seq, meta["capture_seq"], meta["capture_ts"],
+                                                  meta["encode_ts"][variant], meta["mode"]) + frame_bytes
+                frame_bytes = framed[variant]
+            mailbox.post(frame_bytes, now)
+
+    def stats(self):
+        """Per-client statistics, for the VIDEO_STATS command."""
+        return [mailbox.stats() for mailbox in self._clients.values()]
+
+
+frame_fanout = FrameFanout()
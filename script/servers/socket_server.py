@@ -1,8 +1,18 @@
+"""
+socket_server.py
+----------------
+Raw TCP video server: streams [4-byte big-endian length] + [JPEG bytes] frames.
+
+Clients start on DEFAULT_VIDEO_TIER and can pick a simulcast tier by sending
+"TIER <name>" or "TIER <W>x<H>[@Q]" followed by a newline (see config.VIDEO_TIERS).
+"HEADER 1" switches on the versioned frame header (utils.frame_header), which then
+sits between the length prefix and the JPEG bytes; "HEADER 0" switches it off.
+"""
+
 import asyncio
 import socket
 from config import SOCKET_PORT
-# Track raw socket clients
-socket_clients = set()
+from servers.frame_fanout import frame_fanout
 
 async def start_socket_server(host='0.0.0.0', port=SOCKET_PORT):
     server = await asyncio.start_server(handle_raw_client, host, port)
@@ -13,18 +23,41 @@ async def start_socket_server(host='0.0.0.0', port=SOCKET_PORT):
 async def handle_raw_client(reader, writer):
     addr = writer.get_extra_info('peername')
     print(f"[Socket] Client connected: {addr}")
-    socket_clients.add(writer)
+
+    async def send_frame(frame_bytes):
+        # [4-byte big-endian length] + [JPEG bytes]
+        writer.write(len(frame_bytes).to_bytes(4, byteorder='big'))
+        writer.write(frame_bytes)
+        await writer.drain()
+
+    mailbox = frame_fanout.add(writer, f"socket {addr}", send_frame, host=addr[0] if addr else None)
 
     try:
+        # Clients may switch simulcast tier ("TIER <name|WxH[@Q]>\n") or the frame header
+        # ("HEADER 1\n" / "HEADER 0\n") at any time
+        pending = b""
         while True:
             data = await reader.read(100)
             if not data:
                 break
-            # Optionally handle client messages here
+            pending += data
+            while b"\n" in pending:
+                line, pending = pending.split(b"\n", 1)
+                parts = line.decode(errors="replace").split()
+                if len(parts) == 2 and parts[0].upper() == "TIER":
+                    try:
+                        mailbox.set_tier(parts[1])
+                        print(f"[Socket] {addr} subscribed to tier {mailbox.tier} {mailbox.variant}")
+                    except ValueError as e:
+                        print(f"[Socket] {addr}: {e}")
+                elif len(parts) == 2 and parts[0].upper() == "HEADER":
+                    mailbox.header = parts[1] == "1"
+                    print(f"[Socket] {addr} frame header {'on' if mailbox.header else 'off'}")
+            pending = pending[-100:]  # ignore unterminated junk
     except Exception as e:
         print(f"[Socket] Error: {e}")
     finally:
         print(f"[Socket] Client disconnected: {addr}")
-        socket_clients.remove(writer)
+        frame_fanout.remove(writer)
         writer.close()
         await writer.wait_closed()
\ No newline at end of file
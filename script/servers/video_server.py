@@ -5,23 +5,58 @@ WebSocket server for registering video stream clients.
 
 Responsibilities:
 - Accept connections from clients interested in receiving camera frames.
-- Maintain a set of active video clients for broadcasting.
+- Register each client with the shared frame fan-out (one mailbox + sender task per client).
+- Subscribe the client to the simulcast tier named in the URL query (?tier=preview,
+  ?tier=320x240@40); clients that don't ask get DEFAULT_VIDEO_TIER.
+- Prefix frames with the versioned frame header (utils.frame_header) for clients
+  connecting with ?header=1; everyone else receives bare JPEG.
 
 Usage:
     await websockets.serve(handle_video, "0.0.0.0", VIDEO_PORT)
+    # client: ws://<pi>:9001/?tier=thumb&header=1
 """
 
 import websockets
+from urllib.parse import urlsplit, parse_qs
+from servers.frame_fanout import frame_fanout
 
-# Track connected video clients (module-level so camera_stream can import it)
-video_clients = set()
 
-async def handle_video(websocket, path):
+def request_query(websocket, path=None):
+    """Query parameters of the request URL (websockets passes the path differently per version)."""
+    if path is None:
+        request = getattr(websocket, "request", None)
+        path = getattr(request, "path", None) or getattr(websocket, "path", None) or ""
+    return parse_qs(urlsplit(path).query)
+
+
+def requested_tier(websocket, path=None):
+    """Tier from the request URL's query string, or None."""
+    return request_query(websocket, path).get("tier", [None])[0]
+
+
+def wants_header(websocket, path=None):
+    """True if the client asked for the frame header (?header=1)."""
+    return request_query(websocket, path).get("header", ["0"])[0].lower() in ("1", "true", "on", "yes")
+
+
+async def handle_video(websocket, path=None):
     """Register client for video stream (keeps original signature)."""
-    print("Video client connected")
-    video_clients.add(websocket)
+    tier = requested_tier(websocket, path)
+    header = wants_header(websocket, path)
+    host = websocket.remote_address[0] if websocket.remote_address else None
+    try:
+        # RTT from the GUI's PING messages, else the WebSocket keepalive ping latency
+        mailbox = frame_fanout.add(websocket, f"ws {websocket.remote_address}", websocket.send,
+                                   host=host, rtt=lambda: getattr(websocket, "latency", None) or None, tier=tier,
+                                   header=header)
+    except ValueError as e:
+        print(f"[Video] Rejected client {websocket.remote_address}: {e}")
+        await websocket.close(code=1008, reason=str(e)[:120])
+        return
+    print(f"Video client connected (tier {mailbox.tier}: {mailbox.variant[0]}x{mailbox.variant[1]}"
+          f"{', frame header' if header else ''})")
     try:
         await websocket.wait_closed()
     finally:
-        video_clients.remove(websocket)
-        print("Video client disconnected")
\ No newline at end of file
+        frame_fanout.remove(websocket)
+        print("Video client disconnected")
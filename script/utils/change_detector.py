@@ -0,0 +1,100 @@
+"""
+change_detector.py
+------------------
+Cheap static-scene detector for the camera stream.
+
+Each frame is reduced to a small grayscale thumbnail (area-averaged, so sensor
+noise mostly cancels out) and compared with the thumbnail of the last frame that
+was actually sent. If too few thumbnail pixels changed, the frame can be skipped
+without enhancing or encoding it; a keepalive frame still goes out at least every
+`keepalive` seconds so viewers know the stream is alive.
+
+Cost: one INTER_AREA resize of the luma (I420) or BGR frame into a preallocated
+thumbnail plus an absdiff / threshold / countNonZero on ~5k pixels per frame.
+
+Main Class:
+- ChangeDetector(size, pixel_threshold, area_threshold, keepalive)
+    should_send(frame, force=False) -> True if the frame must be enhanced / encoded / sent
+    stats()                         -> checked / sent / skipped counters and the last change score
+
+Usage:
+    detector = ChangeDetector()
+    if detector.should_send(frame, force=robot_moving):
+        broadcast_frame(frame)
+"""
+
+import time
+import cv2
+import numpy as np
+from config import CHANGE_DETECT_SIZE, CHANGE_PIXEL_THRESHOLD, CHANGE_AREA_THRESHOLD, STATIC_KEEPALIVE_INTERVAL
+
+
+class ChangeDetector:
+    """Decides per frame whether the scene changed enough to be worth sending."""
+
+    def __init__(self, size=CHANGE_DETECT_SIZE, pixel_threshold=CHANGE_PIXEL_THRESHOLD,
+                 area_threshold=CHANGE_AREA_THRESHOLD, keepalive=STATIC_KEEPALIVE_INTERVAL):
+        self.size = tuple(size)                     # (width, height) of the thumbnail
+        self.pixel_threshold = pixel_threshold      # gray levels a thumbnail pixel must move
+        self.area_threshold = area_threshold        # fraction of thumbnail pixels that must move
+        self.keepalive = keepalive
+
+        w, h = self.size
+        self._small = np.empty((h, w, 3), np.uint8)
+        self._gray = np.empty((h, w), np.uint8)
+        self._reference = np.empty((h, w), np.uint8)   # thumbnail of the last sent frame
+        self._diff = np.empty((h, w), np.uint8)
+        self._has_reference = False
+        self._last_sent = 0.0
+
+        self.checked = 0
+        self.sent = 0
+        self.skipped = 0
+        self.keepalives = 0
+        self.last_score = 0.0
+
+    def _thumbnail(self, frame):
+        """Downsampled grayscale copy of a BGR or I420 frame (written into self._gray)."""
+        if frame.ndim == 2:
+            # I420: the first 2/3 of the rows are the luma plane, already grayscale
+            luma = frame[:frame.shape[0] * 2 // 3]
+            return cv2.resize(luma, self.size, dst=self._gray, interpolation=cv2.INTER_AREA)
+        cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+    def should_send(self, frame, force=False):
+        """True if the frame differs from the last sent one, a keepalive is due, or force is set."""
+        self.checked += 1
+        gray = self._thumbnail(frame)
+        now = time.monotonic()
+
+        if self._has_reference:
+            cv2.absdiff(gray, self._reference, dst=self._diff)
+            cv2.threshold(self._diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self._diff)
+            self.last_score = cv2.countNonZero(self._diff) / self._diff.size
+            changed = self.last_score > self.area_threshold
+        else:
+            changed = True
+
+        keepalive_due = now - self._last_sent >= self.keepalive
+        if not (changed or force or keepalive_due):
+            self.skipped += 1
+            return False
+
+        if keepalive_due and not (changed or force):
+            self.keepalives += 1
+        np.copyto(self._reference, gray)
+        self._has_reference = True
+        self._last_sent = now
+        self.sent += 1
+        return True
+
+    def stats(self):
+        return {
+            "checked": self.checked,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "keepalives": self.keepalives,
+            "skip_rate": round(self.skipped / self.checked, 3) if self.checked else 0.0,
+            "last_change": round(self.last_score, 4),
+        }
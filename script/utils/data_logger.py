@@ -0,0 +1,265 @@
+"""
+data_logger.py
+--------------
+Batched, non-blocking structured logging for the control loops.
+
+Callers append a record (a plain tuple) to a per-stream deque. Appending to a
+deque is atomic under the GIL, so it needs no lock. A single background thread
+drains every stream each LOG_FLUSH_INTERVAL seconds and writes each batch as
+one compressed, columnar block. The producer never touches the disk, never
+formats strings and never waits for the writer. If the writer falls behind by
+more than LOG_QUEUE_MAX records, new records are counted as dropped instead of
+blocking.
+
+File format (one file per stream, LOG_DIR/<stream>_<start time>_<part>.rlog):
+    b"RLOG" | u8 version | u32 header length | JSON header {"stream", "columns": [[name, dtype], ...]}
+    then blocks of: u32 payload length | u32 row count | zlib(payload)
+    payload = each column in order; numeric columns are little-endian arrays of
+    their numpy dtype, "str" columns are u32 byte lengths followed by UTF-8 bytes.
+Blocks are self-contained, so a file cut short by a crash stays readable up to its
+last complete block. Files rotate once they exceed LOG_MAX_BYTES. Only the newest
+LOG_MAX_FILES per stream are kept.
+
+Main Functions:
+- open_stream(name, columns): Register (or fetch) a stream; returns a LogStream.
+- LogStream.write(*values): Queue one record (never blocks).
+- flush() / shutdown(): Write everything queued now / flush and stop the writer thread.
+- read_log(path): Yield (columns, rows) per block of a .rlog file.
+- to_csv(path, out_path=None): Convert a .rlog file to CSV.
+
+Usage:
+    pwm_log = open_stream("pwm", [("timestamp", "f8"), ("duty", "f4"), ("cmd", "str")])
+    pwm_log.write(time.time(), 42.0, "FORWARD")
+
+    # Convert to CSV on a PC:
+    python script/utils/data_logger.py logs/pwm_20250828-101500_000.rlog [more.rlog ...]
+"""
+
+import atexit
+import csv
+import glob
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LOG_DIR, LOG_FLUSH_INTERVAL, LOG_QUEUE_MAX, LOG_MAX_BYTES, LOG_MAX_FILES, LOG_COMPRESS_LEVEL
+
+MAGIC = b"RLOG"
+VERSION = 1
+_BLOCK = struct.Struct("<II")   # payload length, row count
+_U32 = struct.Struct("<I")
+
+
+class LogStream:
+    """One record type (fixed columns) written to its own rotating .rlog file."""
+
+    def __init__(self, name, columns):
+        self.name = name
+        self.columns = [(col, dtype) for col, dtype in columns]
+        self.queue = deque()      # appended by producers, drained by the writer thread
+        self.dropped = 0
+        self.written = 0
+        self._fh = None
+        self._part = 0
+        self._started = time.strftime("%Y%m%d-%H%M%S")
+
+    def write(self, *values):
+        """Queue one record. Never blocks; drops (and counts) the record if the writer is far behind."""
+        if len(self.queue) >= LOG_QUEUE_MAX:
+            self.dropped += 1
+            return
+        self.queue.append(values)
+
+    # ---- writer-thread side ----
+    def _encode(self, rows):
+        """Columnar payload for a batch of rows."""
+        parts = []
+        for (col, dtype), values in zip(self.columns, zip(*rows)):
+            if dtype == "str":
+                encoded = [str(v).encode("utf-8") for v in values]
+                parts.append(np.fromiter(map(len, encoded), "<u4", len(encoded)).tobytes())
+                parts.append(b"".join(encoded))
+            else:
+                parts.append(np.asarray(values, dtype=np.dtype(dtype).newbyteorder("<")).tobytes())
+        return b"".join(parts)
+
+    def _open(self):
+        os.makedirs(LOG_DIR, exist_ok=True)
+        path = os.path.join(LOG_DIR, f"{self.name}_{self._started}_{self._part:03d}.rlog")
+        self._part += 1
+        self._fh = open(path, "wb")
+        header = json.dumps({"stream": self.name, "columns": self.columns, "created": time.time()}).encode()
+        self._fh.write(MAGIC + bytes([VERSION]) + _U32.pack(len(header)) + header)
+        self._prune()
+
+    def _prune(self):
+        """Keep only the newest LOG_MAX_FILES files of this stream."""
+        files = sorted(glob.glob(os.path.join(LOG_DIR, f"{self.name}_*.rlog")), key=os.path.getmtime)
+        for old in files[:-LOG_MAX_FILES]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def _drain(self):
+        """Write everything queued so far as one block (writer thread only)."""
+        rows = []
+        queue = self.queue
+        for _ in range(len(queue)):
+            rows.append(queue.popleft())
+        if not rows:
+            return
+        if self._fh is None:
+            self._open()
+        payload = zlib.compress(self._encode(rows), LOG_COMPRESS_LEVEL)
+        self._fh.write(_BLOCK.pack(len(payload), len(rows)) + payload)
+        self._fh.flush()
+        self.written += len(rows)
+        if self._fh.tell() >= LOG_MAX_BYTES:
+            self._fh.close()
+            self._fh = None
+
+    def _close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def stats(self):
+        return {"queued": len(self.queue), "written": self.written, "dropped": self.dropped}
+
+
+# Registered streams and the single writer thread
+_streams = {}
+_streams_lock = threading.Lock()   # only taken when registering a stream, never per record
+_wake = threading.Event()
+_writer = None
+_running = False
+
+
+def _writer_loop():
+    while _running:
+        _wake.wait(LOG_FLUSH_INTERVAL)
+        _wake.clear()
+        _write_all()
+    _write_all()
+    for stream in list(_streams.values()):
+        stream._close()
+
+
+def _write_all():
+    for stream in list(_streams.values()):
+        try:
+            stream._drain()
+        except Exception as e:  # a full SD card must not kill the writer
+            print(f"[Logger] Writing {stream.name} failed: {e}")
+
+
+def open_stream(name, columns):
+    """Register a log stream (or return the existing one) and make sure the writer thread runs."""
+    global _writer, _running
+    with _streams_lock:
+        stream = _streams.get(name)
+        if stream is None:
+            stream = _streams[name] = LogStream(name, columns)
+        if _writer is None:
+            _running = True
+            _writer = threading.Thread(target=_writer_loop, name="data-logger", daemon=True)
+            _writer.start()
+    return stream
+
+
+def flush():
+    """Ask the writer thread to write all queued records now (does not wait)."""
+    _wake.set()
+
+
+def shutdown(timeout=2.0):
+    """Write everything still queued and stop the writer thread. Safe to call twice."""
+    global _writer, _running
+    if _writer is None:
+        return
+    _running = False
+    _wake.set()
+    _writer.join(timeout)
+    _writer = None
+
+
+def stats():
+    """Per-stream queued / written / dropped counters."""
+    return {name: stream.stats() for name, stream in _streams.items()}
+
+
+atexit.register(shutdown)
+
+
+# ---------------------------------------------------------------------------
+# Reading / conversion
+# ---------------------------------------------------------------------------
+def read_log(path):
+    """Yield (column names, list of row tuples) for each block in a .rlog file."""
+    with open(path, "rb") as fh:
+        if fh.read(4) != MAGIC:
+            raise ValueError(f"{path} is not an .rlog file")
+        fh.read(1)  # version
+        (header_len,) = _U32.unpack(fh.read(4))
+        header = json.loads(fh.read(header_len))
+        columns = header["columns"]
+        names = [col for col, _ in columns]
+
+        while True:
+            head = fh.read(_BLOCK.size)
+            if len(head) < _BLOCK.size:
+                return
+            size, count = _BLOCK.unpack(head)
+            data = fh.read(size)
+            if len(data) < size:
+                return  # truncated last block (crash while writing)
+            payload = zlib.decompress(data)
+
+            offset, values = 0, []
+            for _, dtype in columns:
+                if dtype == "str":
+                    lengths = np.frombuffer(payload, "<u4", count, offset)
+                    offset += lengths.nbytes
+                    strings = []
+                    for n in lengths:
+                        strings.append(payload[offset:offset + n].decode("utf-8"))
+                        offset += int(n)
+                    values.append(strings)
+                else:
+                    dt = np.dtype(dtype).newbyteorder("<")
+                    values.append(np.frombuffer(payload, dt, count, offset).tolist())
+                    offset += dt.itemsize * count
+            yield names, list(zip(*values))
+
+
+def to_csv(path, out_path=None):
+    """Convert one .rlog file to CSV (next to it by default). Returns the CSV path."""
+    out_path = out_path or os.path.splitext(path)[0] + ".csv"
+    with open(out_path, "w", newline="") as out:
+        writer = csv.writer(out)
+        header_written = False
+        for names, rows in read_log(path):
+            if not header_written:
+                writer.writerow(names)
+                header_written = True
+            writer.writerows(rows)
+    return out_path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python data_logger.py <file.rlog> [more.rlog ...]")
+        sys.exit(1)
+    for log_path in sys.argv[1:]:
+        print(f"{log_path} -> {to_csv(log_path)}")
@@ -0,0 +1,133 @@
+"""
+fake_camera.py
+--------------
+Hardware-free synthetic camera, used when CAMERA_BACKEND = "fake".
+
+Responsibilities:
+- Produce synthetic frames at a configurable resolution and frame rate.
+- Stamp each frame with a visible binary frame index so receivers can match
+  a decoded JPEG back to the moment it was captured.
+- Remember capture timestamps (time.monotonic()) per frame index.
+
+Main Class:
+- FakeCamera(width, height, fps, capture_format="RGB888")
+    capture(ring) -> write the next frame into ring.writable(), paced to fps
+
+Main Functions:
+- read_marker(frame): Decode the frame index stamped into a (decoded) frame, or None.
+- capture_time(index): Capture timestamp of a frame index, or None if unknown / overwritten.
+
+Usage:
+    cam = FakeCamera(640, 480, 30)
+    cam.capture(ring); ring.commit()
+"""
+
+import time
+import cv2
+import numpy as np
+from utils.jpeg_encoders import bgr_to_i420
+
+# Frame index marker: a row of black / white blocks in the top-left corner
+MARKER_BITS = 20                 # frame index modulo 2**20
+MARKER_SYNC = (1, 0, 1, 1)       # fixed leading blocks, used to validate a marker
+TIME_HISTORY = 4096              # capture timestamps remembered (by index modulo this)
+
+_capture_times = np.full(TIME_HISTORY, np.nan)
+_capture_index = np.full(TIME_HISTORY, -1, dtype=np.int64)
+
+
+def _block_size(width):
+    return max(4, width // (2 * (len(MARKER_SYNC) + MARKER_BITS)))
+
+
+def capture_time(index):
+    """Return the capture timestamp of frame `index`, or None if it is no longer remembered."""
+    slot = index % TIME_HISTORY
+    if _capture_index[slot] != index:
+        return None
+    return float(_capture_times[slot])
+
+
+def read_marker(frame):
+    """Decode the frame index from a received frame (any channel order). Returns int or None."""
+    if frame is None or frame.ndim < 2:
+        return None
+    block = _block_size(frame.shape[1])
+    bits = []
+    for i in range(len(MARKER_SYNC) + MARKER_BITS):
+        # Sample the centre of each block to stay clear of JPEG ringing at the edges
+        y0, x0 = block // 4, i * block + block // 4
+        patch = frame[y0:y0 + block // 2, x0:x0 + block // 2]
+        bits.append(1 if patch.mean() > 127 else 0)
+    if tuple(bits[:len(MARKER_SYNC)]) != MARKER_SYNC:
+        return None
+    index = 0
+    for bit in bits[len(MARKER_SYNC):]:
+        index = (index << 1) | bit
+    return index
+
+
+class FakeCamera:
+    """Synthetic frame source with the same capture(ring) interface as the real cameras."""
+
+    def __init__(self, width, height, fps, capture_format="RGB888"):
+        self.capture_format = capture_format
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.period = 1.0 / fps if fps > 0 else 0.0
+        self.index = 0
+        self._next_deadline = time.monotonic()
+
+        # Static background: horizontal / vertical gradients, built once
+        xs = np.linspace(0, 255, width, dtype=np.float32)
+        ys = np.linspace(0, 255, height, dtype=np.float32)
+        self._background = np.empty((height, width, 3), np.uint8)
+        self._background[..., 0] = xs[None, :]
+        self._background[..., 1] = ys[:, None]
+        self._background[..., 2] = 96
+        self._scratch = np.empty_like(self._background)  # BGR render target for YUV420
+        print(f"[Camera] Fake camera started ({width}x{height} @ {fps} FPS, {capture_format}).")
+
+    def _draw(self, dst):
+        """Render frame `self.index` into dst."""
+        np.copyto(dst, self._background)
+
+        # Moving square so consecutive frames differ
+        size = max(8, self.height // 6)
+        x = (self.index * 4) % max(1, self.width - size)
+        cv2.rectangle(dst, (x, self.height // 2 - size // 2), (x + size, self.height // 2 + size // 2), (255, 255, 255), -1)
+
+        # Frame index marker
+        block = _block_size(self.width)
+        marker_index = self.index % (1 << MARKER_BITS)
+        bits = list(MARKER_SYNC) + [(marker_index >> (MARKER_BITS - 1 - i)) & 1 for i in range(MARKER_BITS)]
+        for i, bit in enumerate(bits):
+            dst[0:block, i * block:(i + 1) * block] = 255 if bit else 0
+
+    def capture(self, ring):
+        """Wait for the next frame slot (paced to fps), then render into the ring. Returns True."""
+        now = time.monotonic()
+        if self._next_deadline > now:
+            time.sleep(self._next_deadline - now)
+        self._next_deadline = max(self._next_deadline + self.period, time.monotonic() - self.period)
+
+        if self.capture_format == "YUV420":
+            shape = (self.height * 3 // 2, self.width)
+            self._draw(self._scratch)
+            if ring.shape != shape:
+                ring.resize(shape)
+            bgr_to_i420(self._scratch, dst=ring.writable())  # full range, as the encoders expect
+        else:
+            if ring.shape != (self.height, self.width, 3):
+                ring.resize((self.height, self.width, 3))
+            self._draw(ring.writable())
+
+        slot = self.index % TIME_HISTORY
+        _capture_times[slot] = time.monotonic()
+        _capture_index[slot] = self.index % (1 << MARKER_BITS)
+        self.index += 1
+        return True
+
+    def release(self):
+        pass
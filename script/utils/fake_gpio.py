@@ -0,0 +1,150 @@
+"""
+fake_gpio.py
+------------
+Hardware-free stand-in for RPi.GPIO, used when GPIO_BACKEND = "fake".
+
+Responsibilities:
+- Provide the subset of the RPi.GPIO API used by the controllers (setmode, setup, output, PWM, cleanup).
+- Record every pin write and PWM duty change with a time.monotonic() timestamp.
+- Let benchmarks wait for a specific pin event (command -> GPIO latency).
+
+Module Objects:
+- GPIO: FakeGPIO instance, imported in place of `RPi.GPIO`.
+
+Event tuples:
+    (timestamp, pin, kind, value)
+    kind is one of "setup", "output", "pwm_start", "duty", "freq", "pwm_stop", "cleanup"
+
+Usage:
+    from utils.fake_gpio import GPIO
+    GPIO.output(23, GPIO.HIGH)
+    GPIO.events[-1]   # (t, 23, "output", 1)
+"""
+
+import threading
+import time
+from collections import deque
+
+# Number of events kept in memory (oldest are discarded)
+EVENT_LOG_SIZE = 100000
+
+
+class FakePWM:
+    """Software PWM channel that records duty / frequency changes."""
+
+    def __init__(self, gpio, pin, frequency):
+        self._gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty = 0.0
+        self.running = False
+
+    def start(self, duty):
+        self.running = True
+        self.duty = duty
+        self._gpio._record(self.pin, "pwm_start", duty)
+
+    def ChangeDutyCycle(self, duty):
+        if not 0.0 <= duty <= 100.0:
+            raise ValueError("dutycycle must have a value from 0.0 to 100.0")
+        self.duty = duty
+        self._gpio._record(self.pin, "duty", duty)
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+        self._gpio._record(self.pin, "freq", frequency)
+
+    def stop(self):
+        self.running = False
+        self._gpio._record(self.pin, "pwm_stop", 0)
+
+
+class FakeGPIO:
+    """Records pin activity instead of driving hardware."""
+
+    # Constants mirrored from RPi.GPIO
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+
+    def __init__(self):
+        self.mode = None
+        self.pins = {}      # pin -> {"direction": OUT/IN, "value": LOW/HIGH}
+        self.events = deque(maxlen=EVENT_LOG_SIZE)
+        self._cond = threading.Condition()
+
+    # ---- Recording ----
+    def _record(self, pin, kind, value):
+        with self._cond:
+            self.events.append((time.monotonic(), pin, kind, value))
+            self._cond.notify_all()
+
+    def wait_for(self, pins, after, kinds=("output", "duty"), match=None, timeout=1.0):
+        """
+        Block until an event of one of `kinds` on one of `pins` (and accepted by the
+        optional match(event) predicate) is recorded after monotonic time `after`.
+        Returns the earliest such event tuple, or None on timeout.
+        """
+        pins = set(pins)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                # Scan newest -> oldest, keeping the earliest match after `after`
+                earliest = None
+                for event in reversed(self.events):
+                    if event[0] <= after:
+                        break
+                    if event[1] in pins and event[2] in kinds and (match is None or match(event)):
+                        earliest = event
+                if earliest is not None:
+                    return earliest
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    # ---- RPi.GPIO API ----
+    def setmode(self, mode):
+        self.mode = mode
+
+    def getmode(self):
+        return self.mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channel, direction, pull_up_down=PUD_OFF, initial=LOW):
+        for pin in channel if isinstance(channel, (list, tuple)) else [channel]:
+            self.pins[pin] = {"direction": direction, "value": initial}
+            self._record(pin, "setup", direction)
+
+    def output(self, channel, value):
+        channels = channel if isinstance(channel, (list, tuple)) else [channel]
+        values = value if isinstance(value, (list, tuple)) else [value] * len(channels)
+        for pin, val in zip(channels, values):
+            if pin not in self.pins:
+                raise RuntimeError(f"The GPIO channel {pin} has not been set up as an OUTPUT")
+            self.pins[pin]["value"] = int(bool(val))
+            self._record(pin, "output", int(bool(val)))
+
+    def PWM(self, channel, frequency):
+        return FakePWM(self, channel, frequency)
+
+    def input(self, channel):
+        return self.pins.get(channel, {}).get("value", self.LOW)
+
+    def cleanup(self, channel=None):
+        if channel is None:
+            self.pins.clear()
+        else:
+            self.pins.pop(channel, None)
+        self._record(channel, "cleanup", 0)
+
+
+GPIO = FakeGPIO()
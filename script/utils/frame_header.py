@@ -0,0 +1,54 @@
+"""
+frame_header.py
+---------------
+Optional versioned header sent in front of each JPEG frame.
+
+Clients opt in (video WebSocket: "?header=1" in the URL; raw socket: a
+"HEADER 1" line); everyone else keeps receiving bare JPEG bytes. On the raw
+socket the 4-byte length prefix covers header + JPEG.
+
+Layout, version 1 (big-endian, 32 bytes):
+    0   2s  magic b"RV"           (a JPEG starts with FF D8, so headers are detectable)
+    2   u8  version               (1)
+    3   u8  header length         (bytes; readers skip this many, so later versions can append fields)
+    4   u32 seq                   (frames published by the fan-out; gaps = frames this client missed)
+    8   u32 capture seq           (camera frame counter; gaps = frames the robot did not send)
+    12  f64 capture time          (Unix time, s)
+    20  f64 encode time           (Unix time, s, when this variant's JPEG was ready)
+    28  u8  enhancement mode      (0 = off, else the night-vision cam_mode)
+    29  u8  flags                 (reserved, 0)
+    30  2x  padding
+
+Frame age at a receiver is its clock minus the capture time, so robot and
+receiver clocks must be synchronised (NTP) for absolute ages to be meaningful.
+
+Main Functions:
+- pack_header(seq, capture_seq, capture_ts, encode_ts, mode, flags=0) -> bytes
+- parse_header(data) -> (fields dict or None, JPEG payload)
+
+Usage:
+    framed = pack_header(seq, capture_seq, capture_ts, encode_ts, mode) + jpeg_bytes
+"""
+
+import struct
+
+MAGIC = b"RV"
+VERSION = 1
+_V1 = struct.Struct(">2sBBIIddBB2x")
+HEADER_SIZE = _V1.size
+
+
+def pack_header(seq, capture_seq, capture_ts, encode_ts, mode, flags=0):
+    """Version 1 header bytes for one frame."""
+    return _V1.pack(MAGIC, VERSION, HEADER_SIZE, seq & 0xFFFFFFFF, capture_seq & 0xFFFFFFFF,
+                    capture_ts, encode_ts, mode, flags)
+
+
+def parse_header(data):
+    """Split a received frame into (header fields, JPEG payload); (None, data) for bare JPEG."""
+    if len(data) < HEADER_SIZE or bytes(data[:2]) != MAGIC:
+        return None, data
+    _, version, length, seq, capture_seq, capture_ts, encode_ts, mode, flags = _V1.unpack_from(data)
+    fields = {"version": version, "seq": seq, "capture_seq": capture_seq, "capture_ts": capture_ts,
+              "encode_ts": encode_ts, "mode": mode, "flags": flags}
+    return fields, memoryview(data)[length:]
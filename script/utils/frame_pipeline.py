@@ -0,0 +1,91 @@
+"""
+frame_pipeline.py
+-----------------
+Enhance -> encode stage of the camera stream, backed by a pool of preallocated buffers.
+
+Responsibilities:
+- Own the intermediate / output buffers used by utils.video_enhancer, so each
+  enhancement stage writes into the same memory every frame (OpenCV dst=).
+- Convert YUV420 (I420) captures to BGR only when an enhancement actually needs it.
+- Encode to JPEG with the configured backend (utils.jpeg_encoders); the cv2
+  backend hands out the encoded bytes as a memoryview (no bytes copy).
+- Encode reduced variants (smaller size / lower quality) for clients on a
+  congested link (see utils.quality_controller), downscaling into pooled buffers.
+
+Capture, flip and colour conversion already write straight into FrameRing slots
+(see servers.camera_stream), so together with this pipeline the only per-frame
+allocation left on the hot path is the encoder output.
+
+Main Class:
+- FramePipeline(quality, encoder=None)
+    get(name, shape)       -> reusable buffer (reallocated only if the shape changes)
+    enhance(frame, ...)    -> enhanced frame (pooled buffer, or frame itself in mode 0)
+    encode(frame, quality=None, size=None)
+                           -> JPEG bytes-like (memoryview / bytes), or None
+
+Usage:
+    pipeline = FramePipeline(JPEG_QUALITY, create_encoder(JPEG_ENCODER))
+    jpeg = pipeline.encode(pipeline.enhance(frame, mode=1, brightness=50, contrast=50, gamma_val=300))
+"""
+
+import cv2
+import numpy as np
+import utils.video_enhancer as enhance
+from utils.jpeg_encoders import Cv2Encoder, is_i420, i420_planes, i420_to_bgr
+
+
+class FramePipeline:
+    """Preallocated-buffer enhance + encode pipeline for one stream."""
+
+    def __init__(self, quality, encoder=None):
+        self._pool = {}  # name -> ndarray
+        self.encoder = encoder if encoder is not None else Cv2Encoder()
+        self.quality = int(quality)
+
+    def get(self, name, shape, dtype=np.uint8):
+        """Return the named buffer, reallocating only when shape / dtype change."""
+        buf = self._pool.get(name)
+        if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+            buf = np.empty(shape, dtype)
+            self._pool[name] = buf
+        return buf
+
+    def enhance(self, frame, mode, brightness, contrast, gamma_val):
+        """Apply utils.video_enhancer.enhance_frame using the pooled buffers."""
+        if mode == 0:
+            return frame
+        if is_i420(frame):
+            # Enhancement stages work on BGR
+            h = frame.shape[0] * 2 // 3
+            frame = i420_to_bgr(frame, dst=self.get("bgr", (h, frame.shape[1], 3)),
+                                scratch=self.get("i420_limited", frame.shape))
+        return enhance.enhance_frame(
+            frame,
+            mode=mode,
+            brightness=brightness,
+            contrast=contrast,
+            gamma_val=gamma_val,
+            pool=self,
+        )
+
+    def resize(self, frame, width, height):
+        """Downscale a BGR or I420 frame to (width, height) into a pooled buffer."""
+        if is_i420(frame):
+            dst = self.get(f"i420_{width}x{height}", (height * 3 // 2, width))
+            src_planes, dst_planes = i420_planes(frame), i420_planes(dst)
+            for src, out in zip(src_planes, dst_planes):
+                cv2.resize(src, (out.shape[1], out.shape[0]), dst=out, interpolation=cv2.INTER_AREA)
+            return dst
+        dst = self.get(f"bgr_{width}x{height}", (height, width, 3))
+        return cv2.resize(frame, (width, height), dst=dst, interpolation=cv2.INTER_AREA)
+
+    def encode(self, frame, quality=None, size=None):
+        """JPEG-encode a frame (BGR or I420); returns bytes-like JPEG data, or None.
+
+        quality overrides the pipeline quality; size = (width, height) downscales first.
+        """
+        if size is not None:
+            h = frame.shape[0] * 2 // 3 if is_i420(frame) else frame.shape[0]
+            if (frame.shape[1], h) != tuple(size):
+                frame = self.resize(frame, *size)
+        return self.encoder.encode(frame, self.quality if quality is None else quality)
@@ -0,0 +1,132 @@
+"""
+frame_ring.py
+-------------
+Small preallocated ring of camera frames shared between the capture thread
+and the asyncio stream loop.
+
+Responsibilities:
+- Own a fixed set of frame buffers so capture does not allocate per frame.
+- Let the capture thread write into a slot the reader is not holding.
+- Always hand the reader the newest committed frame (unread older frames are dropped).
+- Count captured, dropped and stale frames for telemetry.
+
+Main Class:
+- FrameRing(shape, slots=3)
+    writable()        -> buffer to capture into (capture thread)
+    commit(timestamp) -> publish the buffer returned by writable()
+    acquire(max_age)  -> (seq, timestamp, frame) of the newest frame, or None (reader)
+    release()         -> hand the acquired buffer back to the ring
+    stats()           -> dict of counters
+
+Usage:
+    ring = FrameRing((CAM_HEIGHT, CAM_WIDTH, 3))
+    buf = ring.writable()
+    ...fill buf...
+    ring.commit(time.monotonic())
+"""
+
+import threading
+import time
+import numpy as np
+
+
+class FrameRing:
+    """Triple-buffered (or larger) latest-frame store for one writer and one reader."""
+
+    def __init__(self, shape, slots=3, dtype=np.uint8):
+        if slots < 3:
+            raise ValueError("FrameRing needs at least 3 slots (writer, latest, reader)")
+        self._lock = threading.Lock()
+        self._dtype = dtype
+        self._slots = slots
+        self._allocate(shape)
+
+        # Counters (read by telemetry)
+        self.captured = 0   # frames committed by the capture thread
+        self.dropped = 0    # frames overwritten before the reader picked them up
+        self.stale = 0      # frames too old when the reader picked them up
+        self.delivered = 0  # frames handed to the reader
+
+    def _allocate(self, shape):
+        self.shape = tuple(shape)
+        self._buffers = [np.empty(self.shape, self._dtype) for _ in range(self._slots)]
+        self._timestamps = [0.0] * self._slots
+        self._seqs = [0] * self._slots
+        self._latest = -1    # slot holding the newest committed frame
+        self._reading = -1   # slot currently held by the reader
+        self._writing = -1   # slot handed out to the writer
+        self._seq = 0        # sequence number of the newest committed frame
+        self._read_seq = 0   # sequence number of the last frame the reader consumed
+
+    def resize(self, shape):
+        """Reallocate all slots for a new frame shape (e.g. USB camera ignored the requested size)."""
+        with self._lock:
+            seq, read_seq = self._seq, self._read_seq
+            self._allocate(shape)
+            self._seq, self._read_seq = seq, read_seq
+
+    # ---- Writer side (capture thread) ----
+    def writable(self):
+        """Return a buffer that is neither the newest frame nor held by the reader."""
+        with self._lock:
+            start = self._writing if self._writing >= 0 else self._latest
+            for step in range(1, self._slots + 1):
+                idx = (start + step) % self._slots
+                if idx != self._latest and idx != self._reading:
+                    self._writing = idx
+                    return self._buffers[idx]
+        raise RuntimeError("FrameRing has no free slot")  # unreachable with >= 3 slots
+
+    def commit(self, timestamp=None):
+        """Publish the buffer returned by writable() as the newest frame. Returns its sequence number."""
+        with self._lock:
+            if self._writing < 0:
+                raise RuntimeError("commit() called without writable()")
+            if self._seq > self._read_seq:
+                self.dropped += 1  # previous newest frame was never read
+            self._seq += 1
+            idx = self._writing
+            self._seqs[idx] = self._seq
+            self._timestamps[idx] = time.monotonic() if timestamp is None else timestamp
+            self._latest = idx
+            self._writing = -1
+            self.captured += 1
+            return self._seq
+
+    # ---- Reader side (asyncio loop) ----
+    def acquire(self, max_age=None):
+        """
+        Take the newest unread frame. Returns (seq, timestamp, frame) or None when
+        there is no new frame or the newest frame is older than max_age seconds.
+        The frame stays valid until release() or the next acquire().
+        """
+        with self._lock:
+            self._reading = -1
+            if self._latest < 0 or self._seq <= self._read_seq:
+                return None
+            idx = self._latest
+            self._read_seq = self._seqs[idx]
+            timestamp = self._timestamps[idx]
+            if max_age is not None and time.monotonic() - timestamp > max_age:
+                self.stale += 1
+                return None
+            self._reading = idx
+            self.delivered += 1
+            return self._seqs[idx], timestamp, self._buffers[idx]
+
+    def release(self):
+        """Return the buffer obtained from acquire() to the ring."""
+        with self._lock:
+            self._reading = -1
+
+    def stats(self):
+        """Snapshot of the ring counters."""
+        with self._lock:
+            return {
+                "captured": self.captured,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "stale": self.stale,
+                "slots": self._slots,
+                "shape": list(self.shape),
+            }
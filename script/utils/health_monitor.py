@@ -0,0 +1,154 @@
+"""
+health_monitor.py
+-----------------
+Single shared health sampler for the robot process.
+
+One asyncio task samples the Pi's health every HEALTH_CHECK_INTERVAL seconds,
+caches the snapshot and publishes it to the telemetry hub ("status_update"),
+which serialises it once for every subscribed command client.
+
+Sources (cheap reads, no fork per sample):
+- throttle / under-voltage flags: firmware sysfs node (get_throttled); falls back
+  to `vcgencmd get_throttled` at most every HEALTH_VCGENCMD_INTERVAL on kernels without it
+- SoC temperature: /sys/class/thermal/thermal_zone0/temp (or psutil sensors)
+- CPU load per core and memory: psutil (non-blocking, since the previous sample)
+- event-loop lag: a probe task sleeping HEALTH_LAG_PROBE_INTERVAL and measuring
+  how late it wakes (worst and mean over the sampling window)
+
+File reads and the fallback run in the default executor, so they do not block the loop.
+
+Main Functions:
+- health_sampler(): Long-running task (started from main) that samples and publishes.
+- latest(): Most recent snapshot (dict), or {} before the first sample.
+- get_throttle_status(): Throttle flags as a dict (reads sysfs / fallback).
+
+Usage:
+    asyncio.create_task(health_sampler())
+"""
+
+import asyncio
+import glob
+import subprocess
+import time
+from config import HEALTH_CHECK_INTERVAL, HEALTH_LAG_PROBE_INTERVAL, HEALTH_VCGENCMD_INTERVAL
+from utils.telemetry import telemetry
+
+try:
+    import psutil
+except ImportError:  # CPU / memory fields are omitted without psutil
+    psutil = None
+
+THROTTLE_SYSFS = sorted(set(glob.glob("/sys/devices/platform/soc*/*firmware*/get_throttled")))
+TEMP_SYSFS = "/sys/class/thermal/thermal_zone0/temp"
+
+_snapshot = {}
+_vcgencmd_cache = (0.0, None)   # (time of last fork, result)
+
+# Event-loop lag over the current sampling window
+_lag_max = 0.0
+_lag_total = 0.0
+_lag_count = 0
+
+
+def _decode_throttled(val):
+    return {
+        'under_voltage_now': bool(val & 0x1),
+        'freq_capped_now': bool(val & 0x2),
+        'throttled_now': bool(val & 0x4),
+        'under_voltage_occurred': bool(val & 0x10000),
+        'freq_capped_occurred': bool(val & 0x20000),
+        'throttled_occurred': bool(val & 0x40000),
+    }
+
+
+def get_throttle_status():
+    """Return Raspberry Pi under-voltage and throttled status."""
+    global _vcgencmd_cache
+    for path in THROTTLE_SYSFS:
+        try:
+            with open(path) as fh:
+                return _decode_throttled(int(fh.read().strip(), 16))
+        except (OSError, ValueError):
+            continue
+
+    # Older kernels: fall back to vcgencmd, but never fork more than once per HEALTH_VCGENCMD_INTERVAL
+    last, cached = _vcgencmd_cache
+    if cached is not None and time.monotonic() - last < HEALTH_VCGENCMD_INTERVAL:
+        return cached
+    try:
+        output = subprocess.check_output(['vcgencmd', 'get_throttled'], timeout=2).decode()
+        result = _decode_throttled(int(output.split('=')[1], 16))
+    except Exception as e:
+        result = {"error": str(e)}
+    _vcgencmd_cache = (time.monotonic(), result)
+    return result
+
+
+def _soc_temperature():
+    try:
+        with open(TEMP_SYSFS) as fh:
+            return round(int(fh.read().strip()) / 1000.0, 1)
+    except (OSError, ValueError):
+        pass
+    if psutil is not None and hasattr(psutil, "sensors_temperatures"):
+        for entries in psutil.sensors_temperatures().values():
+            if entries:
+                return round(entries[0].current, 1)
+    return None
+
+
+def read_health():
+    """One health sample (blocking file reads; run in an executor)."""
+    status = dict(get_throttle_status())
+    status["temp_c"] = _soc_temperature()
+    if psutil is not None:
+        status["cpu_percent"] = psutil.cpu_percent(percpu=True)
+        mem = psutil.virtual_memory()
+        status["mem_percent"] = mem.percent
+        status["mem_available_mb"] = round(mem.available / 2**20, 1)
+        try:
+            status["load_avg"] = [round(v, 2) for v in psutil.getloadavg()]
+        except (AttributeError, OSError):
+            pass
+    return status
+
+
+def latest():
+    """Most recent health snapshot (empty before the first sample)."""
+    return _snapshot
+
+
+async def _lag_probe():
+    """Measure how late the event loop wakes a sleeping task."""
+    global _lag_max, _lag_total, _lag_count
+    while True:
+        start = time.monotonic()
+        await asyncio.sleep(HEALTH_LAG_PROBE_INTERVAL)
+        lag = time.monotonic() - start - HEALTH_LAG_PROBE_INTERVAL
+        _lag_max = max(_lag_max, lag)
+        _lag_total += lag
+        _lag_count += 1
+
+
+async def health_sampler():
+    """Sample health every HEALTH_CHECK_INTERVAL and publish the snapshot to the telemetry hub."""
+    global _snapshot, _lag_max, _lag_total, _lag_count
+    loop = asyncio.get_running_loop()
+    probe = asyncio.create_task(_lag_probe())
+    if psutil is not None:
+        psutil.cpu_percent(percpu=True)  # prime: the first call has no reference interval
+    try:
+        while True:
+            status = await loop.run_in_executor(None, read_health)
+            status["loop_lag_ms"] = {
+                "max": round(_lag_max * 1000, 2),
+                "mean": round(_lag_total / _lag_count * 1000, 2) if _lag_count else 0.0,
+            }
+            _lag_max, _lag_total, _lag_count = 0.0, 0.0, 0
+            status["time"] = time.time()
+
+            _snapshot = status
+            telemetry.publish("status_update", {"status_update": status})
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+    finally:
+        probe.cancel()
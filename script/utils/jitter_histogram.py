@@ -0,0 +1,84 @@
+"""
+jitter_histogram.py
+-------------------
+Fixed-size timing-error histogram for periodic control loops.
+
+Errors (how late a loop woke up relative to its deadline, in seconds) go into
+logarithmically spaced buckets, 1 us to 10 s with ~5% resolution. Recording is
+a bisect plus an increment, so it is cheap enough for every tick of a 50 Hz loop
+and needs no allocation. Percentiles are read from the buckets on demand.
+
+Main Class:
+- JitterHistogram(period)
+    record(error_s)  -> add one wake-up error (negative values count as 0)
+    miss(count=1)    -> count deadlines skipped entirely
+    stats()          -> ticks, missed, mean / p50 / p90 / p99 / p999 / max error in ms
+    reset()
+
+Usage:
+    hist = JitterHistogram(1.0 / UPDATE_HZ)
+    hist.record(time.monotonic() - deadline)
+    print(hist.stats())
+"""
+
+import bisect
+import math
+
+# Bucket upper edges: 1 us .. 10 s, 5% apart
+_EDGES = [1e-6 * 1.05 ** i for i in range(int(math.log(1e7) / math.log(1.05)) + 2)]
+
+
+class JitterHistogram:
+    """Histogram of loop wake-up errors plus missed-deadline counter."""
+
+    def __init__(self, period):
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(_EDGES) + 1)
+        self.ticks = 0
+        self.missed = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, error_s):
+        """Record how late (seconds) one wake-up was relative to its deadline."""
+        if error_s < 0:
+            error_s = 0.0
+        self.counts[bisect.bisect_left(_EDGES, error_s)] += 1
+        self.ticks += 1
+        self.total += error_s
+        if error_s > self.max:
+            self.max = error_s
+
+    def miss(self, count=1):
+        """Count deadlines that passed without the loop running at all."""
+        self.missed += count
+
+    def percentile(self, q):
+        """Upper edge (seconds) of the bucket containing the q-th percentile (0..100)."""
+        if self.ticks == 0:
+            return 0.0
+        rank = q / 100.0 * self.ticks
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(_EDGES[i] if i < len(_EDGES) else self.max, self.max)
+        return self.max
+
+    def stats(self):
+        def ms(v):
+            return round(v * 1000, 3)
+        return {
+            "period_ms": ms(self.period),
+            "ticks": self.ticks,
+            "missed": self.missed,
+            "mean_ms": ms(self.total / self.ticks) if self.ticks else 0.0,
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+            "p999_ms": ms(self.percentile(99.9)),
+            "max_ms": ms(self.max),
+        }
@@ -0,0 +1,189 @@
+"""
+jpeg_encoders.py
+----------------
+Pluggable JPEG encoder backends for the camera stream.
+
+Backends (JPEG_ENCODER in config.py):
+- "cv2":        cv2.imencode on BGR frames (always available).
+- "simplejpeg": libjpeg-turbo via simplejpeg, BGR frames.
+- "turbojpeg":  libjpeg-turbo via PyTurboJPEG, BGR frames.
+- "yuv420":     encode straight from I420 (YUV420 planar) frames with simplejpeg
+                (or PyTurboJPEG), skipping colour conversion entirely.
+
+Each encoder declares the frame layout it wants (`capture_format`, a Picamera2
+format name), so the camera can be configured to deliver exactly that:
+- "RGB888":  (H, W, 3) uint8, bytes ordered B, G, R (what OpenCV calls BGR)
+- "YUV420":  (H * 3 / 2, W) uint8, I420 planes Y | U | V, full range (0-255, as JFIF
+             expects; the Pi camera is configured for sYCC to match)
+
+OpenCV's I420 conversions are limited range (Y 16-235, chroma 16-240), so BGR <-> I420
+always goes through bgr_to_i420() / i420_to_bgr(), which expand / compress the range
+with per-plane LUTs. Mixing the two gives washed-out (or crushed) video.
+
+All encoders also accept the other layout (converted on the fly), so enhancement
+stages can hand them a BGR frame even when the camera delivers YUV420.
+
+Main Functions:
+- create_encoder(name, subsampling): Build an encoder, falling back to cv2 if the library is missing.
+- i420_planes(frame): (Y, U, V) views of an I420 frame.
+- bgr_to_i420(bgr, dst) / i420_to_bgr(frame, dst, scratch): full-range conversions.
+
+Usage:
+    encoder = create_encoder(JPEG_ENCODER)
+    jpeg = encoder.encode(frame, quality=50)
+"""
+
+import cv2
+import numpy as np
+
+BACKENDS = ("cv2", "simplejpeg", "turbojpeg", "yuv420")
+
+
+def i420_planes(frame):
+    """Return (Y, U, V) views of an I420 frame shaped (H * 3 / 2, W)."""
+    h = frame.shape[0] * 2 // 3
+    w = frame.shape[1]
+    y = frame[:h]
+    u = frame[h:h + h // 4].reshape(h // 2, w // 2)
+    v = frame[h + h // 4:].reshape(h // 2, w // 2)
+    return y, u, v
+
+
+def _range_lut(scale, offset_in, offset_out):
+    values = (np.arange(256, dtype=np.float64) - offset_in) * scale + offset_out
+    return np.clip(np.round(values), 0, 255).astype(np.uint8)
+
+
+# Limited (BT.601 "video") <-> full (JFIF) range, luma and chroma
+_Y_TO_FULL = _range_lut(255 / 219, 16, 0)
+_C_TO_FULL = _range_lut(255 / 224, 128, 128)
+_Y_TO_LIMITED = _range_lut(219 / 255, 0, 16)
+_C_TO_LIMITED = _range_lut(224 / 255, 128, 128)
+
+
+def bgr_to_i420(bgr, dst=None):
+    """BGR (H, W, 3) -> full-range I420 (H * 3 / 2, W), written into dst if given."""
+    dst = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420, dst=dst)
+    h = bgr.shape[0]
+    cv2.LUT(dst[:h], _Y_TO_FULL, dst=dst[:h])
+    cv2.LUT(dst[h:], _C_TO_FULL, dst=dst[h:])
+    return dst
+
+
+def i420_to_bgr(frame, dst=None, scratch=None):
+    """Full-range I420 -> BGR. scratch: reusable buffer shaped like frame (the limited-range copy)."""
+    if scratch is None or scratch.shape != frame.shape:
+        scratch = np.empty_like(frame)
+    h = frame.shape[0] * 2 // 3
+    cv2.LUT(frame[:h], _Y_TO_LIMITED, dst=scratch[:h])
+    cv2.LUT(frame[h:], _C_TO_LIMITED, dst=scratch[h:])
+    return cv2.cvtColor(scratch, cv2.COLOR_YUV2BGR_I420, dst=dst)
+
+
+def is_i420(frame):
+    """I420 frames are single-plane 2-D arrays; BGR frames are (H, W, 3)."""
+    return frame.ndim == 2
+
+
+class Cv2Encoder:
+    """cv2.imencode backend."""
+    name = "cv2"
+    capture_format = "RGB888"
+
+    def __init__(self, subsampling="420"):
+        self._subsampling = None
+        if subsampling in ("444", "422", "420"):
+            self._subsampling = getattr(cv2, f"IMWRITE_JPEG_SAMPLING_FACTOR_{subsampling}", None)
+        self._params = {}
+        self._scratch = None  # limited-range copy for I420 input, reused
+
+    def encode(self, frame, quality):
+        if is_i420(frame):
+            if self._scratch is None or self._scratch.shape != frame.shape:
+                self._scratch = np.empty_like(frame)
+            frame = i420_to_bgr(frame, scratch=self._scratch)
+        params = self._params.get(quality)
+        if params is None:
+            params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+            if self._subsampling is not None:
+                params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, self._subsampling]
+            self._params[quality] = params
+        ret_enc, buffer = cv2.imencode(".jpg", frame, params)
+        if not ret_enc:
+            return None
+        return buffer.reshape(-1).data
+
+
+class SimpleJpegEncoder:
+    """libjpeg-turbo through simplejpeg."""
+    name = "simplejpeg"
+    capture_format = "RGB888"
+
+    def __init__(self, subsampling="420"):
+        import simplejpeg
+        self._sj = simplejpeg
+        self._subsampling = subsampling
+
+    def encode(self, frame, quality):
+        if is_i420(frame):
+            y, u, v = i420_planes(frame)
+            return self._sj.encode_jpeg_yuv_planes(y, u, v, quality=int(quality), fastdct=True)
+        return self._sj.encode_jpeg(np.ascontiguousarray(frame), quality=int(quality), colorspace="BGR",
+                                    colorsubsampling=self._subsampling, fastdct=True)
+
+
+class TurboJpegEncoder:
+    """libjpeg-turbo through PyTurboJPEG."""
+    name = "turbojpeg"
+    capture_format = "RGB888"
+
+    def __init__(self, subsampling="420"):
+        import turbojpeg
+        self._tj = turbojpeg
+        self._jpeg = turbojpeg.TurboJPEG()
+        self._subsampling = {"444": turbojpeg.TJSAMP_444, "422": turbojpeg.TJSAMP_422,
+                             "420": turbojpeg.TJSAMP_420}.get(subsampling, turbojpeg.TJSAMP_420)
+
+    def encode(self, frame, quality):
+        if is_i420(frame):
+            h = frame.shape[0] * 2 // 3
+            return self._jpeg.encode_from_yuv(np.ascontiguousarray(frame), h, frame.shape[1],
+                                              quality=int(quality), jpeg_subsample=self._tj.TJSAMP_420)
+        return self._jpeg.encode(frame, quality=int(quality), pixel_format=self._tj.TJPF_BGR,
+                                 jpeg_subsample=self._subsampling, flags=self._tj.TJFLAG_FASTDCT)
+
+
+class Yuv420Encoder:
+    """Encode I420 planes directly (4:2:0 chroma subsampling, no colour conversion)."""
+    name = "yuv420"
+    capture_format = "YUV420"
+
+    def __init__(self, subsampling="420"):
+        try:
+            self._backend = SimpleJpegEncoder("420")
+        except ImportError:
+            self._backend = TurboJpegEncoder("420")  # raises if neither library is usable
+
+    def encode(self, frame, quality):
+        return self._backend.encode(frame, quality)
+
+
+_ENCODERS = {
+    "cv2": Cv2Encoder,
+    "simplejpeg": SimpleJpegEncoder,
+    "turbojpeg": TurboJpegEncoder,
+    "yuv420": Yuv420Encoder,
+}
+
+
+def create_encoder(name="cv2", subsampling="420"):
+    """Build the named encoder; falls back to cv2 if its library is not installed."""
+    cls = _ENCODERS.get(name)
+    if cls is None:
+        print(f"[Encoder] Unknown JPEG encoder '{name}', using cv2.")
+        return Cv2Encoder(subsampling)
+    try:
+        return cls(subsampling)
+    except (ImportError, OSError, RuntimeError) as e:  # module missing / libturbojpeg not found
+        print(f"[Encoder] {name} unavailable ({e}), using cv2.")
+        return Cv2Encoder(subsampling)
@@ -0,0 +1,172 @@
+"""
+quality_controller.py
+---------------------
+Per-client congestion controller for the video stream.
+
+Each video client gets a QualityController that walks a ladder of
+(width, height, JPEG quality) levels built from the client's base stream:
+quality is lowered first, then resolution. Decisions are taken at most once
+per ADAPT_INTERVAL from three signals:
+
+- send completion time of the client's last frames (vs. the frame period)
+- backlog: fraction of frames replaced in the client's mailbox before sending
+- round-trip time reported through the PING/PONG exchange (handle_ping)
+
+Congestion steps one level down immediately; headroom has to persist for
+ADAPT_UP_HOLD seconds before stepping one level up again.
+
+Main Class:
+- QualityController(width, height, quality, adaptive=True)
+    on_send(send_s, dropped, rtt_s) -> feed measurements after each send
+    variant                          -> (width, height, quality) currently used
+
+Main Functions:
+- record_rtt(host, rtt_s) / link_rtt(host): RTT per remote host, from PING messages.
+- recent_decisions(since): Recent level changes (each is also published as "video_quality" telemetry).
+
+Usage:
+    ctl = QualityController(640, 480, 50)
+    ctl.on_send(0.012, dropped=0, rtt_s=0.03)
+    width, height, quality = ctl.variant
+"""
+
+import itertools
+import time
+from collections import deque
+from config import (CAM_FPS, ADAPTIVE_QUALITY_STEPS, ADAPTIVE_SCALE_STEPS, ADAPT_INTERVAL, ADAPT_UP_HOLD,
+                    ADAPT_SEND_HIGH, ADAPT_SEND_LOW, ADAPT_DROP_HIGH, ADAPT_DROP_LOW, ADAPT_RTT_HIGH, ADAPT_RTT_LOW)
+from utils.telemetry import telemetry
+
+# Latest RTT per remote host (seconds), fed by PING messages on the command socket
+_link_rtt = {}
+
+# Recent controller decisions, for telemetry: (id, decision dict)
+_decisions = deque(maxlen=100)
+_decision_ids = itertools.count(1)
+
+
+def record_rtt(host, rtt_s):
+    """Store the latest round-trip time measured by a client on `host`."""
+    if host is not None and rtt_s is not None and rtt_s >= 0:
+        _link_rtt[host] = (rtt_s, time.monotonic())
+
+
+def link_rtt(host, max_age=15.0):
+    """Latest RTT for `host` in seconds, or None if unknown / older than max_age."""
+    entry = _link_rtt.get(host)
+    if entry is None or time.monotonic() - entry[1] > max_age:
+        return None
+    return entry[0]
+
+
+def recent_decisions(since=0):
+    """Decisions with id > since, oldest first, as (id, decision) pairs."""
+    return [(i, d) for i, d in _decisions if i > since]
+
+
+def build_ladder(width, height, quality):
+    """Levels from best to worst: quality steps at full size, then size steps at the lowest quality."""
+    def even(v):
+        return max(16, int(round(v / 8.0)) * 8)  # I420 / JPEG friendly dimensions
+
+    ladder = [(width, height, max(5, int(quality * q))) for q in ADAPTIVE_QUALITY_STEPS]
+    lowest_q = ladder[-1][2]
+    for s in ADAPTIVE_SCALE_STEPS[1:]:
+        ladder.append((even(width * s), even(height * s), lowest_q))
+    return ladder
+
+
+class QualityController:
+    """Chooses the stream level for one client from send time, backlog and RTT."""
+
+    def __init__(self, width, height, quality, adaptive=True, name=""):
+        self.name = name
+        self.adaptive = adaptive
+        self.ladder = build_ladder(width, height, quality) if adaptive else [(width, height, quality)]
+        self.level = 0
+        self.reason = "start"
+        self._frame_period = 1.0 / CAM_FPS if CAM_FPS > 0 else 0.05
+        self._window_start = time.monotonic()
+        self._good_since = None
+        self._reset_window()
+        # Last evaluated signals (reported in stats)
+        self.signals = {"send_ms": 0.0, "drop_rate": 0.0, "rtt_ms": None}
+
+    def _reset_window(self):
+        self._sends = 0
+        self._send_total = 0.0
+        self._dropped = 0
+
+    @property
+    def variant(self):
+        """(width, height, quality) to encode for this client."""
+        return self.ladder[self.level]
+
+    def on_send(self, send_s, dropped, rtt_s=None):
+        """Record one completed send (and frames dropped since the previous one); maybe change level."""
+        self._sends += 1
+        self._send_total += send_s
+        self._dropped += dropped
+        now = time.monotonic()
+        if not self.adaptive or now - self._window_start < ADAPT_INTERVAL:
+            return
+
+        avg_send = self._send_total / self._sends
+        drop_rate = self._dropped / (self._dropped + self._sends)
+        self.signals = {
+            "send_ms": round(avg_send * 1000, 2),
+            "drop_rate": round(drop_rate, 3),
+            "rtt_ms": round(rtt_s * 1000, 1) if rtt_s is not None else None,
+        }
+        self._window_start = now
+        self._reset_window()
+
+        congested = []
+        if avg_send > ADAPT_SEND_HIGH * self._frame_period:
+            congested.append("send_time")
+        if drop_rate > ADAPT_DROP_HIGH:
+            congested.append("backlog")
+        if rtt_s is not None and rtt_s > ADAPT_RTT_HIGH:
+            congested.append("rtt")
+
+        headroom = (avg_send < ADAPT_SEND_LOW * self._frame_period
+                    and drop_rate < ADAPT_DROP_LOW
+                    and (rtt_s is None or rtt_s < ADAPT_RTT_LOW))
+
+        if congested:
+            self._good_since = None
+            if self.level < len(self.ladder) - 1:
+                self._change(self.level + 1, "+".join(congested))
+        elif headroom:
+            if self._good_since is None:
+                self._good_since = now
+            elif now - self._good_since >= ADAPT_UP_HOLD and self.level > 0:
+                self._good_since = now
+                self._change(self.level - 1, "headroom")
+        else:
+            self._good_since = None
+
+    def _change(self, level, reason):
+        old = self.variant
+        self.level = level
+        self.reason = reason
+        width, height, quality = self.variant
+        decision = {
+            "time": time.time(),
+            "client": self.name,
+            "level": level,
+            "width": width,
+            "height": height,
+            "quality": quality,
+            "from": {"width": old[0], "height": old[1], "quality": old[2]},
+            "reason": reason,
+            **self.signals,
+        }
+        _decisions.append((next(_decision_ids), decision))
+        telemetry.publish("video_quality", {"head": "video_quality", **decision})
+        print(f"[Adaptive] {self.name}: {old} -> {self.variant} ({reason})")
+
+    def stats(self):
+        width, height, quality = self.variant
+        return {"level": self.level, "levels": len(self.ladder), "width": width, "height": height,
+                "quality": quality, "reason": self.reason, **self.signals}
@@ -0,0 +1,187 @@
+"""
+stage_metrics.py
+----------------
+Per-stage latency histograms for the video, command and motor pipelines.
+
+Each stage (capture, colour conversion, enhance, encode, client send, command
+handling, PWM loop period, ...) owns one HDR-style histogram: durations are
+bucketed in microseconds with 16 linear sub-buckets per power of two, so every
+value is kept to within ~6% from 1 us up to days in a fixed ~650-slot array.
+Recording is a frexp, an index and three adds (no lock, no allocation), cheap
+enough for every frame and every PWM tick. Increments from different threads
+are not locked, so a rare concurrent update may lose one count.
+
+Percentiles are computed only when read: by the "STATS" command and, if
+METRICS_HTTP_PORT is set, by a local HTTP endpoint in Prometheus text format
+(one summary per stage: quantiles, _sum and _count).
+
+Main Classes:
+- LatencyHistogram
+    record(seconds)  -> add one duration
+    percentile(q)    -> q-th percentile (0..100) in seconds
+    stats()          -> count, mean / p50 / p90 / p99 / p999 / max in ms
+    reset()
+- StageMetrics
+    stage(name, help)      -> register (or get) a stage histogram
+    stats() / reset()      -> all stages
+    prometheus()           -> Prometheus text exposition of every stage
+
+Module Objects:
+- metrics: Shared StageMetrics with the robot's stages registered.
+
+Main Functions:
+- serve_metrics(host, port): asyncio HTTP server answering GET /metrics.
+
+Usage:
+    ENCODE = metrics.stage("encode")
+    start = time.perf_counter()
+    ...
+    ENCODE.record(time.perf_counter() - start)
+"""
+
+import asyncio
+import math
+
+SUB_BUCKETS = 16     # linear buckets per power of two (~6% resolution)
+MAX_EXPONENT = 40    # 2**40 us, about 12 days
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class LatencyHistogram:
+    """Log-linear (HDR-style) histogram of durations in seconds."""
+
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * ((MAX_EXPONENT + 1) * SUB_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Add one duration (seconds; negative values count as 0)."""
+        us = seconds * 1e6
+        if us < 1.0:
+            index = 0
+        else:
+            mantissa, exponent = math.frexp(us)  # us = mantissa * 2**exponent, 0.5 <= mantissa < 1
+            if exponent > MAX_EXPONENT:
+                exponent, mantissa = MAX_EXPONENT, 0.99
+            index = exponent * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+        self.counts[index] += 1
+        self.count += 1
+        if seconds > 0:
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    @staticmethod
+    def _upper_edge(index):
+        """Upper edge of a bucket, in seconds."""
+        exponent, sub = divmod(index, SUB_BUCKETS)
+        if exponent == 0:
+            return 1e-6
+        return (0.5 + (sub + 1) / (2.0 * SUB_BUCKETS)) * 2.0 ** exponent * 1e-6
+
+    def percentile(self, q):
+        """Upper edge (seconds) of the bucket holding the q-th percentile (0..100), capped at max."""
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count:
+                seen += count
+                if seen >= rank:
+                    return min(self._upper_edge(i), self.max)
+        return self.max
+
+    def stats(self):
+        def ms(v):
+            return round(v * 1000, 3)
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count) if self.count else 0.0,
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+            "p999_ms": ms(self.percentile(99.9)),
+            "max_ms": ms(self.max),
+        }
+
+
+class StageMetrics:
+    """Named stage histograms, readable as a dict or in Prometheus text format."""
+
+    def __init__(self, prefix="robot"):
+        self.prefix = prefix
+        self.stages = {}
+
+    def stage(self, name, help=""):
+        if name not in self.stages:
+            self.stages[name] = LatencyHistogram(name, help)
+        return self.stages[name]
+
+    def stats(self):
+        return {name: hist.stats() for name, hist in self.stages.items()}
+
+    def reset(self):
+        for hist in self.stages.values():
+            hist.reset()
+
+    def prometheus(self):
+        """Prometheus text exposition: one summary family, one series per stage."""
+        family = f"{self.prefix}_stage_latency_seconds"
+        lines = [f"# HELP {family} Latency of each robot pipeline stage.", f"# TYPE {family} summary"]
+        for name, hist in self.stages.items():
+            for q in QUANTILES:
+                lines.append(f'{family}{{stage="{name}",quantile="{q}"}} {hist.percentile(q * 100):.9f}')
+            lines.append(f'{family}_sum{{stage="{name}"}} {hist.total:.9f}')
+            lines.append(f'{family}_count{{stage="{name}"}} {hist.count}')
+        return "\n".join(lines) + "\n"
+
+
+async def _handle_http(reader, writer):
+    try:
+        request = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass  # headers are not needed
+        parts = request.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/", "/metrics"):
+            status, body = "200 OK", metrics.prometheus().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_metrics(host, port):
+    """Serve GET /metrics (Prometheus text format) on host:port until cancelled."""
+    server = await asyncio.start_server(_handle_http, host, port)
+    print(f"[Metrics] Prometheus endpoint on http://{host}:{port}/metrics")
+    async with server:
+        await server.serve_forever()
+
+
+# Shared stage histograms
+metrics = StageMetrics()
+metrics.stage("capture", "camera read / request, including the wait for the frame")
+metrics.stage("convert", "flip and colour conversion into the ring slot")
+metrics.stage("queue", "capture -> processing start")
+metrics.stage("enhance", "enhance_frame (night vision)")
+metrics.stage("encode", "JPEG encode of one variant")
+metrics.stage("send", "one client send")
+metrics.stage("frame", "capture -> handed to client mailboxes")
+metrics.stage("command", "command received -> handled")
+metrics.stage("command_to_gpio", "drive command received -> direction GPIO written")
+metrics.stage("pwm_period", "PWM loop tick-to-tick interval while ramping")
@@ -0,0 +1,222 @@
+"""
+telemetry.py
+------------
+Central publish / subscribe hub for telemetry pushed to command clients.
+
+Producers (the PWM thread, the health sampler, the video quality controller)
+publish the latest message of a topic from any thread. The hub pushes a topic
+only when its message changed. Pushes are rate-limited to at most one per
+`min_interval`: changes that arrive faster are coalesced and the newest value is
+sent when the interval expires. If `max_interval` is set, the current value is
+re-sent after that long without a change (keepalive). Each push is serialised
+once, as JSON text and, if some subscriber asked for it, as a compact binary
+frame, and then handed to every subscriber.
+
+Subscribers each have a sender task with a one-slot-per-topic mailbox, so a slow
+client only ever receives the newest message of each topic and never delays others.
+
+Binary frames (subscribers with binary=True, topics that declare binary fields):
+    u8 topic id | fields packed little-endian in declaration order (struct format codes)
+Topics without binary fields are always sent as JSON text.
+
+Main Classes:
+- TelemetryHub
+    topic(name, min_interval, max_interval, binary)  -> register a topic
+    start(loop)                                      -> bind to the asyncio loop (call from main)
+    publish(name, message)                           -> latest message dict for a topic (any thread)
+    subscribe(websocket, topics=None, binary=False)  -> start pushing to a client
+    unsubscribe(websocket)
+    describe()                                       -> topic ids / rates / binary layouts
+
+Module Objects:
+- telemetry: The shared hub, with the robot's topics registered.
+
+Usage:
+    telemetry.publish("velocity_update", {"head": "velocity_update", "vel": 0.12, "l": 1, "r": 1})
+    telemetry.subscribe(websocket)
+"""
+
+import asyncio
+import json
+import struct
+import threading
+import time
+from config import TELEMETRY_RATES
+
+
+class Topic:
+    """Latest value, rate limits and cached encodings of one telemetry topic."""
+
+    def __init__(self, topic_id, name, min_interval=0.0, max_interval=None, binary=None):
+        self.id = topic_id
+        self.name = name
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.binary_fields = list(binary) if binary else None
+        self._struct = struct.Struct("<B" + "".join(fmt for _, fmt in binary)) if binary else None
+
+        self.value = None        # latest published message
+        self.sent_value = None   # message of the last push
+        self.last_push = 0.0
+        self.json = None         # encodings of the last push
+        self._binary = None
+        self.pushes = 0
+        self.coalesced = 0
+        self.scheduled = False   # a push check is queued on the loop
+        self.timer = None        # deferred push (min_interval) or keepalive (max_interval)
+
+    def encode(self, message, binary):
+        """Encoding of the last pushed message (binary only if the topic has a layout)."""
+        if binary and self._struct is not None:
+            if self._binary is None:
+                self._binary = self._struct.pack(self.id, *(message[key] for key, _ in self.binary_fields))
+            return self._binary
+        return self.json
+
+
+class Subscriber:
+    """One client: per-topic latest-message mailbox plus its own sender task."""
+
+    def __init__(self, hub, websocket, topics, binary):
+        self.hub = hub
+        self.websocket = websocket
+        self.topics = topics     # set of names, or None for all
+        self.binary = binary
+        self._pending = {}
+        self._ready = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    def wants(self, name):
+        return self.topics is None or name in self.topics
+
+    def post(self, name, payload):
+        self._pending[name] = payload
+        self._ready.set()
+
+    async def _run(self):
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                pending, self._pending = self._pending, {}
+                for payload in pending.values():
+                    await self.websocket.send(payload)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            self.hub.unsubscribe(self.websocket)
+
+    def stop(self):
+        self._task.cancel()
+
+
+class TelemetryHub:
+    """Change-only, rate-limited telemetry fan-out with encode-once payloads."""
+
+    def __init__(self):
+        self.topics = {}
+        self._subscribers = {}
+        self._loop = None
+        self._loop_thread = None
+
+    def topic(self, name, min_interval=0.0, max_interval=None, binary=None):
+        self.topics[name] = Topic(len(self.topics), name, min_interval, max_interval, binary)
+        return self.topics[name]
+
+    def start(self, loop):
+        """Bind the hub to the running asyncio loop; messages published earlier are pushed now."""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        for topic in self.topics.values():
+            if topic.value is not None:
+                self._request(topic)
+
+    # ---- producer side (any thread) ----
+    def publish(self, name, message):
+        """Set the latest message of a topic; it is pushed if it changed (subject to rate limits)."""
+        topic = self.topics[name]
+        topic.value = message
+        if self._loop is not None:
+            self._request(topic)
+
+    def _request(self, topic):
+        if topic.scheduled:
+            return  # a check is already queued; it will see this newest value
+        topic.scheduled = True
+        if threading.get_ident() == self._loop_thread:
+            self._check(topic)
+        else:
+            self._loop.call_soon_threadsafe(self._check, topic)
+
+    # ---- loop side ----
+    def _check(self, topic):
+        topic.scheduled = False
+        if topic.value == topic.sent_value:
+            return
+        wait = topic.last_push + topic.min_interval - time.monotonic()
+        if wait > 0:
+            # Too soon: coalesce, push the newest value when the interval expires
+            topic.coalesced += 1
+            if topic.timer is None or topic.timer.when() > self._loop.time() + wait:
+                if topic.timer is not None:
+                    topic.timer.cancel()
+                topic.timer = self._loop.call_later(wait, self._check, topic)
+            return
+        self._push(topic)
+
+    def _keepalive(self, topic):
+        topic.timer = None
+        if topic.value is not None:
+            self._push(topic)
+
+    def _push(self, topic):
+        message = topic.value
+        topic.sent_value = message
+        topic.last_push = time.monotonic()
+        topic.pushes += 1
+        topic.json = json.dumps(message)   # serialised once for every subscriber
+        topic._binary = None
+        for sub in list(self._subscribers.values()):
+            if sub.wants(topic.name):
+                sub.post(topic.name, topic.encode(message, sub.binary))
+
+        if topic.timer is not None:
+            topic.timer.cancel()
+            topic.timer = None
+        if topic.max_interval:
+            topic.timer = self._loop.call_later(topic.max_interval, self._keepalive, topic)
+
+    def subscribe(self, websocket, topics=None, binary=False):
+        """Push telemetry to a client (replaces an earlier subscription); current values are sent at once."""
+        self.unsubscribe(websocket)
+        sub = self._subscribers[websocket] = Subscriber(self, websocket, set(topics) if topics else None, binary)
+        for topic in self.topics.values():
+            if topic.json is not None and sub.wants(topic.name):
+                sub.post(topic.name, topic.encode(topic.sent_value, binary))
+        return sub
+
+    def unsubscribe(self, websocket):
+        sub = self._subscribers.pop(websocket, None)
+        if sub is not None:
+            sub.stop()
+
+    def describe(self):
+        """Topic ids, rate limits and binary layouts (for clients decoding binary frames)."""
+        return {
+            name: {
+                "id": t.id,
+                "min_interval": t.min_interval,
+                "max_interval": t.max_interval,
+                "binary": t.binary_fields,
+                "pushes": t.pushes,
+                "coalesced": t.coalesced,
+            }
+            for name, t in self.topics.items()
+        }
+
+
+# Shared hub and the robot's topics: (min_interval, max_interval) from config
+telemetry = TelemetryHub()
+telemetry.topic("velocity_update", *TELEMETRY_RATES["velocity_update"], binary=[("vel", "f"), ("l", "b"), ("r", "b")])
+telemetry.topic("status_update", *TELEMETRY_RATES["status_update"])
+telemetry.topic("video_quality", *TELEMETRY_RATES["video_quality"])
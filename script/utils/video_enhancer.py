@@ -13,6 +13,9 @@ To call externally:
 Best values in the dark:
     enhance_frame(frame, mode=1, brightness=50, contrast=50, gamma_val=300)
 
+Manual mode uses one fused 256-entry LUT (brightness + contrast + gamma), cached per
+slider setting, so each frame is a single cv2.LUT pass.
+
 Dependencies:
 - cv2
 - numpy
@@ -22,37 +25,58 @@ Dependencies:
 
 import cv2
 import numpy as np
+from functools import lru_cache
 
 
 '''   PROCESS FUNCTIONS   '''
 
-def adjust_brightness_contrast_gamma(frame, brightness=0, contrast=0, gamma=1.0):
-    """Manual brightness, contrast, gamma adjustment."""
-    frame = cv2.convertScaleAbs(frame, alpha=1 + (contrast / 100.0), beta=brightness)
+@lru_cache(maxsize=32)
+def manual_lut(brightness=0, contrast=0, gamma=1.0):
+    """
+    Fused 256-entry LUT equal to cv2.convertScaleAbs(alpha=1+contrast/100, beta=brightness)
+    followed by gamma correction. Cached per (brightness, contrast, gamma); read-only.
+    """
+    # Brightness / contrast applied to the 256 input levels (exact convertScaleAbs rounding)
+    levels = np.arange(256, dtype=np.uint8).reshape(1, 256)
+    scaled = cv2.convertScaleAbs(levels, alpha=1 + (contrast / 100.0), beta=brightness)[0]
 
     # Gamma correction
     invGamma = 1.0 / gamma if gamma > 0 else 1.0
-    table = np.array([(i / 255.0) ** invGamma * 255 for i in np.arange(0, 256)]).astype("uint8")
-    frame = cv2.LUT(frame, table)
+    gamma_table = (np.arange(256) / 255.0) ** invGamma * 255
+    table = gamma_table.astype("uint8")[scaled]
+    table.flags.writeable = False
+    return table
 
-    return frame
+def _buffer(pool, name, shape):
+    """Reusable buffer from a FramePipeline pool, or None to let OpenCV allocate."""
+    return pool.get(name, shape) if pool is not None else None
 
-def auto_histogram_equalization(frame):
-    """Global histogram equalization per channel."""
-    ycrcb = cv2.cvtColor(frame, cv2.COLOR_BGR2YCrCb)
-    ycrcb[:, :, 0] = cv2.equalizeHist(ycrcb[:, :, 0])
-    return cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2BGR)
+def adjust_brightness_contrast_gamma(frame, brightness=0, contrast=0, gamma=1.0, dst=None):
+    """Manual brightness, contrast, gamma adjustment (single LUT pass)."""
+    return cv2.LUT(frame, manual_lut(brightness, contrast, gamma), dst=dst)
 
-def auto_clahe(frame, clip=2.0, tile=8):
+def auto_histogram_equalization(frame, pool=None):
+    """Global histogram equalization per channel."""
+    ycrcb = cv2.cvtColor(frame, cv2.COLOR_BGR2YCrCb, dst=_buffer(pool, "ycrcb", frame.shape))
+    y = cv2.extractChannel(ycrcb, 0, dst=_buffer(pool, "plane", frame.shape[:2]))
+    y = cv2.equalizeHist(y, dst=y)
+    cv2.insertChannel(y, ycrcb, 0)
+    return cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2BGR, dst=_buffer(pool, "enhanced", frame.shape))
+
+@lru_cache(maxsize=4)
+def get_clahe(clip=2.0, tile=8):
+    """Persistent CLAHE object per (clip, tile), reused across frames."""
+    return cv2.createCLAHE(clipLimit=clip, tileGridSize=(tile, tile))
+
+def auto_clahe(frame, clip=2.0, tile=8, pool=None):
     """Adaptive histogram equalization (CLAHE)."""
-    lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-    l, a, b = cv2.split(lab)
+    lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB, dst=_buffer(pool, "lab", frame.shape))
+    l = cv2.extractChannel(lab, 0, dst=_buffer(pool, "plane", frame.shape[:2]))
 
-    clahe = cv2.createCLAHE(clipLimit=clip, tileGridSize=(tile, tile))
-    l = clahe.apply(l)
+    l = get_clahe(clip, tile).apply(l, dst=_buffer(pool, "plane_out", frame.shape[:2]))
 
-    lab = cv2.merge((l, a, b))
-    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+    cv2.insertChannel(l, lab, 0)
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=_buffer(pool, "enhanced", frame.shape))
 
 def nothing(x):
     pass
@@ -60,7 +84,7 @@ def nothing(x):
 
 '''   CALLER FUNCTION   '''
 
-def enhance_frame(frame, mode:int=2, brightness:int=50, contrast:int=50, gamma_val:int=100):
+def enhance_frame(frame, mode:int=2, brightness:int=50, contrast:int=50, gamma_val:int=100, pool=None):
     '''
     Modes:\n
         0:  OFF : No image enhancements applied\n
@@ -77,6 +101,7 @@ def enhance_frame(frame, mode:int=2, brightness:int=50, contrast:int=50, gamma_v
         -> brightness\n
         -> contrast\n
         -> gamma_val\n
+        -> pool (optional FramePipeline; intermediate / output buffers are reused)\n
     returns:\n
         -> enhanced_frame
     '''
@@ -89,18 +114,20 @@ def enhance_frame(frame, mode:int=2, brightness:int=50, contrast:int=50, gamma_v
         gamma_val /= 100.0
         gamma_val = max(0.1, gamma_val)
 
-        enhanced = adjust_brightness_contrast_gamma(frame, brightness, contrast, gamma_val)
+        enhanced = adjust_brightness_contrast_gamma(frame, brightness, contrast, gamma_val,
+                                                    dst=_buffer(pool, "enhanced", frame.shape))
 
     elif mode == 2: # Histogram Equalization
-        enhanced = auto_histogram_equalization(frame)
+        enhanced = auto_histogram_equalization(frame, pool=pool)
 
     elif mode == 3: # CLAHE
-        enhanced = auto_clahe(frame)
+        enhanced = auto_clahe(frame, pool=pool)
 
-    # Resize both frames for consistency
+    # Resize for consistency (only if a stage changed the frame size)
     h, w = frame.shape[:2]
-    enhanced_resized = cv2.resize(enhanced, (w, h))
-    return enhanced_resized
+    if enhanced.shape[:2] != (h, w):
+        enhanced = cv2.resize(enhanced, (w, h))
+    return enhanced
 
 
 '''   TESTING   '''